@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Memory and serialization cost of EmailInteraction records, against the old
+plain-dataclass form serialized with dataclasses.asdict.
+
+    python benchmarks/bench_interactions.py --records 100000
+    python benchmarks/bench_interactions.py --records 100000 --body-chars 4000
+"""
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from email_agent.core.models import EmailInteraction  # noqa: E402
+
+
+@dataclasses.dataclass
+class LegacyInteraction:
+    timestamp: str
+    sender: str
+    subject: str
+    content: str
+    complexity: str
+    response: str
+    processing_time: float
+    reply_sent: bool = False
+    reply_status: str = ""
+    message_id: str = ""
+    mailbox: str = ""
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+
+_WORDS = (
+    "invoice quarterly filing deadline estimate refund payroll deduction receipt schedule meeting "
+    "attached question please confirm thanks regards extension amendment balance statement"
+).split()
+
+
+def _text(rng: random.Random, chars: int) -> str:
+    words: List[str] = []
+    size = 0
+    while size < chars:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def _fresh(s: str) -> str:
+    # A copy per record, as parsed mail has: shared interned strings would skew the memory comparison
+    return (s + ".")[:-1]
+
+
+def _build(cls, n: int, body_chars: int, seed: int) -> List:
+    rng = random.Random(seed)
+    bodies = [_text(rng, body_chars) for _ in range(1000)]
+    replies = [_text(rng, body_chars // 3) for _ in range(1000)]
+    senders = [f"client{i}@example.com" for i in range(500)]
+    tiers = ("basic", "intermediate", "complex")
+    now = time.time()
+    out = []
+    for i in range(n):
+        ts = now - i
+        out.append(
+            cls(
+                timestamp=datetime.fromtimestamp(ts).isoformat() if cls is LegacyInteraction else ts,
+                sender=_fresh(rng.choice(senders)),
+                subject=f"Question about filing #{i}",
+                content=_fresh(rng.choice(bodies)),
+                complexity=_fresh(rng.choice(tiers)),
+                response=_fresh(rng.choice(replies)),
+                processing_time=rng.random() * 30,
+                reply_sent=True,
+                reply_status=_fresh("Sent"),
+                message_id=f"<{i:012d}.bench@mail.example.com>",
+                mailbox=_fresh("default"),
+            )
+        )
+    return out
+
+
+def _measure(label: str, cls, args) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    t = time.perf_counter()
+    records = _build(cls, args.records, args.body_chars, args.seed)
+    build = time.perf_counter() - t
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    def timed(fn: Callable[[], object]) -> float:
+        t = time.perf_counter()
+        fn()
+        return time.perf_counter() - t
+
+    page = records[: args.page]
+    # The dashboard's list view asks for these fields only
+    listing = ("timestamp", "sender", "subject", "complexity", "reply_sent", "mailbox")
+    to_dict = timed(lambda: [r.to_dict() for r in records])
+    api_page = min(timed(lambda: json.dumps([r.to_dict() for r in page])) for _ in range(5))
+    api_listing = min(
+        timed(lambda: json.dumps([{f: d[f] for f in listing} for d in (r.to_dict() for r in page)]))
+        if cls is LegacyInteraction
+        else timed(lambda: json.dumps([r.to_dict(listing) for r in page]))
+        for _ in range(5)
+    )
+    result = {
+        "representation": label,
+        "records": args.records,
+        "mb_per_100k": round(current / args.records * 100_000 / 2 ** 20, 1),
+        "build_seconds": round(build, 2),
+        "to_dict_per_sec": round(len(records) / to_dict),
+        f"json_page_{args.page}_ms": round(api_page * 1000, 2),
+        f"json_listing_{args.page}_ms": round(api_listing * 1000, 2),
+    }
+    del records, page
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--records", type=int, default=100_000)
+    ap.add_argument("--body-chars", type=int, default=1500, help="average email body length")
+    ap.add_argument("--page", type=int, default=500, help="records per /api/interactions page")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    results = [_measure("dataclass+asdict", LegacyInteraction, args), _measure("slotted+compressed", EmailInteraction, args)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput of monitor -> dispatcher -> processor -> responder.
+
+Everything external is replaced by the in-process stand-ins in ``fakes.py``:
+an IMAP server seeded with synthetic mail (or an mbox), an SMTP sink and an
+LLM with a first-token latency and a token rate. Reports emails/sec, per-stage
+latency percentiles from the /metrics histograms and peak RSS as JSON.
+
+    python benchmarks/bench_pipeline.py --emails 500 --workers 8
+    python benchmarks/bench_pipeline.py --emails 200,1000 --body-bytes 500,20000 --workers 1,4,16 --out results.json
+    python benchmarks/bench_pipeline.py --mbox ~/archive.mbox --llm ollama
+    python benchmarks/bench_pipeline.py --emails 2000 --mailboxes 50 --workers 8
+
+Comma-separated values run every combination, each in a fresh process so
+peak RSS and the histograms are per run.
+"""
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import itertools
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fakes import FakeImapServer, FakeOllamaServer, FakeSmtpServer, StubLLM, make_message  # noqa: E402
+
+from email_agent.config import Settings  # noqa: E402
+from email_agent.core.dispatcher import EmailDispatcher  # noqa: E402
+from email_agent.core.metrics import EMAIL_SECONDS, STAGE_SECONDS  # noqa: E402
+from email_agent.core.processor import EmailProcessor  # noqa: E402
+from email_agent.core.spool import WorkSpool  # noqa: E402
+from email_agent.email.imap_monitor import RealEmailMonitor  # noqa: E402
+
+_PHRASES = (
+    "I have a quick question about my home office deduction.",
+    "We are considering an LLC versus an S-corp for the new business.",
+    "I received an IRS audit notice this morning and need representation.",
+    "Can mileage for client visits be written off as a business expense?",
+    "Our payroll provider missed the quarterly tax deadline on 04/15/2024.",
+    "The estimated tax payment was $4,250.00 but the W-2 shows more withholding.",
+    "What documentation do I need to keep for depreciation on equipment?",
+    "We are planning an acquisition and need advice on transfer pricing.",
+)
+
+
+_FILLER = (
+    "Let me know if you need anything else from me.",
+    "I have attached what I could find so far.",
+    "We spoke briefly about this at the last meeting.",
+    "Happy to jump on a call if that is easier.",
+)
+
+
+def _body(rng: random.Random, size: int) -> str:
+    # One topic sentence (which decides the tier) padded with neutral filler
+    sentences = [rng.choice(_PHRASES)]
+    length = len(sentences[0])
+    while length < size:
+        sentences.append(rng.choice(_FILLER))
+        length += len(sentences[-1]) + 1
+    return "Hi,\n\n" + " ".join(sentences)[:size] + "\n\nThanks,\nA client"
+
+
+def _percentiles() -> Dict[str, Dict[str, float]]:
+    out = {labels[0]: pct for labels, pct in STAGE_SECONDS.percentiles().items()}
+    total = EMAIL_SECONDS.percentiles().get(())
+    if total:
+        out["email_total"] = total
+    return {k: {m: round(v, 6) for m, v in pct.items()} for k, pct in sorted(out.items())}
+
+
+def run_once(args, emails: int, body_bytes: int, workers: int) -> Dict:
+    rng = random.Random(args.seed)
+    # One fake server per account; generated mail is dealt round-robin across them
+    imaps = [FakeImapServer(idle=args.mode == "idle") for _ in range(max(1, args.mailboxes))]
+    smtp = FakeSmtpServer()
+    if args.mbox:
+        emails = imaps[0].load_mbox(args.mbox, limit=emails)
+    else:
+        for i in range(emails):
+            imaps[i % len(imaps)].deliver(make_message(
+                f"client{i % args.senders}@example.com",
+                f"Question {i}",
+                _body(rng, body_bytes),
+                f"<bench-{i}@example.com>",
+                attachment_bytes=args.attachment_bytes,
+            ))
+
+    llm_server = None
+    if args.llm == "ollama":
+        llm_server = FakeOllamaServer(args.first_token_ms / 1000, args.tokens_per_second, args.reply_tokens)
+
+    workdir = Path(tempfile.mkdtemp(prefix="email_agent_bench_"))
+    mailboxes_path = ""
+    if len(imaps) > 1:
+        mailboxes_path = str(workdir / "mailboxes.json")
+        Path(mailboxes_path).write_text(json.dumps([
+            {"name": f"box{k}", "gmail_address": f"agent{k}@example.com", "gmail_app_password": "x",
+             "imap_host": "127.0.0.1", "imap_port": imap.port}
+            for k, imap in enumerate(imaps)
+        ]), encoding="utf-8")
+    settings = dataclasses.replace(
+        Settings(),
+        mailboxes_path=mailboxes_path,
+        imap_host="127.0.0.1",
+        imap_port=imaps[0].port,
+        imap_ssl=False,
+        imap_mode=args.mode,
+        gmail_address="agent@example.com",
+        gmail_app_password="x",
+        smtp_host="127.0.0.1",
+        smtp_port=smtp.port,
+        smtp_user="agent@example.com",
+        smtp_app_password="x",
+        smtp_starttls=False,
+        smtp_pool_size=args.smtp_pool_size,
+        poll_seconds=1,
+        worker_count=workers,
+        dispatch_queue_size=max(workers * 4, 16),
+        state_backend=args.state_backend,
+        state_path=str(workdir / "processed.jsonl"),
+        state_db_path=str(workdir / "processed.sqlite3"),
+        history_path=str(workdir / "interactions.sqlite3"),
+        search_cache_path=str(workdir / "search_cache.sqlite3"),
+        claims_path=str(workdir / "claims.sqlite3"),
+        enable_tools=False,
+        ollama_base_url=llm_server.base_url if llm_server else "http://127.0.0.1:9",
+        reply_cache_enabled=args.reply_cache,
+        llm_max_concurrency=args.llm_concurrency or workers,
+    )
+    processor = EmailProcessor(settings)
+    if args.llm == "stub":
+        stub = StubLLM(args.first_token_ms / 1000, args.tokens_per_second, args.reply_tokens)
+        processor.agent._get_agent = lambda *_: stub
+        processor.agent._get_fallback_chain = lambda *_: stub
+
+    monitors = [
+        RealEmailMonitor(
+            imap_host=mailbox.imap_host,
+            imap_port=mailbox.imap_port,
+            gmail_address=mailbox.gmail_address,
+            gmail_app_password=mailbox.gmail_app_password,
+            poll_seconds=settings.poll_seconds,
+            mode=settings.imap_mode,
+            use_ssl=settings.imap_ssl,
+            max_body_bytes=settings.imap_max_body_bytes,
+            mailbox=mailbox.name,
+        )
+        for mailbox in processor.mailboxes.values()
+    ]
+    spool = WorkSpool(str(workdir / "spool.sqlite3")) if args.spool else None
+    dispatcher = EmailDispatcher(
+        processor.process_incoming,
+        workers=workers,
+        max_queue=settings.dispatch_queue_size,
+        spool=spool,
+        priority=processor.priority,
+        coalesce_seconds=args.coalesce_seconds,
+    )
+
+    t0 = time.perf_counter()
+    dispatcher.start()
+    for monitor in monitors:
+        monitor.start(dispatcher.submit)
+    if args.coalesce_seconds:
+        completed = _wait_handled(processor, emails, args.timeout)
+    else:
+        completed = smtp.wait_for(emails, timeout=args.timeout)
+    elapsed = time.perf_counter() - t0
+    for monitor in monitors:
+        monitor.stop()
+    dispatcher.stop(drain=False)
+    processor.responder.close()
+
+    return {
+        "emails": emails,
+        "body_bytes": body_bytes,
+        "workers": workers,
+        "mailboxes": len(imaps),
+        "mode": args.mode,
+        "llm": args.llm,
+        "spool": args.spool,
+        "llm_concurrency": settings.llm_max_concurrency,
+        "completed": completed,
+        "replies_sent": len(smtp.messages),
+        "elapsed_seconds": round(elapsed, 3),
+        "emails_per_sec": round(len(smtp.messages) / elapsed, 2) if elapsed else 0.0,
+        "stages": _percentiles(),
+        "imap_logins": sum(imap.logins for imap in imaps),
+        "imap_bytes_sent": sum(imap.bytes_sent for imap in imaps),
+        "smtp_connections": smtp.connections,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _wait_handled(processor: EmailProcessor, emails: int, timeout: float) -> bool:
+    # Coalesced follow-ups share a reply, so count emails handled rather than replies sent
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = processor.get_stats()
+        if stats["total_processed"] + stats["coalesced"] >= emails:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--emails", type=_ints, default=[200], help="mailbox size(s)")
+    ap.add_argument("--body-bytes", type=_ints, default=[2000], help="body size(s) of generated mail")
+    ap.add_argument("--workers", type=_ints, default=[4], help="dispatcher concurrency")
+    ap.add_argument("--mbox", default="", help="seed the mailbox from an mbox instead of generating mail")
+    ap.add_argument("--senders", type=int, default=50, help="distinct senders in generated mail")
+    ap.add_argument("--attachment-bytes", type=int, default=0)
+    ap.add_argument("--mailboxes", type=int, default=1, help="accounts monitored by the one process")
+    ap.add_argument("--mode", choices=("idle", "poll"), default="idle")
+    ap.add_argument("--llm", choices=("stub", "ollama"), default="stub",
+                    help="stub: in-process; ollama: real LangChain client against a fake Ollama server")
+    ap.add_argument("--first-token-ms", type=float, default=200.0)
+    ap.add_argument("--tokens-per-second", type=float, default=50.0)
+    ap.add_argument("--reply-tokens", type=int, default=60)
+    ap.add_argument("--llm-concurrency", type=int, default=0, help="requests in flight to the LLM (default: --workers)")
+    ap.add_argument("--smtp-pool-size", type=int, default=4)
+    ap.add_argument("--state-backend", choices=("jsonl", "sqlite"), default="sqlite")
+    ap.add_argument("--spool", action="store_true", help="queue through the durable SQLite spool")
+    ap.add_argument("--coalesce-seconds", type=float, default=0.0,
+                    help="dispatcher coalescing window; follow-ups share a reply, so replies can be fewer than emails")
+    ap.add_argument("--reply-cache", action="store_true", help="enable the reply cache (off so every email hits the LLM)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--timeout", type=float, default=600.0, help="give up on a run after this many seconds")
+    ap.add_argument("--out", default="", help="also write the results to this JSON file")
+    args = ap.parse_args()
+
+    grid = list(itertools.product(args.emails, args.body_bytes, args.workers))
+    if len(grid) == 1:
+        results = [run_once(args, *grid[0])]
+    else:
+        results = []
+        passthrough = sys.argv[1:]
+        for emails, body_bytes, workers in grid:
+            cmd = [sys.executable, __file__] + _without(passthrough, ("--emails", "--body-bytes", "--workers", "--out"))
+            cmd += ["--emails", str(emails), "--body-bytes", str(body_bytes), "--workers", str(workers)]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            results.extend(json.loads(out)["results"])
+            print(f"emails={emails} body={body_bytes} workers={workers}: "
+                  f"{results[-1]['emails_per_sec']} emails/sec", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+def _without(argv: List[str], names) -> List[str]:
+    """Drop ``--name value`` / ``--name=value`` pairs for the given option names."""
+    out: List[str] = []
+    skip = False
+    for a in argv:
+        if skip:
+            skip = False
+            continue
+        name = a.split("=", 1)[0]
+        if name in names:
+            skip = "=" not in a
+            continue
+        out.append(a)
+    return out
+
+
+if __name__ == "__main__":
+    main()
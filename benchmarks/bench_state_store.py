@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Startup time, lookup rate and append rate of the processed-id stores.
+
+    python benchmarks/bench_state_store.py --backend sqlite --ids 10000000
+    python benchmarks/bench_state_store.py --backend jsonl --ids 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from email_agent.core.state import ProcessedMessageStore, SqliteMessageStore  # noqa: E402
+
+
+def _mid(i: int) -> str:
+    return f"<{i:012d}.bench@mail.example.com>"
+
+
+def _seed(backend: str, path: Path, n: int) -> None:
+    if path.exists():
+        return
+    t0 = time.perf_counter()
+    ts = datetime.now().isoformat()
+    if backend == "sqlite":
+        SqliteMessageStore(str(path)).close()
+        db = sqlite3.connect(str(path))
+        epoch = time.time()
+        for start in range(0, n, 200_000):
+            db.executemany(
+                "INSERT INTO processed (message_id, ts) VALUES (?, ?)",
+                ((_mid(i), epoch) for i in range(start, min(n, start + 200_000))),
+            )
+            db.commit()
+        db.close()
+    else:
+        with path.open("w", encoding="utf-8") as f:
+            for i in range(n):
+                f.write(json.dumps({"message_id": _mid(i), "ts": ts}) + "\n")
+    print(f"seeded {n} ids in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--backend", choices=("sqlite", "jsonl"), default="sqlite")
+    ap.add_argument("--ids", type=int, default=10_000_000)
+    ap.add_argument("--lookups", type=int, default=200_000)
+    ap.add_argument("--appends", type=int, default=20_000)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--dir", default=os.path.join(tempfile.gettempdir(), "email_agent_bench"))
+    args = ap.parse_args()
+
+    workdir = Path(args.dir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    path = workdir / f"processed_{args.ids}.{'sqlite3' if args.backend == 'sqlite' else 'jsonl'}"
+    _seed(args.backend, path, args.ids)
+
+    t0 = time.perf_counter()
+    store = SqliteMessageStore(str(path)) if args.backend == "sqlite" else ProcessedMessageStore(str(path))
+    startup = time.perf_counter() - t0
+
+    result = {"backend": args.backend, "ids": args.ids, "startup_seconds": round(startup, 4)}
+
+    def lookups(label: str, keys) -> None:
+        t = time.perf_counter()
+        found = sum(1 for k in keys if store.contains(k))
+        dt = time.perf_counter() - t
+        result[f"{label}_lookups_per_sec"] = round(len(keys) / dt)
+        result[f"{label}_found"] = found
+
+    hits = [_mid(random.randrange(args.ids)) for _ in range(args.lookups)]
+    misses = [f"<miss-{i}@example.com>" for i in range(args.lookups)]
+    lookups("hit", hits)
+    lookups("miss_cold", misses)
+
+    if args.backend == "sqlite":
+        t = time.perf_counter()
+        while not store.stats()["bloom_ready"]:
+            time.sleep(0.2)
+        result["bloom_ready_seconds"] = round(time.perf_counter() - t0, 2)
+        lookups("miss_bloom", misses)
+
+    ts = datetime.now().isoformat()
+    t = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(lambda i: store.add(f"<new-{i}@example.com>", ts), range(args.appends)))
+    result["appends_per_sec"] = round(args.appends / (time.perf_counter() - t))
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    store.close()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,477 @@
+"""
+In-process stand-ins for the services the agent talks to.
+
+* ``FakeImapServer``  - IMAP4rev1 subset (LOGIN, SELECT, [UID] SEARCH/FETCH/STORE, IDLE)
+* ``FakeSmtpServer``  - SMTP sink that accepts AUTH and records delivered messages
+* ``FakeOllamaServer`` - Ollama ``/api/generate`` with first-token latency and a token rate
+* ``StubLLM``          - the same latency model without HTTP, usable as an agent/chain
+
+All servers bind to 127.0.0.1 on an ephemeral port and run on daemon threads.
+"""
+from __future__ import annotations
+
+import asyncio
+import email
+import json
+import mailbox
+import re
+import socketserver
+import threading
+import time
+from email import policy
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Set, Tuple
+
+_FETCH_ITEM = re.compile(r"(UID|FLAGS|RFC822|BODYSTRUCTURE|BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?)", re.I)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _start(server) -> None:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+# ---------------------------------------------------------------- IMAP
+
+
+def _parse_set(spec: str, max_key: int) -> Set[int]:
+    out: Set[int] = set()
+    for part in spec.split(","):
+        if ":" in part:
+            a, b = (max_key if x == "*" else int(x) for x in part.split(":"))
+            out.update(range(min(a, b), max(a, b) + 1))
+        else:
+            out.add(max_key if part == "*" else int(part))
+    return out
+
+
+def _split_header(raw: bytes) -> Tuple[bytes, bytes]:
+    i, j = raw.find(b"\r\n\r\n"), raw.find(b"\n\n")
+    if i >= 0 and (j < 0 or i <= j):
+        return raw[: i + 4], raw[i + 4:]
+    if j >= 0:
+        return raw[: j + 2], raw[j + 2:]
+    return raw, b""
+
+
+def _section(raw: bytes, sec: str) -> bytes:
+    header, text = _split_header(raw)
+    sec = sec.upper()
+    if sec == "":
+        return raw
+    if sec == "HEADER":
+        return header
+    if sec == "TEXT":
+        return text
+    if sec.startswith("HEADER.FIELDS"):
+        names = set(sec[sec.index("(") + 1: sec.rindex(")")].split())
+        lines: List[bytes] = []
+        keep = False
+        for line in re.split(rb"\r?\n", header):
+            if line[:1] in (b" ", b"\t"):
+                if keep:
+                    lines.append(line)
+                continue
+            keep = b":" in line and line.split(b":", 1)[0].decode().upper() in names
+            if keep:
+                lines.append(line)
+        return b"\r\n".join(lines) + b"\r\n\r\n"
+
+    # Body part number, e.g. "1" or "2.1"
+    part = email.message_from_bytes(raw, policy=policy.compat32)
+    for n in sec.split("."):
+        if part.is_multipart():
+            part = part.get_payload()[int(n) - 1]
+        elif n != "1":
+            return b""
+    payload = part.get_payload(decode=False)
+    if isinstance(payload, list):
+        return part.as_bytes()
+    return payload.encode("utf-8", "surrogateescape") if isinstance(payload, str) else payload
+
+
+def _quote(s) -> bytes:
+    return b'"' + str(s).encode() + b'"' if s is not None else b"NIL"
+
+
+def _bodystructure(raw: bytes) -> bytes:
+    def walk(p) -> bytes:
+        if p.is_multipart():
+            return b"(" + b"".join(walk(c) for c in p.get_payload()) + b" " + _quote(p.get_content_subtype().upper()) + b")"
+        params = (p.get_params() or [])[1:]
+        plist = b"(" + b" ".join(_quote(k.upper()) + b" " + _quote(v) for k, v in params) + b")" if params else b"NIL"
+        payload = p.get_payload(decode=False)
+        data = payload.encode("utf-8", "surrogateescape") if isinstance(payload, str) else payload
+        cte = (p.get("Content-Transfer-Encoding") or "7BIT").upper()
+        out = b" ".join([
+            _quote(p.get_content_maintype().upper()), _quote(p.get_content_subtype().upper()),
+            plist, b"NIL NIL", _quote(cte), str(len(data)).encode(),
+        ])
+        if p.get_content_maintype() == "text":
+            out += b" " + str(data.count(b"\n")).encode()
+        disposition = p.get_content_disposition()
+        if disposition:
+            filename = p.get_filename()
+            dparams = b"(" + _quote("FILENAME") + b" " + _quote(filename) + b")" if filename else b"NIL"
+            out += b" NIL (" + _quote(disposition.upper()) + b" " + dparams + b")"
+        return b"(" + out + b")"
+
+    return walk(email.message_from_bytes(raw, policy=policy.compat32))
+
+
+class _ImapHandler(socketserver.StreamRequestHandler):
+    def send(self, data) -> None:
+        if isinstance(data, str):
+            data = data.encode()
+        with self.server.lock:
+            self.server.bytes_sent += len(data)
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        srv = self.server
+        self.send("* OK fake IMAP ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode("utf-8", "replace").rstrip("\r\n").partition(" ")
+            cmd, _, arg = rest.partition(" ")
+            cmd = cmd.upper()
+            with srv.lock:
+                srv.commands.append(f"{cmd} {arg[:60]}")
+            by_uid = cmd == "UID"
+            if by_uid:
+                cmd, _, arg = arg.partition(" ")
+                cmd = cmd.upper()
+            handler = getattr(self, f"cmd_{cmd.lower()}", None)
+            if handler is None:
+                self.send(f"{tag} BAD unknown command\r\n")
+                continue
+            if handler(tag, arg, by_uid) is False:
+                return
+
+    def _messages(self) -> List[Tuple[int, Dict]]:
+        with self.server.cond:
+            return list(enumerate(self.server.messages, start=1))
+
+    def cmd_capability(self, tag, arg, by_uid):
+        caps = "IMAP4rev1" + (" IDLE" if self.server.idle else "")
+        self.send(f"* CAPABILITY {caps}\r\n{tag} OK done\r\n")
+
+    def cmd_login(self, tag, arg, by_uid):
+        with self.server.lock:
+            self.server.logins += 1
+        self.send(f"{tag} OK logged in\r\n")
+
+    def cmd_select(self, tag, arg, by_uid):
+        n = len(self._messages())
+        self.send(f"* {n} EXISTS\r\n* OK [UIDVALIDITY {self.server.uidvalidity}] ok\r\n{tag} OK [READ-WRITE] done\r\n")
+
+    def cmd_noop(self, tag, arg, by_uid):
+        self.send(f"{tag} OK done\r\n")
+
+    def cmd_logout(self, tag, arg, by_uid):
+        self.send(f"* BYE\r\n{tag} OK done\r\n")
+        return False
+
+    def cmd_search(self, tag, arg, by_uid):
+        msgs = self._messages()
+        tokens = arg.upper().split()
+        uids = None
+        if "UID" in tokens:
+            uids = _parse_set(tokens[tokens.index("UID") + 1], msgs[-1][1]["uid"] if msgs else 0)
+        hits = [
+            str(m["uid"] if by_uid else seq)
+            for seq, m in msgs
+            if (not m["seen"] or "UNSEEN" not in tokens) and (uids is None or m["uid"] in uids)
+        ]
+        self.send(f"* SEARCH {' '.join(hits)}\r\n{tag} OK done\r\n")
+
+    def cmd_fetch(self, tag, arg, by_uid):
+        spec, _, what = arg.partition(" ")
+        msgs = self._messages()
+        max_key = (msgs[-1][1]["uid"] if by_uid else len(msgs)) if msgs else 0
+        keys = _parse_set(spec, max_key)
+        items = _FETCH_ITEM.findall(what)
+        if by_uid and not any(i[0].upper() == "UID" for i in items):
+            items.insert(0, ("UID", "", "", ""))
+        out = bytearray()
+        for seq, m in msgs:
+            if (m["uid"] if by_uid else seq) not in keys:
+                continue
+            parts: List[bytes] = []
+            for full, sec, offset, length in items:
+                name = full.upper()
+                if name == "UID":
+                    parts.append(f"UID {m['uid']}".encode())
+                elif name == "FLAGS":
+                    parts.append(b"FLAGS (\\Seen)" if m["seen"] else b"FLAGS ()")
+                elif name == "BODYSTRUCTURE":
+                    parts.append(b"BODYSTRUCTURE " + _bodystructure(m["raw"]))
+                else:
+                    if name == "RFC822":
+                        data, label = m["raw"], "RFC822"
+                    else:
+                        data, label = _section(m["raw"], sec), f"BODY[{sec}]"
+                        if offset:
+                            data = data[int(offset): int(offset) + int(length)]
+                            label += f"<{offset}>"
+                    if ".PEEK" not in name:
+                        m["seen"] = True
+                    parts.append(f"{label} {{{len(data)}}}\r\n".encode() + data)
+            out += f"* {seq} FETCH (".encode() + b" ".join(parts) + b")\r\n"
+        self.send(bytes(out) + f"{tag} OK done\r\n".encode())
+
+    def cmd_store(self, tag, arg, by_uid):
+        spec, _, flags = arg.partition(" ")
+        msgs = self._messages()
+        max_key = (msgs[-1][1]["uid"] if by_uid else len(msgs)) if msgs else 0
+        keys = _parse_set(spec, max_key)
+        if "\\SEEN" in flags.upper():
+            with self.server.cond:
+                for seq, m in msgs:
+                    if (m["uid"] if by_uid else seq) in keys:
+                        m["seen"] = not flags.startswith("-")
+        self.send(f"{tag} OK done\r\n")
+
+    def cmd_idle(self, tag, arg, by_uid):
+        srv = self.server
+        self.send("+ idling\r\n")
+        seen = len(self._messages())
+        done = threading.Event()
+
+        def notify() -> None:
+            while not done.is_set():
+                with srv.cond:
+                    srv.cond.wait(0.2)
+                    n = len(srv.messages)
+                if n > seen and not done.is_set():
+                    self.send(f"* {n} EXISTS\r\n")
+                    return
+
+        t = threading.Thread(target=notify, daemon=True)
+        t.start()
+        self.rfile.readline()  # DONE
+        done.set()
+        t.join()
+        self.send(f"{tag} OK IDLE terminated\r\n")
+
+
+class FakeImapServer(_ThreadingTCPServer):
+    """Single-mailbox IMAP server holding raw RFC 822 messages in memory."""
+
+    def __init__(self, idle: bool = True, uidvalidity: int = 1):
+        super().__init__(("127.0.0.1", 0), _ImapHandler)
+        self.idle = idle
+        self.uidvalidity = uidvalidity
+        self.messages: List[Dict] = []
+        self.cond = threading.Condition()
+        self.lock = threading.Lock()
+        self.logins = 0
+        self.bytes_sent = 0
+        self.commands: List[str] = []
+        self._next_uid = 1
+        _start(self)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def deliver(self, raw: bytes) -> int:
+        with self.cond:
+            uid = self._next_uid
+            self._next_uid += 1
+            self.messages.append({"uid": uid, "raw": raw, "seen": False})
+            self.cond.notify_all()
+        return uid
+
+    def load_mbox(self, path: str, limit: int = 0) -> int:
+        count = 0
+        for msg in mailbox.mbox(path):
+            self.deliver(msg.as_bytes())
+            count += 1
+            if limit and count >= limit:
+                break
+        return count
+
+    def unseen(self) -> int:
+        with self.cond:
+            return sum(1 for m in self.messages if not m["seen"])
+
+
+def make_message(sender: str, subject: str, body: str, message_id: str, attachment_bytes: int = 0) -> bytes:
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["To"] = "agent@example.com"
+    msg["Subject"] = subject
+    msg["Message-ID"] = message_id
+    msg.set_content(body)
+    if attachment_bytes:
+        msg.add_attachment(b"\0" * attachment_bytes, maintype="application", subtype="pdf", filename="statement.pdf")
+    return msg.as_bytes()
+
+
+# ---------------------------------------------------------------- SMTP
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, text: str) -> None:
+        self.wfile.write(text.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        srv = self.server
+        with srv.lock:
+            srv.connections += 1
+        self.reply("220 fake ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode("utf-8", "replace").strip().upper()
+            if verb.startswith("EHLO"):
+                self.reply("250-fake\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+            elif verb.startswith("HELO"):
+                self.reply("250 fake")
+            elif verb.startswith("AUTH"):
+                with srv.lock:
+                    srv.logins += 1
+                self.reply("235 authenticated")
+            elif verb.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 ok")
+            elif verb == "DATA":
+                self.reply("354 end with .")
+                chunks: List[bytes] = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b".\r\n", b".\n", b""):
+                        break
+                    chunks.append(chunk)
+                with srv.lock:
+                    srv.messages.append(b"".join(chunks))
+                    srv.delivered.notify_all()
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("500 unrecognized")
+
+
+class FakeSmtpServer(_ThreadingTCPServer):
+    """SMTP sink; ``messages`` holds every DATA payload received."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SmtpHandler)
+        self.lock = threading.Lock()
+        self.delivered = threading.Condition(self.lock)
+        self.connections = 0
+        self.logins = 0
+        self.messages: List[bytes] = []
+        _start(self)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def wait_for(self, count: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self.delivered:
+            while len(self.messages) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.delivered.wait(remaining)
+        return True
+
+
+# ---------------------------------------------------------------- LLM
+
+
+class _LatencyModel:
+    def __init__(self, first_token_seconds: float = 0.2, tokens_per_second: float = 50.0, reply_tokens: int = 60):
+        self.first_token_seconds = first_token_seconds
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+
+    def tokens(self) -> Iterable[str]:
+        time.sleep(self.first_token_seconds)
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for i in range(self.reply_tokens):
+            if interval:
+                time.sleep(interval)
+            yield ("Thanks" if i == 0 else " word")
+
+    async def atokens(self) -> List[str]:
+        await asyncio.sleep(self.first_token_seconds)
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(self.reply_tokens / self.tokens_per_second)
+        return ["Thanks"] + [" word"] * (self.reply_tokens - 1)
+
+
+class StubLLM(_LatencyModel):
+    """Answers ``invoke``/``ainvoke`` like both the ReAct agent and the fallback chain, without HTTP."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, inputs: Dict, *args, **kwargs) -> Dict:
+        with self._lock:
+            self.calls += 1
+        text = "".join(self.tokens())
+        return {"output": f"Final Answer: {text}", "text": text}
+
+    async def ainvoke(self, inputs: Dict, *args, **kwargs) -> Dict:
+        with self._lock:
+            self.calls += 1
+        text = "".join(await self.atokens())
+        return {"output": f"Final Answer: {text}", "text": text}
+
+
+class _OllamaHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        model: _LatencyModel = self.server.model
+        with self.server.lock:
+            self.server.requests += 1
+        stream = payload.get("stream", True)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        if stream:
+            for token in model.tokens():
+                self.wfile.write(json.dumps({"model": payload.get("model"), "response": token, "done": False}).encode() + b"\n")
+                self.wfile.flush()
+            self.wfile.write(json.dumps({"model": payload.get("model"), "response": "", "done": True}).encode() + b"\n")
+        else:
+            text = "".join(model.tokens())
+            self.wfile.write(json.dumps({"model": payload.get("model"), "response": text, "done": True}).encode())
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Ollama-compatible ``/api/generate``; point ``OLLAMA_BASE_URL`` at ``base_url``."""
+
+    daemon_threads = True
+
+    def __init__(self, first_token_seconds: float = 0.2, tokens_per_second: float = 50.0, reply_tokens: int = 60):
+        super().__init__(("127.0.0.1", 0), _OllamaHandler)
+        self.model = _LatencyModel(first_token_seconds, tokens_per_second, reply_tokens)
+        self.lock = threading.Lock()
+        self.requests = 0
+        _start(self)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+import json
 import os
 from dataclasses import dataclass
-from typing import Optional
+from typing import List, Optional
 
 
 def _env(name: str, default: Optional[str] = None) -> Optional[str]:
@@ -10,27 +11,111 @@ def _env(name: str, default: Optional[str] = None) -> Optional[str]:
     return v if v not in (None, "") else default
 
 
+DEFAULT_MAILBOX = "default"
+
+
+@dataclass(frozen=True)
+class Mailbox:
+    """One monitored account: where to read mail and which identity replies to it."""
+
+    name: str
+    gmail_address: str
+    gmail_app_password: str
+    imap_host: str = "imap.gmail.com"
+    imap_port: int = 993
+    smtp_host: str = "smtp.gmail.com"
+    smtp_port: int = 587
+    smtp_user: str = ""
+    smtp_app_password: str = ""
+    cpa_name: str = "John Martinez"
+
+    @property
+    def state_namespace(self) -> str:
+        # The "default" mailbox keeps the un-prefixed processed ids of single-account installs
+        return "" if self.name == DEFAULT_MAILBOX else self.name
+
+
 @dataclass(frozen=True)
 class Settings:
     # Gmail (IMAP read)
     imap_host: str = "imap.gmail.com"
     imap_port: int = 993
+    imap_ssl: bool = True
+    imap_mode: str = "poll"  # "poll" or "idle"
+    imap_idle_seconds: int = 1500
+    imap_max_body_bytes: int = 64 * 1024  # bytes of the text part downloaded per message
     gmail_address: str = ""
     gmail_app_password: str = ""
+    mailboxes_path: str = ""  # JSON list of mailboxes; empty = the single account above
 
     # Gmail (SMTP send)
     smtp_host: str = "smtp.gmail.com"
     smtp_port: int = 587
     smtp_user: str = ""
     smtp_app_password: str = ""
+    smtp_starttls: bool = True
+    smtp_pool_size: int = 4
+    smtp_max_messages_per_connection: int = 100
+    smtp_idle_seconds: int = 60
 
     # Behavior
     cpa_name: str = "John Martinez"
     poll_seconds: int = 30
+    worker_count: int = 4
+    dispatch_queue_size: int = 100
+    # Hold every email this long so same-thread follow-ups are answered with it; adds that much latency (0 = off)
+    coalesce_window_seconds: float = 0.0
+    spool_enabled: bool = True  # durable on-disk work queue; off = bounded in-memory queue
+    spool_path: str = "state/spool.sqlite3"
+    spool_visibility_timeout_seconds: int = 900
+    spool_max_attempts: int = 5
     state_path: str = "state/processed_message_ids.jsonl"
+    state_backend: str = "sqlite"  # "sqlite" or "jsonl"; sqlite imports an existing STATE_PATH log once
+    state_db_path: str = "state/processed_message_ids.sqlite3"
+    state_retention_days: int = 0  # 0 = keep forever
+    state_fsync: bool = False
+    state_compact_interval_seconds: int = 3600
+    # Cross-process claims so several instances can share mailboxes; the path must be on storage they all see
+    claims_enabled: bool = False
+    claims_path: str = "state/claims.sqlite3"
+    claims_lease_seconds: int = 300  # a node silent this long loses its unfinished claims
+    claims_journal_mode: str = "wal"  # "wal" (nodes on one host) or "delete" (hosts sharing a network filesystem)
+    history_path: str = "state/interactions.sqlite3"  # empty = keep only the in-memory window
+    history_memory_window: int = 200
+    prompt_max_tokens: int = 1500  # email body budget after quote/signature stripping; 0 = no limit
+    classifier_keywords_path: str = ""  # JSON {"basic": [...], "intermediate": [...], "complex": [...]}
 
     # LLM / tools
     ollama_model: str = "llama3"
+    ollama_base_url: str = "http://localhost:11434"
+    ollama_keep_alive: str = "30m"  # how long Ollama keeps the model loaded between requests
+    warm_up: bool = True  # build pipelines and load models at startup; /healthz reports readiness
+    llm_max_concurrency: int = 4  # requests in flight to the model server (match OLLAMA_NUM_PARALLEL)
+
+    # Routing per complexity tier: pipeline "chain" (one LLM call) or "agent" (ReAct + tools).
+    # A blank model falls back to ollama_model; timeout 0 = no limit.
+    route_basic_pipeline: str = "chain"
+    route_basic_model: str = ""
+    route_basic_max_iterations: int = 1
+    route_basic_timeout_seconds: float = 60.0
+    route_intermediate_pipeline: str = "agent"
+    route_intermediate_model: str = ""
+    route_intermediate_max_iterations: int = 3
+    route_intermediate_timeout_seconds: float = 120.0
+    route_complex_pipeline: str = "agent"
+    route_complex_model: str = ""
+    route_complex_max_iterations: int = 3
+    route_complex_timeout_seconds: float = 180.0
+    # Whole-email budget; past the hedge point an agent route also starts the direct chain (0 = off)
+    llm_budget_seconds: float = 240.0
+    llm_hedge_after_seconds: float = 45.0
+    # Per-model breaker: skip the agent for breaker_open_seconds once this share of its
+    # recent calls failed or took longer than breaker_slow_call_seconds
+    breaker_failure_rate: float = 0.5
+    breaker_slow_call_seconds: float = 90.0
+    breaker_window: int = 20
+    breaker_min_calls: int = 5
+    breaker_open_seconds: float = 120.0
     enable_tools: bool = True
     tavily_api_key: str = ""
     langchain_api_key: str = ""  # LangSmith
@@ -38,30 +123,165 @@ class Settings:
     langsmith_endpoint: str = "https://api.smith.langchain.com"
     langchain_project: str = "General Purpose Email Agent"
 
+    # Reply cache
+    reply_cache_enabled: bool = True
+    reply_cache_max_entries: int = 1000
+    reply_cache_ttl_seconds: int = 7 * 24 * 3600
+    reply_cache_max_bytes: int = 16 * 1024 * 1024
+    reply_cache_path: str = ""  # empty = memory only
+
+    # Web search cache (agent tool)
+    search_cache_enabled: bool = True
+    search_cache_max_entries: int = 2000
+    search_cache_ttl_seconds: int = 6 * 3600
+    search_cache_path: str = "state/search_cache.sqlite3"  # empty = memory only
+
     # Web server
     web_host: str = "0.0.0.0"
     web_port: int = 5001
     web_debug: bool = False
+    api_batch_max_queries: int = 100  # per /api/v1/agent/batch request; they share LLM_MAX_CONCURRENCY
+    events_client_buffer: int = 256  # /api/events frames queued per client before its oldest are dropped
+    events_replay: int = 1000  # recent events kept for clients resuming with Last-Event-ID
 
     @staticmethod
     def from_env() -> "Settings":
-        return Settings(
+        settings = Settings(
+            imap_host=_env("IMAP_HOST", "imap.gmail.com") or "imap.gmail.com",
+            imap_port=int(_env("IMAP_PORT", "993") or "993"),
+            imap_ssl=(_env("IMAP_SSL", "true") or "true").lower() in ("1", "true", "yes", "y", "on"),
+            imap_mode=(_env("IMAP_MODE", "poll") or "poll").lower(),
+            imap_idle_seconds=int(_env("IMAP_IDLE_SECONDS", "1500") or "1500"),
+            imap_max_body_bytes=int(_env("IMAP_MAX_BODY_BYTES", str(64 * 1024)) or str(64 * 1024)),
             gmail_address=_env("GMAIL_ADDRESS", "") or "",
             gmail_app_password=_env("GMAIL_APP_PASSWORD", "") or "",
+            mailboxes_path=_env("MAILBOXES_PATH", "") or "",
             smtp_user=_env("SMTP_USER") or _env("GMAIL_ADDRESS", "") or "",
             smtp_app_password=_env("SMTP_APP_PASSWORD") or _env("GMAIL_APP_PASSWORD", "") or "",
+            smtp_host=_env("SMTP_HOST", "smtp.gmail.com") or "smtp.gmail.com",
+            smtp_port=int(_env("SMTP_PORT", "587") or "587"),
+            smtp_starttls=(_env("SMTP_STARTTLS", "true") or "true").lower() in ("1", "true", "yes", "y", "on"),
+            smtp_pool_size=int(_env("SMTP_POOL_SIZE", "4") or "4"),
+            smtp_max_messages_per_connection=int(_env("SMTP_MAX_MESSAGES_PER_CONNECTION", "100") or "100"),
+            smtp_idle_seconds=int(_env("SMTP_IDLE_SECONDS", "60") or "60"),
             cpa_name=_env("CPA_NAME", "John Martinez") or "John Martinez",
             poll_seconds=int(_env("POLL_SECONDS", "30") or "30"),
+            worker_count=int(_env("WORKER_COUNT", "4") or "4"),
+            dispatch_queue_size=int(_env("DISPATCH_QUEUE_SIZE", "100") or "100"),
+            coalesce_window_seconds=float(_env("COALESCE_WINDOW_SECONDS", "0") or "0"),
+            spool_enabled=(_env("SPOOL_ENABLED", "true") or "true").lower() in ("1", "true", "yes", "y", "on"),
+            spool_path=_env("SPOOL_PATH", "state/spool.sqlite3") or "state/spool.sqlite3",
+            spool_visibility_timeout_seconds=int(_env("SPOOL_VISIBILITY_TIMEOUT_SECONDS", "900") or "900"),
+            spool_max_attempts=int(_env("SPOOL_MAX_ATTEMPTS", "5") or "5"),
             state_path=_env("STATE_PATH", "state/processed_message_ids.jsonl") or "state/processed_message_ids.jsonl",
+            state_backend=(_env("STATE_BACKEND", "sqlite") or "sqlite").lower(),
+            state_db_path=_env("STATE_DB_PATH", "state/processed_message_ids.sqlite3") or "state/processed_message_ids.sqlite3",
+            state_retention_days=int(_env("STATE_RETENTION_DAYS", "0") or "0"),
+            state_fsync=(_env("STATE_FSYNC", "false") or "false").lower() in ("1", "true", "yes", "y", "on"),
+            state_compact_interval_seconds=int(_env("STATE_COMPACT_INTERVAL_SECONDS", "3600") or "3600"),
+            claims_enabled=(_env("CLAIMS_ENABLED", "false") or "false").lower() in ("1", "true", "yes", "y", "on"),
+            claims_path=_env("CLAIMS_PATH", "state/claims.sqlite3") or "state/claims.sqlite3",
+            claims_lease_seconds=int(_env("CLAIMS_LEASE_SECONDS", "300") or "300"),
+            claims_journal_mode=(_env("CLAIMS_JOURNAL_MODE", "wal") or "wal").lower(),
+            history_path=_env("HISTORY_PATH", "state/interactions.sqlite3") or "state/interactions.sqlite3",
+            history_memory_window=int(_env("HISTORY_MEMORY_WINDOW", "200") or "200"),
+            prompt_max_tokens=int(_env("PROMPT_MAX_TOKENS", "1500") or "1500"),
+            classifier_keywords_path=_env("CLASSIFIER_KEYWORDS_PATH", "") or "",
             ollama_model=_env("OLLAMA_MODEL", "llama3") or "llama3",
+            ollama_base_url=_env("OLLAMA_BASE_URL", "http://localhost:11434") or "http://localhost:11434",
+            ollama_keep_alive=_env("OLLAMA_KEEP_ALIVE", "30m") or "30m",
+            warm_up=(_env("WARM_UP", "true") or "true").lower() in ("1", "true", "yes", "y", "on"),
+            llm_max_concurrency=int(_env("LLM_MAX_CONCURRENCY", "4") or "4"),
+            route_basic_pipeline=(_env("ROUTE_BASIC_PIPELINE", "chain") or "chain").lower(),
+            route_basic_model=_env("ROUTE_BASIC_MODEL", "") or "",
+            route_basic_max_iterations=int(_env("ROUTE_BASIC_MAX_ITERATIONS", "1") or "1"),
+            route_basic_timeout_seconds=float(_env("ROUTE_BASIC_TIMEOUT_SECONDS", "60") or "60"),
+            route_intermediate_pipeline=(_env("ROUTE_INTERMEDIATE_PIPELINE", "agent") or "agent").lower(),
+            route_intermediate_model=_env("ROUTE_INTERMEDIATE_MODEL", "") or "",
+            route_intermediate_max_iterations=int(_env("ROUTE_INTERMEDIATE_MAX_ITERATIONS", "3") or "3"),
+            route_intermediate_timeout_seconds=float(_env("ROUTE_INTERMEDIATE_TIMEOUT_SECONDS", "120") or "120"),
+            route_complex_pipeline=(_env("ROUTE_COMPLEX_PIPELINE", "agent") or "agent").lower(),
+            route_complex_model=_env("ROUTE_COMPLEX_MODEL", "") or "",
+            route_complex_max_iterations=int(_env("ROUTE_COMPLEX_MAX_ITERATIONS", "3") or "3"),
+            route_complex_timeout_seconds=float(_env("ROUTE_COMPLEX_TIMEOUT_SECONDS", "180") or "180"),
+            llm_budget_seconds=float(_env("LLM_BUDGET_SECONDS", "240") or "240"),
+            llm_hedge_after_seconds=float(_env("LLM_HEDGE_AFTER_SECONDS", "45") or "45"),
+            breaker_failure_rate=float(_env("BREAKER_FAILURE_RATE", "0.5") or "0.5"),
+            breaker_slow_call_seconds=float(_env("BREAKER_SLOW_CALL_SECONDS", "90") or "90"),
+            breaker_window=int(_env("BREAKER_WINDOW", "20") or "20"),
+            breaker_min_calls=int(_env("BREAKER_MIN_CALLS", "5") or "5"),
+            breaker_open_seconds=float(_env("BREAKER_OPEN_SECONDS", "120") or "120"),
             enable_tools=(_env("ENABLE_TOOLS", "true") or "true").lower() in ("1", "true", "yes", "y", "on"),
             tavily_api_key=_env("TAVILY_API_KEY", "") or "",
             langchain_api_key=_env("LANGCHAIN_API_KEY", "") or "",
             langsmith_tracing=(_env("LANGSMITH_TRACING", "false") or "false").lower() in ("1", "true", "yes", "y", "on"),
             langsmith_endpoint=_env("LANGSMITH_ENDPOINT", "https://api.smith.langchain.com") or "https://api.smith.langchain.com",
             langchain_project=_env("LANGCHAIN_PROJECT", "General Purpose Email Agent") or "General Purpose Email Agent",
+            reply_cache_enabled=(_env("REPLY_CACHE_ENABLED", "true") or "true").lower() in ("1", "true", "yes", "y", "on"),
+            reply_cache_max_entries=int(_env("REPLY_CACHE_MAX_ENTRIES", "1000") or "1000"),
+            reply_cache_ttl_seconds=int(_env("REPLY_CACHE_TTL_SECONDS", str(7 * 24 * 3600)) or str(7 * 24 * 3600)),
+            reply_cache_max_bytes=int(_env("REPLY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)) or str(16 * 1024 * 1024)),
+            reply_cache_path=_env("REPLY_CACHE_PATH", "") or "",
+            search_cache_enabled=(_env("SEARCH_CACHE_ENABLED", "true") or "true").lower() in ("1", "true", "yes", "y", "on"),
+            search_cache_max_entries=int(_env("SEARCH_CACHE_MAX_ENTRIES", "2000") or "2000"),
+            search_cache_ttl_seconds=int(_env("SEARCH_CACHE_TTL_SECONDS", str(6 * 3600)) or str(6 * 3600)),
+            search_cache_path=_env("SEARCH_CACHE_PATH", "state/search_cache.sqlite3") or "state/search_cache.sqlite3",
             web_host=_env("WEB_HOST", "0.0.0.0") or "0.0.0.0",
             web_port=int(_env("WEB_PORT", "5001") or "5001"),
             web_debug=(_env("WEB_DEBUG", "false") or "false").lower() in ("1", "true", "yes", "y", "on"),
+            api_batch_max_queries=int(_env("API_BATCH_MAX_QUERIES", "100") or "100"),
+            events_client_buffer=int(_env("EVENTS_CLIENT_BUFFER", "256") or "256"),
+            events_replay=int(_env("EVENTS_REPLAY", "1000") or "1000"),
         )
+        if settings.claims_enabled and not settings.spool_enabled:
+            # An email held by another node is retried through the spool; without it, it would be dropped
+            raise ValueError("CLAIMS_ENABLED requires SPOOL_ENABLED")
+        return settings
+
+    def mailboxes(self) -> List[Mailbox]:
+        """
+        Accounts to monitor. Without ``mailboxes_path`` this is the single
+        GMAIL_ADDRESS/SMTP_* account, named "default". Each JSON entry needs
+        ``gmail_address`` and ``gmail_app_password``; ``name`` defaults to the
+        address and other fields default to the global settings.
+        """
+        if not self.mailboxes_path:
+            return [
+                Mailbox(
+                    name=DEFAULT_MAILBOX,
+                    gmail_address=self.gmail_address,
+                    gmail_app_password=self.gmail_app_password,
+                    imap_host=self.imap_host,
+                    imap_port=self.imap_port,
+                    smtp_host=self.smtp_host,
+                    smtp_port=self.smtp_port,
+                    smtp_user=self.smtp_user,
+                    smtp_app_password=self.smtp_app_password,
+                    cpa_name=self.cpa_name,
+                )
+            ]
 
+        with open(self.mailboxes_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        out: List[Mailbox] = []
+        for entry in entries:
+            address = entry["gmail_address"]
+            password = entry["gmail_app_password"]
+            out.append(
+                Mailbox(
+                    name=entry.get("name") or address,
+                    gmail_address=address,
+                    gmail_app_password=password,
+                    imap_host=entry.get("imap_host") or self.imap_host,
+                    imap_port=int(entry.get("imap_port") or self.imap_port),
+                    smtp_host=entry.get("smtp_host") or self.smtp_host,
+                    smtp_port=int(entry.get("smtp_port") or self.smtp_port),
+                    smtp_user=entry.get("smtp_user") or address,
+                    smtp_app_password=entry.get("smtp_app_password") or password,
+                    cpa_name=entry.get("cpa_name") or self.cpa_name,
+                )
+            )
+        names = [m.name for m in out]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate mailbox names in {self.mailboxes_path}: {names}")
+        return out
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class LruTtlCache:
+    """
+    Thread-safe string cache with LRU + TTL eviction and an optional SQLite backing store.
+
+    The in-memory tier is bounded by ``max_entries`` and ``max_bytes`` (approximate,
+    counted as key + value length). When ``path`` is set, entries are also written
+    to disk so they survive restarts; disk hits are promoted back into memory.
+    """
+
+    _PRUNE_EVERY = 500
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 86400.0, max_bytes: int = 16 * 1024 * 1024, path: str = ""):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._lock = Lock()
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key -> (value, expires_at)
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._puts_since_prune = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._open_db(Path(path))
+
+    def _open_db(self, path: Path) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        except sqlite3.Error:
+            log.exception("Cache store %s unavailable; using memory only", path)
+            self._db = None
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[0]
+                self._remove_locked(key)
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    self._insert_locked(key, row[0], row[1])
+                    self._hits += 1
+                    return row[0]
+
+            self._misses += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._insert_locked(key, value, expires_at)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+                    self._puts_since_prune += 1
+                    if self._puts_since_prune >= self._PRUNE_EVERY:
+                        self._puts_since_prune = 0
+                        self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+                except sqlite3.Error:
+                    log.exception("Failed writing cache entry to disk")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) * 100.0 if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self._evictions,
+            }
+
+    def _insert_locked(self, key: str, value: str, expires_at: float) -> None:
+        if key in self._entries:
+            self._remove_locked(key)
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, expires_at)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove_locked(oldest)
+            self._evictions += 1
+
+    def _remove_locked(self, key: str) -> None:
+        value, _expires_at = self._entries.pop(key)
+        self._bytes -= len(key) + len(value)
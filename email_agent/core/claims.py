@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Dict, Set
+
+from ..core.state import scoped_id
+
+log = logging.getLogger(__name__)
+
+CLAIMED = "claimed"  # this node now owns the message
+DONE = "done"  # some node already answered it
+HELD = "held"  # another live node is working on it
+
+
+class ClaimHeld(Exception):
+    """Another node holds the lease on a message; try again after it expires."""
+
+
+class ClaimStore:
+    """
+    Cross-process claims on message ids, so each email is answered by one node.
+
+    Claims live in a SQLite database on storage shared by every node. A claim
+    is a lease: the owning node renews its leases from a heartbeat thread, and
+    once a node stops renewing (crash, partition), its unfinished claims can be
+    taken over by any other node. ``complete`` marks a message answered for
+    good. Every check-and-set runs in a ``BEGIN IMMEDIATE`` transaction, so two
+    nodes can't both win the same claim.
+
+    WAL needs shared memory and is only safe when all nodes are on one host;
+    use ``journal_mode="delete"`` when several hosts share a network filesystem.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = 300.0,
+        journal_mode: str = "wal",
+        retention_days: float = 30,
+        owner: str = "",
+    ):
+        self.lease_seconds = max(1.0, lease_seconds)
+        self.retention_days = retention_days
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._lock = Lock()
+        self._held: Set[str] = set()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Writers on other nodes hold the database lock briefly; wait rather than fail
+        db = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        db.execute(f"PRAGMA journal_mode={'WAL' if journal_mode.lower() == 'wal' else 'DELETE'}")
+        db.execute("PRAGMA synchronous=FULL")
+        db.execute(
+            """CREATE TABLE IF NOT EXISTS claims (
+                message_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                lease_until REAL NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID"""
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS claims_owner ON claims (owner, done)")
+        self._db = db
+
+        self._stop = Event()
+        self._heartbeat = Thread(target=self._heartbeat_loop, name="claims-heartbeat", daemon=True)
+        self._heartbeat.start()
+        log.info("Claim store %s opened as %s (lease %gs)", path, self.owner, self.lease_seconds)
+
+    def claim(self, message_id: str, namespace: str = "") -> str:
+        """Try to take ``message_id``; returns CLAIMED, DONE or HELD."""
+        key = scoped_id(message_id, namespace)
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT owner, lease_until, done FROM claims WHERE message_id = ?", (key,)
+                ).fetchone()
+                if row is not None and row[2]:
+                    result = DONE
+                elif row is not None and row[0] != self.owner and row[1] > now:
+                    result = HELD
+                else:
+                    if row is not None and row[0] != self.owner:
+                        log.warning("Taking over message_id=%s from %s (lease expired)", message_id, row[0])
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO claims (message_id, owner, lease_until, done, updated) VALUES (?, ?, ?, 0, ?)",
+                        (key, self.owner, now + self.lease_seconds, now),
+                    )
+                    self._held.add(key)
+                    result = CLAIMED
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return result
+
+    def complete(self, message_id: str, namespace: str = "") -> None:
+        """Mark a claimed message answered; other nodes will see DONE from now on."""
+        key = scoped_id(message_id, namespace)
+        with self._lock:
+            self._db.execute(
+                "UPDATE claims SET done = 1, updated = ? WHERE message_id = ? AND owner = ?",
+                (time.time(), key, self.owner),
+            )
+            self._held.discard(key)
+
+    def release(self, message_id: str, namespace: str = "") -> None:
+        """Give up an unfinished claim (e.g. processing failed) so any node may retry it at once."""
+        key = scoped_id(message_id, namespace)
+        with self._lock:
+            self._db.execute("DELETE FROM claims WHERE message_id = ? AND owner = ? AND done = 0", (key, self.owner))
+            self._held.discard(key)
+
+    def renew(self) -> int:
+        """Extend the leases of every claim this node holds. Returns how many were renewed."""
+        now = time.time()
+        with self._lock:
+            if not self._held:
+                return 0
+            keys = list(self._held)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                renewed = 0
+                for key in keys:
+                    renewed += self._db.execute(
+                        "UPDATE claims SET lease_until = ?, updated = ? WHERE message_id = ? AND owner = ? AND done = 0",
+                        (now + self.lease_seconds, now, key, self.owner),
+                    ).rowcount
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if renewed < len(keys):
+            # Our lease lapsed (e.g. a long GC pause or suspended host) and another node took over
+            log.warning("Lost %d claims to other nodes", len(keys) - renewed)
+        return renewed
+
+    def purge(self) -> int:
+        """Delete answered claims older than the retention window. Returns the number removed."""
+        if self.retention_days <= 0:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            return self._db.execute("DELETE FROM claims WHERE done = 1 AND updated < ?", (cutoff,)).rowcount
+
+    def _heartbeat_loop(self) -> None:
+        # Renew well inside the lease so a busy node never looks dead
+        interval = self.lease_seconds / 3
+        last_purge = time.monotonic()
+        while not self._stop.wait(interval):
+            try:
+                self.renew()
+                if time.monotonic() - last_purge > 3600:
+                    last_purge = time.monotonic()
+                    self.purge()
+            except Exception:
+                log.exception("Claim heartbeat failed")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            held = len(self._held)
+            done = self._db.execute("SELECT COUNT(*) FROM claims WHERE done = 1").fetchone()[0]
+        return {"owner": self.owner, "held": held, "completed": done}
+
+    def close(self) -> None:
+        self._stop.set()
+        self._heartbeat.join(timeout=5)
+        with self._lock:
+            # Hand unfinished work straight to the other nodes instead of waiting for lease expiry
+            for key in self._held:
+                self._db.execute("DELETE FROM claims WHERE message_id = ? AND owner = ? AND done = 0", (key, self.owner))
+            self._held.clear()
+            self._db.close()
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from threading import Condition, Thread
+from typing import Callable, Deque, Dict, List, Optional, Set
+
+from ..core.claims import ClaimHeld
+from ..core.metrics import METRICS
+from ..core.models import IncomingEmail
+from ..core.spool import WorkSpool
+
+log = logging.getLogger(__name__)
+
+
+class EmailDispatcher:
+    """
+    Bounded work queue between the IMAP monitor and the email processor.
+
+    A fixed pool of worker threads runs ``handler`` for each submitted email.
+    Emails from the same sender are handled one at a time and in arrival order;
+    emails from different senders run concurrently, highest ``priority`` first.
+    ``submit`` blocks while the queue is full so a slow LLM applies backpressure
+    to the IMAP fetch loop.
+
+    With a ``spool`` the queue lives on disk instead: ``submit`` returns once the
+    email is durably spooled, and it is acked only after the handler finishes,
+    so a crash never loses a fetched email. Failed emails are retried with
+    backoff. ``max_queue`` does not apply to the spool.
+
+    With ``coalesce_seconds`` > 0 an email is held that long after it arrives;
+    follow-ups from the same sender in the same thread that arrive meanwhile
+    are attached to it as ``followups`` and handled in the same call.
+    """
+
+    # How often idle workers re-check the spool for expired leases and retries
+    _SPOOL_POLL_SECONDS = 1.0
+
+    def __init__(
+        self,
+        handler: Callable[[IncomingEmail], object],
+        workers: int = 4,
+        max_queue: int = 100,
+        spool: Optional[WorkSpool] = None,
+        priority: Optional[Callable[[IncomingEmail], int]] = None,
+        coalesce_seconds: float = 0.0,
+    ):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.spool = spool
+        self.priority = priority
+        self.coalesce_seconds = max(0.0, coalesce_seconds)
+
+        self._cond = Condition()
+        self._pending: Deque[IncomingEmail] = deque()
+        self._busy_senders: Set[str] = set()
+        self._in_flight = 0
+        self._running = False
+        self._threads: List[Thread] = []
+
+        METRICS.gauge("email_agent_dispatch_queue_depth", "Emails waiting for a worker.", self._depth)
+        METRICS.gauge("email_agent_in_flight", "Emails currently being processed.", lambda: self._in_flight)
+
+    def start(self) -> None:
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._threads = [
+            Thread(target=self._worker, name=f"email-worker-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+        log.info(
+            "Started email dispatcher with %d workers (%s)",
+            self.workers, "spooled" if self.spool is not None else f"queue={self.max_queue}",
+        )
+
+    def stop(self, drain: bool = True, timeout: Optional[float] = None) -> None:
+        """
+        Stop accepting work; by default wait for queued and in-flight emails to finish.
+        With a spool only in-flight emails are waited for.
+        """
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            # Spooled emails are never dropped; they are picked up on the next start
+            if not drain and self.spool is None:
+                dropped = len(self._pending)
+                self._pending.clear()
+                if dropped:
+                    log.warning("Dropped %d queued emails on shutdown", dropped)
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        log.info("Stopped email dispatcher")
+
+    def submit(
+        self,
+        sender: str,
+        subject: str,
+        body: str,
+        message_id: str,
+        timeout: Optional[float] = None,
+        mailbox: str = "",
+        in_reply_to: str = "",
+        references: str = "",
+    ) -> bool:
+        """Queue an email for processing. Returns False if the dispatcher is stopped or the wait timed out."""
+        item = IncomingEmail(
+            sender=sender,
+            subject=subject,
+            body=body,
+            message_id=message_id,
+            mailbox=mailbox,
+            in_reply_to=in_reply_to,
+            references=references,
+            received_at=time.time(),
+        )
+        if self.priority is not None:
+            item.priority = self.priority(item)
+        if self.spool is not None:
+            with self._cond:
+                if not self._running:
+                    return False
+            if not self.spool.put(item):
+                log.info("message_id=%s is already spooled", message_id)
+            with self._cond:
+                self._cond.notify_all()
+            return True
+
+        with self._cond:
+            if not self._cond.wait_for(lambda: not self._running or len(self._pending) < self.max_queue, timeout):
+                log.warning("Dispatch queue full; gave up queueing message_id=%s", message_id)
+                return False
+            if not self._running:
+                return False
+            self._pending.append(item)
+            self._cond.notify_all()
+        return True
+
+    # Lets the dispatcher be passed straight to RealEmailMonitor.start()
+    __call__ = submit
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            in_flight = self._in_flight
+        stats = {
+            "workers": self.workers,
+            "queue_depth": self._depth(),
+            "queue_capacity": self.max_queue,
+            "in_flight": in_flight,
+        }
+        if self.spool is not None:
+            stats.update(self.spool.stats())
+        return stats
+
+    def _depth(self) -> int:
+        return self.spool.depth() if self.spool is not None else len(self._pending)
+
+    def _take_locked(self) -> Optional[IncomingEmail]:
+        # Highest-priority email that is the oldest pending one of a sender not
+        # already being handled by another worker and whose coalescing window
+        # has passed; FIFO among equal priorities
+        ready_at = time.time() - (self.coalesce_seconds if self._running else 0.0)
+        best = -1
+        seen: Set[str] = set()
+        for idx, item in enumerate(self._pending):
+            key = item.sender_key
+            if key in seen or key in self._busy_senders:
+                seen.add(key)
+                continue
+            seen.add(key)
+            if item.received_at > ready_at:
+                continue
+            if best < 0 or item.priority > self._pending[best].priority:
+                best = idx
+        if best < 0:
+            return None
+        item = self._pending[best]
+        del self._pending[best]
+        if self.coalesce_seconds > 0:
+            self._attach_followups_locked(item)
+        self._busy_senders.add(item.sender_key)
+        self._in_flight += 1
+        return item
+
+    def _attach_followups_locked(self, item: IncomingEmail) -> None:
+        rest: Deque[IncomingEmail] = deque()
+        for other in self._pending:
+            if any(m.same_thread(other) for m in item.messages):
+                item.followups.append(other)
+            else:
+                rest.append(other)
+        self._pending = rest
+
+    def _next_ready_in_locked(self) -> Optional[float]:
+        if not self._pending or not self.coalesce_seconds:
+            return None
+        # Only emails _take_locked could pick; a busy sender's worker notifies when it finishes
+        earliest = None
+        seen: Set[str] = set()
+        for item in self._pending:
+            key = item.sender_key
+            if key in seen or key in self._busy_senders:
+                seen.add(key)
+                continue
+            seen.add(key)
+            if earliest is None or item.received_at < earliest:
+                earliest = item.received_at
+        if earliest is None:
+            return None
+        return max(0.01, earliest + self.coalesce_seconds - time.time())
+
+    def _lease_locked(self):
+        leased = self.spool.lease(self.coalesce_seconds)
+        if leased is not None:
+            self._in_flight += 1
+        return leased
+
+    def _worker(self) -> None:
+        if self.spool is not None:
+            self._spool_worker()
+            return
+        while True:
+            with self._cond:
+                item = self._take_locked()
+                while item is None:
+                    if not self._running and not self._pending:
+                        return
+                    self._cond.wait(self._next_ready_in_locked())
+                    item = self._take_locked()
+                # Space was freed for a blocked submit()
+                self._cond.notify_all()
+
+            try:
+                self.handler(item)
+            except ClaimHeld as e:
+                # Without a spool there is nowhere to park it; the owning node answers it
+                log.info("%s; skipping", e)
+            except Exception:
+                log.exception("Failed processing message_id=%s", item.message_id)
+            finally:
+                with self._cond:
+                    self._busy_senders.discard(item.sender_key)
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def _spool_worker(self) -> None:
+        while True:
+            with self._cond:
+                leased = self._lease_locked() if self._running else None
+                while leased is None:
+                    if not self._running:
+                        return
+                    self._cond.wait(self._SPOOL_POLL_SECONDS)
+                    leased = self._lease_locked() if self._running else None
+
+            lease_ids, item = leased
+            try:
+                self.handler(item)
+                self.spool.ack(lease_ids)
+            except ClaimHeld as e:
+                log.info("%s; will check again later", e)
+                self.spool.retry(lease_ids)
+            except Exception:
+                log.exception("Failed processing message_id=%s; will retry", item.message_id)
+                self.spool.retry(lease_ids)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    # The sender's next email may now be eligible
+                    self._cond.notify_all()
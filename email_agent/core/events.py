@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import json
+import time
+from collections import deque
+from threading import Condition, Lock
+from typing import Deque, Dict, List, Set, Tuple
+
+
+class Subscription:
+    """
+    One client's view of an EventBroadcaster: a bounded buffer of encoded frames.
+
+    When the client falls more than ``maxlen`` events behind, the oldest are
+    dropped and ``get`` reports it, so the client can reload a snapshot.
+    """
+
+    def __init__(self, broadcaster: "EventBroadcaster", maxlen: int):
+        self._broadcaster = broadcaster
+        self._cond = Condition(Lock())
+        self._frames: Deque[str] = deque(maxlen=maxlen)
+        self._lost = False
+        self.dropped = 0
+
+    def _push(self, frame: str) -> None:
+        with self._cond:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+                self._lost = True
+            self._frames.append(frame)
+            self._cond.notify()
+
+    def get(self, timeout: float) -> Tuple[List[str], bool]:
+        """
+        Wait up to ``timeout`` seconds for events. Returns the buffered frames and
+        whether events were dropped since the last call (empty list on timeout).
+        """
+        with self._cond:
+            if not self._frames:
+                self._cond.wait(timeout)
+            frames = list(self._frames)
+            self._frames.clear()
+            lost, self._lost = self._lost, False
+        return frames, lost
+
+    def close(self) -> None:
+        self._broadcaster._unsubscribe(self)
+
+
+class EventBroadcaster:
+    """
+    Fans events out to any number of subscribers without ever blocking the publisher.
+
+    Each event is encoded once as a Server-Sent Events frame and appended to
+    every subscriber's bounded buffer. Ids are "<stream>-<seq>", the stream
+    being fixed per broadcaster, so an id from before a restart is never
+    mistaken for a current one. The last ``replay`` frames are kept so a client
+    reconnecting with ``Last-Event-ID`` gets what it missed; ``subscribe``
+    tells it to reload when that is no longer possible.
+    """
+
+    def __init__(self, client_buffer: int = 256, replay: int = 1000):
+        self.client_buffer = max(1, client_buffer)
+        self.stream = format(time.time_ns(), "x")
+        self._lock = Lock()
+        self._replay: Deque[Tuple[int, str]] = deque(maxlen=max(1, replay))
+        self._subscribers: Set[Subscription] = set()
+        self._last_id = 0
+        self._published = 0
+
+    @property
+    def last_id(self) -> str:
+        with self._lock:
+            return f"{self.stream}-{self._last_id}"
+
+    def publish(self, event: str, data: object) -> str:
+        """Send ``data`` (JSON-serializable) as an ``event`` to every subscriber; returns its id."""
+        payload = json.dumps(data, default=str)
+        with self._lock:
+            self._last_id += 1
+            seq = self._last_id
+            frame = f"id: {self.stream}-{seq}\nevent: {event}\ndata: {payload}\n\n"
+            self._replay.append((seq, frame))
+            self._published += 1
+            # Pushing is O(1) per subscriber, and doing it under the lock keeps every buffer in id order
+            for sub in self._subscribers:
+                sub._push(frame)
+        return f"{self.stream}-{seq}"
+
+    def subscribe(self, last_event_id: str = "") -> Tuple[Subscription, bool]:
+        """
+        Start receiving events. With ``last_event_id``, events after it are
+        replayed first. Returns the subscription and whether the client is up to
+        date; False means it must load a fresh snapshot (first connect, or the
+        events it missed are no longer kept).
+        """
+        stream, _, seq = last_event_id.rpartition("-")
+        last = int(seq) if stream == self.stream and seq.isdigit() else None
+        sub = Subscription(self, self.client_buffer)
+        with self._lock:
+            resumed = False
+            if last is not None and last <= self._last_id:
+                oldest = self._replay[0][0] if self._replay else self._last_id + 1
+                if last >= oldest - 1:
+                    resumed = True
+                    for event_seq, frame in self._replay:
+                        if event_seq > last:
+                            sub._push(frame)
+            self._subscribers.add(sub)
+        return sub, resumed
+
+    def _unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            subscribers = list(self._subscribers)
+            out = {"last_id": f"{self.stream}-{self._last_id}", "published": self._published, "subscribers": len(subscribers)}
+        out["dropped"] = sum(s.dropped for s in subscribers)
+        return out
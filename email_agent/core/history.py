@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+from collections import deque
+from pathlib import Path
+from threading import Lock
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..core.models import INTERACTION_FIELDS as FIELDS, EmailInteraction
+
+log = logging.getLogger(__name__)
+
+
+class InteractionHistory:
+    """
+    Interaction log persisted to SQLite, with only a bounded recent window in memory.
+
+    Rows are indexed by timestamp, sender and complexity and read back in
+    newest-first pages using the row id as the cursor, so a dashboard refresh
+    costs O(page) regardless of history size. With an empty ``path`` nothing is
+    persisted and only the in-memory window is queryable. The window holds
+    (row id, interaction) pairs and builds dicts only for the rows served.
+    """
+
+    def __init__(self, path: str = "", memory_window: int = 200):
+        self._lock = Lock()
+        self._recent: Deque[Tuple[int, EmailInteraction]] = deque(maxlen=max(1, memory_window))
+        self._next_id = 1
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._open_db(Path(path))
+
+    def _open_db(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            """CREATE TABLE IF NOT EXISTS interactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                timestamp TEXT NOT NULL,
+                sender TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                content TEXT NOT NULL,
+                complexity TEXT NOT NULL,
+                response TEXT NOT NULL,
+                processing_time REAL NOT NULL,
+                reply_sent INTEGER NOT NULL,
+                reply_status TEXT NOT NULL,
+                message_id TEXT NOT NULL,
+                mailbox TEXT NOT NULL DEFAULT ''
+            )"""
+        )
+        columns = {row[1] for row in db.execute("PRAGMA table_info(interactions)")}
+        if "mailbox" not in columns:
+            db.execute("ALTER TABLE interactions ADD COLUMN mailbox TEXT NOT NULL DEFAULT ''")
+        db.execute("CREATE INDEX IF NOT EXISTS interactions_ts ON interactions (ts)")
+        db.execute("CREATE INDEX IF NOT EXISTS interactions_sender ON interactions (sender, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS interactions_complexity ON interactions (complexity, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS interactions_mailbox ON interactions (mailbox, id)")
+        self._db = db
+
+        # Warm the in-memory window so the dashboard has something after a restart
+        cols = ", ".join(("id",) + FIELDS)
+        rows = db.execute(f"SELECT {cols} FROM interactions ORDER BY id DESC LIMIT ?", (self._recent.maxlen,)).fetchall()
+        for row in reversed(rows):
+            self._recent.append((row[0], EmailInteraction(*row[1:])))
+        self._next_id = (rows[0][0] + 1) if rows else 1
+
+    @staticmethod
+    def _row_dict(row: Sequence, cols: Sequence[str]) -> Dict:
+        d = dict(zip(cols, row))
+        if "reply_sent" in d:
+            d["reply_sent"] = bool(d["reply_sent"])
+        return d
+
+    def append(self, interaction: EmailInteraction) -> int:
+        with self._lock:
+            if self._db is not None:
+                record = interaction.to_dict()
+                cur = self._db.execute(
+                    f"INSERT INTO interactions (ts, {', '.join(FIELDS)}) VALUES (?{', ?' * len(FIELDS)})",
+                    [interaction.ts] + [record[f] for f in FIELDS],
+                )
+                row_id = cur.lastrowid
+            else:
+                row_id = self._next_id
+            self._next_id = row_id + 1
+            self._recent.append((row_id, interaction))
+        return row_id
+
+    def page(
+        self,
+        cursor: Optional[int] = None,
+        limit: int = 50,
+        sender: str = "",
+        complexity: str = "",
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        fields: Optional[Iterable[str]] = None,
+        mailbox: str = "",
+    ) -> Dict:
+        """
+        Newest-first page of interactions with ``id < cursor``.
+
+        Returns {"items": [...], "next_cursor": id-or-None}. ``fields`` limits
+        the keys returned per item (``id`` is always included).
+        """
+        limit = max(1, min(limit, 500))
+        cols = ("id",) + tuple(f for f in (fields or FIELDS) if f in FIELDS)
+
+        # The memory window holds the newest rows contiguously, so if it yields a full
+        # page (or holds the whole history) the result matches what SQLite would return.
+        items = self._page_memory(cursor, limit, sender, complexity, since, until, mailbox)
+        if self._db is not None and len(items) <= limit and not self._window_is_complete():
+            items = self._page_db(cols, cursor, limit, sender, complexity, since, until, mailbox)
+        else:
+            items = [dict(id=row_id, **i.to_dict(cols[1:])) for row_id, i in items]
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = items[-1]["id"]
+        return {"items": items, "next_cursor": next_cursor}
+
+    def _window_is_complete(self) -> bool:
+        # The window is warmed with up to maxlen rows, so a partly filled one is the whole table
+        with self._lock:
+            return len(self._recent) < (self._recent.maxlen or 0)
+
+    def _page_db(
+        self,
+        cols: Sequence[str],
+        cursor: Optional[int],
+        limit: int,
+        sender: str,
+        complexity: str,
+        since: Optional[float],
+        until: Optional[float],
+        mailbox: str = "",
+    ) -> List[Dict]:
+        where: List[str] = []
+        params: List = []
+        if cursor is not None:
+            where.append("id < ?")
+            params.append(cursor)
+        if sender:
+            where.append("sender = ?")
+            params.append(sender)
+        if complexity:
+            where.append("complexity = ?")
+            params.append(complexity)
+        if mailbox:
+            where.append("mailbox = ?")
+            params.append(mailbox)
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            params.append(until)
+        sql = f"SELECT {', '.join(cols)} FROM interactions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            if self._db is None:
+                return []
+            rows = self._db.execute(sql, params + [limit + 1]).fetchall()
+        return [self._row_dict(r, cols) for r in rows]
+
+    def _page_memory(
+        self,
+        cursor: Optional[int],
+        limit: int,
+        sender: str,
+        complexity: str,
+        since: Optional[float],
+        until: Optional[float],
+        mailbox: str = "",
+    ) -> List[Tuple[int, EmailInteraction]]:
+        with self._lock:
+            window = list(self._recent)
+        out: List[Tuple[int, EmailInteraction]] = []
+        for row_id, item in reversed(window):
+            if cursor is not None and row_id >= cursor:
+                continue
+            if sender and item.sender != sender:
+                continue
+            if complexity and item.complexity != complexity:
+                continue
+            if mailbox and item.mailbox != mailbox:
+                continue
+            if (since is not None and item.ts < since) or (until is not None and item.ts >= until):
+                continue
+            out.append((row_id, item))
+            if len(out) > limit:
+                break
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
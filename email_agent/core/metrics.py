@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+class Histogram:
+    """
+    Prometheus-style histogram with per-thread shards.
+
+    ``observe`` only touches counters owned by the calling thread, so the hot
+    path takes no lock; shards are summed when the histogram is collected.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        self._shards: List[Dict[LabelValues, List[float]]] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict[LabelValues, List[float]]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            # [bucket counts..., +Inf count, sum]
+            row = [0.0] * (len(self.buckets) + 2)
+            shard[labels] = row
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def collect(self) -> Dict[LabelValues, List[float]]:
+        """Merged per-label rows: non-cumulative bucket counts, then +Inf count, then sum."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        merged: Dict[LabelValues, List[float]] = {}
+        for shard in shards:
+            for labels, row in list(shard.items()):
+                acc = merged.setdefault(labels, [0.0] * len(row))
+                for i, v in enumerate(row):
+                    acc[i] += v
+        return merged
+
+    def percentiles(self, quantiles: Sequence[float] = (0.5, 0.95, 0.99)) -> Dict[LabelValues, Dict[str, float]]:
+        """Approximate quantiles per label set, interpolated within buckets."""
+        out: Dict[LabelValues, Dict[str, float]] = {}
+        for labels, row in self.collect().items():
+            counts = row[:-1]
+            total = sum(counts)
+            if not total:
+                continue
+            result = {}
+            for q in quantiles:
+                rank = q * total
+                seen = 0.0
+                for i, c in enumerate(counts):
+                    if seen + c >= rank and c:
+                        lower = self.buckets[i - 1] if i > 0 else 0.0
+                        upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                        result[f"p{int(q * 100)}"] = lower + (upper - lower) * ((rank - seen) / c)
+                        break
+                    seen += c
+            result["count"] = total
+            result["avg"] = row[-1] / total
+            out[labels] = result
+        return out
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, row in sorted(self.collect().items()):
+            base = _labels(self.label_names, labels)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_join(base, le_label)} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_join(base)} {row[-1]:.6f}")
+            lines.append(f"{self.name}_count{_join(base)} {cumulative:g}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = float(self.fn())
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value:g}"]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Union[Histogram, Gauge]] = {}
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if not isinstance(metric, Histogram):
+                metric = Histogram(name, help_text, label_names, buckets)
+                self._metrics[name] = metric
+            return metric
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], float]) -> Gauge:
+        """Register (or replace) a callback gauge."""
+        with self._lock:
+            metric = Gauge(name, help_text, fn)
+            self._metrics[name] = metric
+            return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _labels(names: Sequence[str], values: LabelValues) -> str:
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+def _join(*parts: str) -> str:
+    inner = ",".join(p for p in parts if p)
+    return "{" + inner + "}" if inner else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+METRICS = MetricsRegistry()
+
+STAGE_SECONDS = METRICS.histogram(
+    "email_agent_stage_seconds",
+    "Time spent in each pipeline stage.",
+    ("stage",),
+)
+EMAIL_SECONDS = METRICS.histogram(
+    "email_agent_email_seconds",
+    "End-to-end time per email, from classification through SMTP send and state persist.",
+)
+
+
+def stage(name: str):
+    """Context manager timing one pipeline stage: ``with stage("smtp_send"): ...``."""
+    return STAGE_SECONDS.time(name)
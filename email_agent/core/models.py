@@ -1,21 +1,163 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, asdict
-from typing import Dict
+import sys
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from ..email.text import normalize_subject
 
 
 @dataclass
-class EmailInteraction:
-    timestamp: str
+class IncomingEmail:
     sender: str
     subject: str
-    content: str
-    complexity: str
-    response: str
-    processing_time: float
-    reply_sent: bool = False
-    reply_status: str = ""
-    message_id: str = ""
-
-    def to_dict(self) -> Dict:
-        return asdict(self)
+    body: str
+    message_id: str
+    priority: int = 0  # higher is handled first
+    mailbox: str = ""  # name of the account it arrived in; "" = the default one
+    in_reply_to: str = ""
+    references: str = ""  # References header: space-separated message ids, oldest first
+    received_at: float = 0.0  # epoch seconds it was queued
+    # Later emails from the same sender in the same thread, answered together with this one
+    followups: List["IncomingEmail"] = field(default_factory=list)
+
+    @property
+    def sender_key(self) -> str:
+        # Per-sender ordering is per mailbox: one sender's threads with two accounts are independent
+        sender = self.sender.strip().lower()
+        return f"{self.mailbox}/{sender}" if self.mailbox else sender
+
+    def thread_ids(self) -> Set[str]:
+        ids = set(self.references.split())
+        ids.update(i for i in (self.message_id, self.in_reply_to) if i)
+        return ids
+
+    def same_thread(self, other: "IncomingEmail") -> bool:
+        """Same sender and either linked by message ids or sharing a (non-blank) subject."""
+        if self.sender_key != other.sender_key:
+            return False
+        if self.thread_ids() & other.thread_ids():
+            return True
+        subject = normalize_subject(self.subject)
+        return bool(subject) and subject != "no subject" and subject == normalize_subject(other.subject)
+
+    @property
+    def messages(self) -> List["IncomingEmail"]:
+        return [self] + self.followups
+
+
+# Texts at least this long are kept zlib-compressed and inflated on access
+_COMPRESS_MIN_CHARS = 256
+
+INTERACTION_FIELDS = (
+    "timestamp", "sender", "subject", "content", "complexity", "response",
+    "processing_time", "reply_sent", "reply_status", "message_id", "mailbox",
+)
+
+
+def _pack(text: str) -> Union[str, bytes]:
+    if len(text) < _COMPRESS_MIN_CHARS:
+        return text
+    packed = zlib.compress(text.encode("utf-8"))
+    # Short or already-dense text can come out larger; keep whichever is smaller
+    return packed if len(packed) < len(text) else text
+
+
+def _unpack(value: Union[str, bytes]) -> str:
+    return value if isinstance(value, str) else zlib.decompress(value).decode("utf-8")
+
+
+class EmailInteraction:
+    """
+    One answered email, as kept in the history window and served by /api/interactions.
+
+    Slotted to keep per-record overhead low: sender, complexity and mailbox are
+    interned (few distinct values across many records), the time is an epoch
+    float (``ts``; ``timestamp`` is its ISO form) and long ``content`` and
+    ``response`` texts are stored compressed until read.
+    """
+
+    __slots__ = (
+        "ts", "sender", "subject", "_content", "complexity", "_response",
+        "processing_time", "reply_sent", "reply_status", "message_id", "mailbox",
+    )
+
+    def __init__(
+        self,
+        timestamp: Union[float, str, None],
+        sender: str,
+        subject: str,
+        content: str,
+        complexity: str,
+        response: str,
+        processing_time: float,
+        reply_sent: bool = False,
+        reply_status: str = "",
+        message_id: str = "",
+        mailbox: str = "",
+    ) -> None:
+        if timestamp is None:
+            timestamp = time.time()
+        elif isinstance(timestamp, str):
+            try:
+                timestamp = datetime.fromisoformat(timestamp).timestamp()
+            except ValueError:
+                timestamp = 0.0
+        self.ts = float(timestamp)
+        self.sender = sys.intern(sender)
+        self.subject = subject
+        self._content = _pack(content)
+        self.complexity = sys.intern(complexity)
+        self._response = _pack(response)
+        self.processing_time = processing_time
+        self.reply_sent = bool(reply_sent)
+        self.reply_status = reply_status
+        self.message_id = message_id
+        self.mailbox = sys.intern(mailbox)
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.ts).isoformat() if self.ts else ""
+
+    @property
+    def content(self) -> str:
+        return _unpack(self._content)
+
+    @content.setter
+    def content(self, value: str) -> None:
+        self._content = _pack(value)
+
+    @property
+    def response(self) -> str:
+        return _unpack(self._response)
+
+    @response.setter
+    def response(self, value: str) -> None:
+        self._response = _pack(value)
+
+    def to_dict(self, fields: Optional[Iterable[str]] = None) -> Dict:
+        """Plain dict of the public fields (or just ``fields``); texts are only inflated if asked for."""
+        if fields is None:
+            return {
+                "timestamp": self.timestamp,
+                "sender": self.sender,
+                "subject": self.subject,
+                "content": _unpack(self._content),
+                "complexity": self.complexity,
+                "response": _unpack(self._response),
+                "processing_time": self.processing_time,
+                "reply_sent": self.reply_sent,
+                "reply_status": self.reply_status,
+                "message_id": self.message_id,
+                "mailbox": self.mailbox,
+            }
+        return {f: getattr(self, f) for f in fields if f in INTERACTION_FIELDS}
+
+    def __repr__(self) -> str:
+        return (
+            f"EmailInteraction(timestamp={self.timestamp!r}, sender={self.sender!r}, subject={self.subject!r},"
+            f" complexity={self.complexity!r}, reply_sent={self.reply_sent!r}, message_id={self.message_id!r})"
+        )
@@ -2,41 +2,132 @@ from __future__ import annotations
 
 import logging
 import time
-from datetime import datetime
-from threading import Lock
-from typing import Dict, List
-
-from ..config import Settings
-from ..core.models import EmailInteraction
-from ..core.state import ProcessedMessageStore
-from ..email.classifier import EmailClassifier
+from threading import Event, Lock
+from typing import Dict, List, Optional
+
+from ..config import Mailbox, Settings
+from ..core.cache import LruTtlCache
+from ..core.claims import CLAIMED, HELD, ClaimHeld, ClaimStore
+from ..core.events import EventBroadcaster
+from ..core.history import InteractionHistory
+from ..core.metrics import EMAIL_SECONDS, STAGE_SECONDS, stage
+from ..core.models import EmailInteraction, IncomingEmail
+from ..core.state import open_message_store
+from ..email.classifier import TIERS, EmailClassifier
 from ..email.responder import EmailResponder
+from ..email.text import prepare_body, truncate_tokens
 from ..llm.agent import AgenticResponder
+from ..llm.breaker import CircuitBreaker
+from ..llm.routing import routes_from_settings
 
 log = logging.getLogger(__name__)
 
 
+class ReplyNotSent(Exception):
+    """SMTP refused or failed the reply; the email is left unanswered so it can be retried."""
+
+# What an "interaction" event carries; the full email text stays behind /api/interactions
+EVENT_FIELDS = ("timestamp", "sender", "subject", "complexity", "response", "reply_sent", "reply_status", "mailbox")
+
+
+def build_classifier(settings: Settings) -> EmailClassifier:
+    if settings.classifier_keywords_path:
+        return EmailClassifier.from_file(settings.classifier_keywords_path)
+    return EmailClassifier()
+
+
+def build_agent(settings: Settings) -> AgenticResponder:
+    """The LLM stack (with its reply and search caches) described by ``settings``."""
+    reply_cache = None
+    if settings.reply_cache_enabled:
+        reply_cache = LruTtlCache(
+            max_entries=settings.reply_cache_max_entries,
+            ttl_seconds=settings.reply_cache_ttl_seconds,
+            max_bytes=settings.reply_cache_max_bytes,
+            path=settings.reply_cache_path,
+        )
+    search_cache = None
+    if settings.search_cache_enabled:
+        search_cache = LruTtlCache(
+            max_entries=settings.search_cache_max_entries,
+            ttl_seconds=settings.search_cache_ttl_seconds,
+            path=settings.search_cache_path,
+        )
+    return AgenticResponder(
+        ollama_model=settings.ollama_model,
+        ollama_base_url=settings.ollama_base_url,
+        enable_tools=settings.enable_tools,
+        tavily_api_key=settings.tavily_api_key,
+        langchain_api_key=settings.langchain_api_key,
+        langsmith_tracing=settings.langsmith_tracing,
+        langsmith_endpoint=settings.langsmith_endpoint,
+        langchain_project=settings.langchain_project,
+        cache=reply_cache,
+        max_concurrency=settings.llm_max_concurrency,
+        search_cache=search_cache,
+        keep_alive=settings.ollama_keep_alive,
+        hedge_after_seconds=settings.llm_hedge_after_seconds,
+        budget_seconds=settings.llm_budget_seconds,
+        breaker_factory=lambda: CircuitBreaker(
+            failure_rate=settings.breaker_failure_rate,
+            slow_call_seconds=settings.breaker_slow_call_seconds,
+            window=settings.breaker_window,
+            min_calls=settings.breaker_min_calls,
+            open_seconds=settings.breaker_open_seconds,
+        ),
+    )
+
+
 class EmailProcessor:
     """Processes incoming emails, generates a reply, and sends it."""
 
     def __init__(self, settings: Settings):
         self.settings = settings
-        self.classifier = EmailClassifier()
-        self.responder = EmailResponder(settings.smtp_user, settings.smtp_app_password, settings.cpa_name)
-        self.agent = AgenticResponder(
-            ollama_model=settings.ollama_model,
-            enable_tools=settings.enable_tools,
-            tavily_api_key=settings.tavily_api_key,
-            langchain_api_key=settings.langchain_api_key,
-            langsmith_tracing=settings.langsmith_tracing,
-            langsmith_endpoint=settings.langsmith_endpoint,
-            langchain_project=settings.langchain_project,
+        self.classifier = build_classifier(settings)
+        self.responder = EmailResponder(
+            settings.smtp_user,
+            settings.smtp_app_password,
+            settings.cpa_name,
+            starttls=settings.smtp_starttls,
+            pool_size=settings.smtp_pool_size,
+            max_messages_per_connection=settings.smtp_max_messages_per_connection,
+            idle_seconds=settings.smtp_idle_seconds,
+        )
+        # Every account shares this processor; replies go out as the account the email arrived in
+        self.mailboxes: Dict[str, Mailbox] = {m.name: m for m in settings.mailboxes()}
+        for mailbox in self.mailboxes.values():
+            self.responder.add_identity(mailbox.name, mailbox.smtp_user, mailbox.smtp_app_password, mailbox.cpa_name)
+        self.agent = build_agent(settings)
+        self.routes = routes_from_settings(settings)
+
+        self.state = open_message_store(
+            settings.state_backend,
+            settings.state_db_path if settings.state_backend == "sqlite" else settings.state_path,
+            retention_days=settings.state_retention_days,
+            fsync=settings.state_fsync,
+            compact_interval_seconds=settings.state_compact_interval_seconds,
+            jsonl_path=settings.state_path,
         )
 
-        self.state = ProcessedMessageStore(settings.state_path)
+        self.history = InteractionHistory(settings.history_path, settings.history_memory_window)
+
+        # Shared with the other nodes answering the same mailboxes, if any
+        self.claims: Optional[ClaimStore] = None
+        if settings.claims_enabled:
+            self.claims = ClaimStore(
+                settings.claims_path,
+                lease_seconds=settings.claims_lease_seconds,
+                journal_mode=settings.claims_journal_mode,
+            )
+
+        # Without warm-up the first email pays for building the pipelines instead
+        self._ready = Event()
+        if not settings.warm_up:
+            self._ready.set()
+        self._warm_up_seconds: Optional[float] = None
+        self._warm_up_errors: list = []
 
         self._lock = Lock()
-        self._interactions: List[EmailInteraction] = []
         self._stats: Dict[str, float] = {
             "total_processed": 0,
             "basic_count": 0,
@@ -45,42 +136,146 @@ class EmailProcessor:
             "avg_processing_time": 0.0,
             "replies_sent": 0,
             "reply_success_rate": 0.0,
+            "chain_routed": 0,
+            "agent_routed": 0,
+            "coalesced": 0,  # follow-up emails answered as part of an earlier email's reply
+        }
+        self._mailbox_stats: Dict[str, Dict[str, float]] = {
+            name: {"processed": 0, "replies_sent": 0, "duplicates_skipped": 0} for name in self.mailboxes
         }
 
-    def process_email_with_reply(self, sender: str, subject: str, content: str, message_id: str) -> EmailInteraction:
-        if message_id and self.state.contains(message_id):
-            log.info("Skipping already processed message_id=%s", message_id)
+        # Dashboard push: new interactions and the stats that changed, as they happen
+        self.events = EventBroadcaster(settings.events_client_buffer, settings.events_replay)
+        self._published_stats: Dict[str, float] = {}
+
+    def warm_up(self, prime: bool = True) -> bool:
+        """Build the routed pipelines and load their models; marks the processor ready."""
+        start = time.perf_counter()
+        errors = self.agent.warm_up(self.routes.values(), prime=prime)
+        self._warm_up_seconds = time.perf_counter() - start
+        self._warm_up_errors = errors
+        for err in errors:
+            log.warning("Warm-up: %s", err)
+        if not errors:
+            self._ready.set()
+        return not errors
+
+    def readiness(self) -> Dict:
+        return {
+            "ready": self._ready.is_set(),
+            "warm_up_seconds": self._warm_up_seconds,
+            "errors": list(self._warm_up_errors),
+        }
+
+    def priority(self, email: IncomingEmail) -> int:
+        """Scheduling priority: complex before intermediate before basic."""
+        return TIERS.index(self.classifier.classify(prepare_body(email.body, self.settings.prompt_max_tokens)))
+
+    def process_email_with_reply(
+        self,
+        sender: str,
+        subject: str,
+        content: str,
+        message_id: str,
+        mailbox: str = "",
+        in_reply_to: str = "",
+        references: str = "",
+    ) -> EmailInteraction:
+        return self.process_incoming(
+            IncomingEmail(sender, subject, content, message_id, mailbox=mailbox, in_reply_to=in_reply_to, references=references)
+        )
+
+    def process_incoming(self, email: IncomingEmail) -> EmailInteraction:
+        """Answer ``email`` and any coalesced ``followups`` with one threaded reply."""
+        mailbox = email.mailbox
+        account = self.mailboxes.get(mailbox)
+        namespace = account.state_namespace if account else ""
+        # Messages answered before a crash or redelivered by IMAP are left out of the reply
+        messages = [m for m in email.messages if not (m.message_id and self.state.contains(m.message_id, namespace))]
+        if self.claims is not None:
+            messages = self._claim(messages, namespace)
+        if not messages:
+            log.info("Skipping already processed message_id=%s", email.message_id)
+            self._count_mailbox(mailbox, "duplicates_skipped")
             # Return a lightweight interaction record
             return EmailInteraction(
-                timestamp=datetime.now().isoformat(),
-                sender=sender,
-                subject=subject,
-                content=content,
+                timestamp=time.time(),
+                sender=email.sender,
+                subject=email.subject,
+                content=email.body,
                 complexity="basic",
                 response="(skipped duplicate)",
                 processing_time=0.0,
                 reply_sent=False,
                 reply_status="Skipped duplicate",
-                message_id=message_id,
+                message_id=email.message_id,
+                mailbox=mailbox,
             )
 
+        try:
+            return self._answer(email, messages, account, namespace)
+        except BaseException:
+            if self.claims is not None:
+                for m in messages:
+                    if m.message_id:
+                        self.claims.release(m.message_id, namespace)
+            raise
+
+    def _claim(self, messages: List[IncomingEmail], namespace: str) -> List[IncomingEmail]:
+        """The messages this node now owns; raises ClaimHeld while another node is on any of them."""
+        claimed: List[IncomingEmail] = []
+        held = ""
+        for m in messages:
+            status = self.claims.claim(m.message_id, namespace) if m.message_id else CLAIMED
+            if status == CLAIMED:
+                claimed.append(m)
+            elif status == HELD:
+                held = m.message_id
+        if held:
+            # Wait for the owner to finish (or its lease to lapse) rather than answer part of a thread
+            for m in claimed:
+                if m.message_id:
+                    self.claims.release(m.message_id, namespace)
+            raise ClaimHeld(f"message_id={held} is being answered by another node")
+        return claimed
+
+    def _answer(
+        self, email: IncomingEmail, messages: List[IncomingEmail], account: Optional[Mailbox], namespace: str
+    ) -> EmailInteraction:
+        mailbox = email.mailbox
+        first, latest = messages[0], messages[-1]
+        sender, subject = first.sender, first.subject
+        content = "\n\n".join(m.body for m in messages)
+        if len(messages) > 1:
+            log.info("Answering %d emails from %s in one reply", len(messages), sender)
+
         start = time.time()
-        complexity = self.classifier.classify(content)
-        _key_info = self.classifier.extract_key_info(content)
+        # Classify and prompt on the sender's own words, not quoted history or footers
+        with stage("preprocess"):
+            prompt_body = self._prompt_body(messages)
+        with stage("classify"):
+            complexity = self.classifier.classify(prompt_body)
+            _key_info = self.classifier.extract_key_info(prompt_body)
 
-        response = self.agent.generate(content, sender, subject)
+        route = self.routes.get(complexity) or self.agent.default_route
+        response = self.agent.generate(prompt_body, sender, subject, route=route)
         processing_time = time.time() - start
 
-        reply_sent, reply_status = self.responder.send_response(
-            smtp_host=self.settings.smtp_host,
-            smtp_port=self.settings.smtp_port,
-            to_email=sender,
-            original_subject=subject,
-            response_content=response,
-        )
+        with stage("smtp_send"):
+            reply_sent, reply_status = self.responder.send_response(
+                smtp_host=account.smtp_host if account else self.settings.smtp_host,
+                smtp_port=account.smtp_port if account else self.settings.smtp_port,
+                to_email=sender,
+                original_subject=subject,
+                response_content=response,
+                identity=account.name if account else "",
+                # Synthetic imap-<uid> ids are not real Message-IDs and can't be threaded on
+                in_reply_to=latest.message_id if latest.message_id.startswith("<") else "",
+                references=latest.references,
+            )
 
         interaction = EmailInteraction(
-            timestamp=datetime.now().isoformat(),
+            timestamp=time.time(),
             sender=sender,
             subject=subject,
             content=content,
@@ -89,19 +284,70 @@ class EmailProcessor:
             processing_time=processing_time,
             reply_sent=reply_sent,
             reply_status=reply_status,
-            message_id=message_id,
+            message_id=first.message_id,
+            mailbox=mailbox,
         )
 
-        # Persist message id immediately so restarts don't resend
-        if message_id:
-            self.state.add(message_id, interaction.timestamp)
+        # Persist message ids immediately so restarts don't resend. A failed send is not
+        # recorded as answered: raising below lets the spool back off and retry it
+        with stage("state_persist"):
+            for m in messages if reply_sent else ():
+                if m.message_id:
+                    self.state.add(m.message_id, interaction.timestamp, namespace)
+                    if self.claims is not None:
+                        self.claims.complete(m.message_id, namespace)
+
+        with stage("history_persist"):
+            row_id = self.history.append(interaction)
+        EMAIL_SECONDS.observe(time.time() - start)
 
         with self._lock:
-            self._interactions.append(interaction)
             self._update_stats_locked(complexity, processing_time, reply_sent)
+            self._stats[f"{route.pipeline}_routed"] += 1
+            self._stats["coalesced"] += len(messages) - 1
+            self._count_mailbox_locked(mailbox, "processed")
+            if reply_sent:
+                self._count_mailbox_locked(mailbox, "replies_sent")
+            # Published under the lock so clients see stats deltas in the order they were made
+            self.events.publish("interaction", dict(id=row_id, **interaction.to_dict(EVENT_FIELDS)))
+            self._publish_stats_locked()
 
+        if not reply_sent:
+            raise ReplyNotSent(f"Reply to message_id={first.message_id} not sent: {reply_status}")
         return interaction
 
+    def _prompt_body(self, messages: List[IncomingEmail]) -> str:
+        max_tokens = self.settings.prompt_max_tokens
+        if len(messages) == 1:
+            return prepare_body(messages[0].body, max_tokens)
+        # Each message is cleaned on its own so quoted copies of the earlier ones drop out
+        parts = [
+            f"[Email {i} of {len(messages)}: {m.subject}]\n{prepare_body(m.body)}"
+            for i, m in enumerate(messages, 1)
+        ]
+        return truncate_tokens("\n\n".join(parts), max_tokens)
+
+    def _count_mailbox(self, mailbox: str, key: str) -> None:
+        with self._lock:
+            self._count_mailbox_locked(mailbox, key)
+            self._publish_stats_locked()
+
+    def _count_mailbox_locked(self, mailbox: str, key: str) -> None:
+        stats = self._mailbox_stats.get(mailbox)
+        if stats is not None:
+            stats[key] += 1
+
+    def _publish_stats_locked(self) -> None:
+        """Publish the counters that changed since the last "stats" event (mailboxes as "<name>.<key>")."""
+        current = dict(self._stats)
+        for name, counts in self._mailbox_stats.items():
+            for key, value in counts.items():
+                current[f"{name}.{key}"] = value
+        delta = {k: v for k, v in current.items() if self._published_stats.get(k) != v}
+        if delta:
+            self._published_stats = current
+            self.events.publish("stats", delta)
+
     def _update_stats_locked(self, complexity: str, processing_time: float, reply_sent: bool) -> None:
         self._stats["total_processed"] += 1
         key = f"{complexity}_count"
@@ -117,10 +363,24 @@ class EmailProcessor:
         prev_avg = self._stats["avg_processing_time"]
         self._stats["avg_processing_time"] = ((prev_avg * (total - 1)) + processing_time) / total if total else 0.0
 
-    def get_interactions(self) -> List[Dict]:
-        with self._lock:
-            return [i.to_dict() for i in self._interactions]
+    def get_interactions(self, **query) -> Dict:
+        """Newest-first page of past interactions; see InteractionHistory.page for the filters."""
+        return self.history.page(**query)
 
     def get_stats(self) -> Dict:
         with self._lock:
-            return dict(self._stats)
+            stats: Dict = dict(self._stats)
+            stats["mailboxes"] = {name: dict(counts) for name, counts in self._mailbox_stats.items()}
+        if self.agent.cache is not None:
+            stats["reply_cache"] = self.agent.cache.stats()
+        if self.agent.search is not None:
+            stats["search_cache"] = self.agent.search.stats()
+        if self.claims is not None:
+            stats["claims"] = self.claims.stats()
+        stats["llm"] = self.agent.stats()
+        stats["events"] = self.events.stats()
+        stats["latency"] = {labels[0]: pct for labels, pct in STAGE_SECONDS.percentiles().items()}
+        end_to_end = EMAIL_SECONDS.percentiles().get(())
+        if end_to_end:
+            stats["latency"]["email_total"] = end_to_end
+        return stats
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..core.models import IncomingEmail
+
+log = logging.getLogger(__name__)
+
+
+class WorkSpool:
+    """
+    Durable queue of fetched emails, persisted to SQLite before they are processed.
+
+    ``lease`` hands out the highest-priority email whose sender has no older
+    email still spooled, so each sender is answered oldest-first and one at a
+    time. A lease hides the row for ``visibility_timeout`` seconds; ``ack``
+    deletes it once the reply is sent and recorded. Leases left behind by a
+    crashed process are released when the spool is reopened, so that work
+    resumes without another IMAP fetch. With a coalescing window, an email is
+    only leased once it has waited that long, together with the same sender's
+    later emails in the same thread.
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = 900.0, max_attempts: int = 5):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max(1, max_attempts)
+        self._lock = Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        # A spooled email must survive power loss, not just a process crash
+        db.execute("PRAGMA synchronous=FULL")
+        columns = {row[1] for row in db.execute("PRAGMA table_info(spool)")}
+        migrate = bool(columns) and "mailbox" not in columns
+        db.execute("BEGIN")
+        if migrate:
+            # Message ids are unique per mailbox now; rebuild the table around the new constraint
+            db.execute("ALTER TABLE spool RENAME TO spool_v1")
+            db.execute("DROP INDEX IF EXISTS spool_sender")
+            db.execute("DROP INDEX IF EXISTS spool_ready")
+        db.execute(
+            """CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                mailbox TEXT NOT NULL DEFAULT '',
+                message_id TEXT,
+                sender_key TEXT NOT NULL,
+                sender TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                enqueued_at REAL NOT NULL,
+                lease_until REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                in_reply_to TEXT NOT NULL DEFAULT '',
+                refs TEXT NOT NULL DEFAULT '',
+                UNIQUE (mailbox, message_id)
+            )"""
+        )
+        for column in ("in_reply_to", "refs"):
+            if columns and column not in columns and not migrate:
+                db.execute(f"ALTER TABLE spool ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+        if migrate:
+            db.execute(
+                "INSERT INTO spool (id, message_id, sender_key, sender, subject, body, priority, enqueued_at, lease_until, attempts)"
+                " SELECT id, message_id, sender_key, sender, subject, body, priority, enqueued_at, lease_until, attempts FROM spool_v1"
+            )
+            db.execute("DROP TABLE spool_v1")
+        db.execute("CREATE INDEX IF NOT EXISTS spool_sender ON spool (sender_key, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS spool_ready ON spool (priority DESC, id)")
+        db.execute("COMMIT")
+        self._db = db
+
+        recovered = db.execute("UPDATE spool SET lease_until = 0 WHERE lease_until > 0").rowcount
+        pending = self.depth()
+        if pending:
+            log.info("Resuming %d spooled emails (%d were in flight)", pending, recovered)
+
+    def put(self, item: IncomingEmail) -> bool:
+        """Spool an email; False if one with the same message id is already queued for its mailbox."""
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO spool (mailbox, message_id, sender_key, sender, subject, body, priority,"
+                " enqueued_at, in_reply_to, refs) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    item.mailbox, item.message_id or None, item.sender_key, item.sender, item.subject, item.body,
+                    item.priority, item.received_at or time.time(), item.in_reply_to, item.references,
+                ),
+            )
+            return cur.rowcount > 0
+
+    _COLUMNS = "id, message_id, sender, subject, body, priority, mailbox, in_reply_to, refs, enqueued_at"
+
+    @staticmethod
+    def _item(row: tuple) -> IncomingEmail:
+        _id, message_id, sender, subject, body, priority, mailbox, in_reply_to, refs, enqueued_at = row
+        return IncomingEmail(
+            sender, subject, body, message_id or "",
+            priority=priority, mailbox=mailbox, in_reply_to=in_reply_to, references=refs, received_at=enqueued_at,
+        )
+
+    def lease(self, coalesce_seconds: float = 0.0) -> Optional[Tuple[List[int], IncomingEmail]]:
+        """
+        Lease the next email, plus any same-thread follow-ups from its sender
+        (as ``followups``). Returns the leased row ids and the email.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                f"""SELECT {self._COLUMNS} FROM spool AS s
+                   WHERE lease_until <= ? AND enqueued_at <= ?
+                     AND NOT EXISTS (SELECT 1 FROM spool AS o WHERE o.sender_key = s.sender_key AND o.id < s.id)
+                   ORDER BY priority DESC, id LIMIT 1""",
+                (now, now - coalesce_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            item = self._item(row)
+            lease_ids = [row[0]]
+            if coalesce_seconds > 0:
+                later = self._db.execute(
+                    f"SELECT {self._COLUMNS} FROM spool WHERE sender_key = ? AND id > ? AND lease_until <= ? ORDER BY id",
+                    (item.sender_key, row[0], now),
+                ).fetchall()
+                for other in later:
+                    candidate = self._item(other)
+                    if any(m.same_thread(candidate) for m in item.messages):
+                        item.followups.append(candidate)
+                        lease_ids.append(other[0])
+            self._db.execute(
+                f"UPDATE spool SET lease_until = ?, attempts = attempts + 1 WHERE id IN ({','.join('?' * len(lease_ids))})",
+                [now + self.visibility_timeout] + lease_ids,
+            )
+        return lease_ids, item
+
+    def ack(self, lease_ids: Sequence[int]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in lease_ids])
+
+    def retry(self, lease_ids: Sequence[int]) -> bool:
+        """Make failed emails visible again after a backoff; drops them after ``max_attempts``."""
+        with self._lock:
+            row = self._db.execute("SELECT attempts, message_id FROM spool WHERE id = ?", (lease_ids[0],)).fetchone()
+            if row is None:
+                return False
+            attempts, message_id = row
+            if attempts >= self.max_attempts:
+                self._db.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in lease_ids])
+                log.error("Giving up on message_id=%s after %d attempts", message_id, attempts)
+                return False
+            delay = min(30.0 * 2 ** (attempts - 1), 600.0)
+            self._db.executemany(
+                "UPDATE spool SET lease_until = ? WHERE id = ?", [(time.time() + delay, i) for i in lease_ids]
+            )
+            return True
+
+    def next_visible_in(self) -> Optional[float]:
+        """Seconds until the earliest leased or backed-off email becomes visible again."""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(lease_until) FROM spool WHERE lease_until > 0").fetchone()
+        return max(0.0, row[0] - time.time()) if row and row[0] else None
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        now = time.time()
+        with self._lock:
+            total, leased = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(lease_until > ?), 0) FROM spool", (now,)
+            ).fetchone()
+        return {"spooled": total, "leased": leased}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
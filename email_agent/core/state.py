@@ -1,10 +1,75 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
+import sqlite3
+import time
+from datetime import datetime
 from pathlib import Path
-from threading import Lock
-from typing import Set
+from threading import Condition, Event, Lock, Thread
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ..core.bloom import BloomFilter
+
+log = logging.getLogger(__name__)
+
+
+def _epoch(ts: str) -> float:
+    try:
+        return datetime.fromisoformat(ts).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+def scoped_id(message_id: str, namespace: str) -> str:
+    # Message-IDs are global, so the same email delivered to two accounts needs a key per account
+    return f"{namespace}\x1f{message_id}" if namespace else message_id
+
+
+class _GroupCommit:
+    """
+    Batches concurrent appends into one write.
+
+    Each caller blocks until its entry is written. Whoever arrives while no
+    write is running becomes the writer for everything queued so far; callers
+    arriving during a write are flushed together by the next writer.
+    """
+
+    def __init__(self, write_batch: Callable[[List[Tuple[str, str]]], None]) -> None:
+        self._write_batch = write_batch
+        self._cond = Condition(Lock())
+        self._queue: List[Tuple[str, str]] = []
+        self._enqueued = 0
+        self._committed = 0
+        self._writing = False
+        self._failure: Optional[Tuple[int, int, Exception]] = None
+
+    def commit(self, message_id: str, ts: str) -> None:
+        with self._cond:
+            self._queue.append((message_id, ts))
+            self._enqueued += 1
+            ticket = self._enqueued
+            while self._committed < ticket:
+                if self._writing:
+                    self._cond.wait()
+                    continue
+                batch, self._queue = self._queue, []
+                first, last = self._committed + 1, self._enqueued
+                self._writing = True
+                self._cond.release()
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    self._failure = (first, last, e)
+                finally:
+                    self._cond.acquire()
+                    self._committed = last
+                    self._writing = False
+                    self._cond.notify_all()
+            failure = self._failure
+        if failure is not None and failure[0] <= ticket <= failure[1]:
+            raise failure[2]
 
 
 class ProcessedMessageStore:
@@ -12,45 +77,326 @@ class ProcessedMessageStore:
     Tracks processed Message-IDs to prevent duplicate replies across restarts.
 
     Stored as JSONL: one message id per line {"message_id": "...", "ts": "..."}.
+    Concurrent ``add`` calls are group-committed (optionally fsync'd). Every
+    ``compact_interval_seconds`` a background thread rewrites the log without
+    duplicate entries, and without expired ones when ``retention_days`` is set. Ids added with a ``namespace`` (one
+    per mailbox) are tracked separately from the same id in other namespaces.
     """
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, retention_days: float = 0, fsync: bool = False, compact_interval_seconds: float = 3600):
         self._path = Path(path)
         self._lock = Lock()
         self._ids: Set[str] = set()
+        self._pending: Set[str] = set()
+        self.retention_days = retention_days
+        self.fsync = fsync
+        self.compact_interval_seconds = compact_interval_seconds
+        self._committer = _GroupCommit(self._append)
+        self._stop = Event()
         self._load()
 
+        if compact_interval_seconds > 0:
+            Thread(target=self._compact_loop, name="state-compactor", daemon=True).start()
+
     def _load(self) -> None:
         with self._lock:
             self._ids.clear()
             if not self._path.exists():
                 return
             try:
-                for line in self._path.read_text(errors="ignore").splitlines():
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        obj = json.loads(line)
-                        mid = obj.get("message_id")
+                with self._path.open("r", encoding="utf-8", errors="ignore") as f:
+                    for line in f:
+                        mid = self._parse_line(line)[0]
                         if mid:
                             self._ids.add(mid)
-                    except Exception:
-                        # Ignore malformed lines
-                        continue
             except Exception:
                 # If file is unreadable, start clean
                 self._ids.clear()
 
-    def contains(self, message_id: str) -> bool:
+    @staticmethod
+    def _parse_line(line: str) -> Tuple[str, str]:
+        line = line.strip()
+        if not line:
+            return "", ""
+        try:
+            obj = json.loads(line)
+            return obj.get("message_id") or "", obj.get("ts") or ""
+        except Exception:
+            # Ignore malformed lines
+            return "", ""
+
+    def contains(self, message_id: str, namespace: str = "") -> bool:
+        message_id = scoped_id(message_id, namespace)
         with self._lock:
-            return message_id in self._ids
+            return message_id in self._ids or message_id in self._pending
 
-    def add(self, message_id: str, ts: str) -> None:
+    def add(self, message_id: str, ts: str, namespace: str = "") -> None:
+        message_id = scoped_id(message_id, namespace)
         with self._lock:
-            if message_id in self._ids:
+            if message_id in self._ids or message_id in self._pending:
                 return
-            self._ids.add(message_id)
+            self._pending.add(message_id)
+        committed = False
+        try:
+            self._committer.commit(message_id, ts)
+            committed = True
+        finally:
+            with self._lock:
+                self._pending.discard(message_id)
+                if committed:
+                    self._ids.add(message_id)
+
+    def _append(self, batch: List[Tuple[str, str]]) -> None:
+        data = "".join(json.dumps({"message_id": mid, "ts": ts}) + "\n" for mid, ts in batch)
+        with self._lock:
             self._path.parent.mkdir(parents=True, exist_ok=True)
             with self._path.open("a", encoding="utf-8") as f:
-                f.write(json.dumps({"message_id": message_id, "ts": ts}) + "\n")
+                f.write(data)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def compact(self) -> int:
+        """Rewrite the log without expired or duplicate entries. Returns the number of ids dropped."""
+        if not self._path.exists():
+            return 0
+        cutoff = time.time() - self.retention_days * 86400 if self.retention_days > 0 else None
+
+        # Build the new log from a snapshot; appends made meanwhile are copied over under the lock
+        with self._lock:
+            snapshot_size = self._path.stat().st_size
+        latest: Dict[str, str] = {}
+        entries = 0
+        with self._path.open("rb") as f:
+            for line in f.read(snapshot_size).decode("utf-8", errors="ignore").splitlines():
+                mid, ts = self._parse_line(line)
+                if mid:
+                    latest[mid] = ts
+                    entries += 1
+        kept = {mid: ts for mid, ts in latest.items() if cutoff is None or _epoch(ts) >= cutoff}
+        if len(kept) == entries:
+            # Nothing expired or duplicated; leave the file alone
+            return 0
+
+        tmp = self._path.with_suffix(self._path.suffix + ".compact")
+        with tmp.open("w", encoding="utf-8") as out:
+            for mid, ts in kept.items():
+                out.write(json.dumps({"message_id": mid, "ts": ts}) + "\n")
+            with self._lock:
+                with self._path.open("rb") as f:
+                    f.seek(snapshot_size)
+                    tail = f.read()
+                out.write(tail.decode("utf-8", errors="ignore"))
+                out.flush()
+                os.fsync(out.fileno())
+                os.replace(tmp, self._path)
+                dropped = set(latest) - set(kept)
+                self._ids -= dropped
+        log.info(
+            "Compacted %s: dropped %d expired ids and %d duplicate lines",
+            self._path, len(dropped), entries - len(latest),
+        )
+        return len(dropped)
+
+    def _compact_loop(self) -> None:
+        while not self._stop.wait(self.compact_interval_seconds):
+            try:
+                self.compact()
+            except Exception:
+                log.exception("State compaction failed")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"ids": len(self._ids)}
+
+    def close(self) -> None:
+        self._stop.set()
+
+
+class SqliteMessageStore:
+    """
+    Processed Message-IDs in SQLite with a primary-key index.
+
+    Startup does not scan the table. An in-memory Bloom filter is filled in the
+    background and then answers most negative lookups without touching disk.
+    Appends are group-committed; ``fsync=True`` uses synchronous=FULL. With
+    ``retention_days`` set, expired ids are purged periodically. An existing
+    JSONL log at ``import_jsonl`` is imported once into an empty database.
+    Namespaced ids are stored with their namespace as a key prefix.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        retention_days: float = 0,
+        fsync: bool = False,
+        compact_interval_seconds: float = 3600,
+        bloom_capacity: int = 1_000_000,
+        import_jsonl: str = "",
+    ):
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self.retention_days = retention_days
+        self.compact_interval_seconds = compact_interval_seconds
+
+        self._lock = Lock()
+        self._db = sqlite3.connect(str(self._path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS processed (message_id TEXT PRIMARY KEY, ts REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS processed_ts ON processed (ts)")
+
+        self._pending: Set[str] = set()
+        self._committer = _GroupCommit(self._insert)
+        self._bloom: Optional[BloomFilter] = None
+        self._bloom_lock = Lock()
+        # Ids inserted while the filter is being built; replayed into it once ready
+        self._bloom_backlog: List[str] = []
+        self._stop = Event()
+
+        if import_jsonl:
+            self._import_jsonl(Path(import_jsonl))
+
+        Thread(target=self._build_bloom, args=(bloom_capacity,), name="state-bloom", daemon=True).start()
+        if compact_interval_seconds > 0:
+            Thread(target=self._compact_loop, name="state-compactor", daemon=True).start()
+
+    def _import_jsonl(self, src: Path) -> None:
+        if not src.exists():
+            return
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM processed LIMIT 1").fetchone():
+                return
+        rows: List[Tuple[str, float]] = []
+        total = 0
+        with src.open("r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                mid, ts = ProcessedMessageStore._parse_line(line)
+                if mid:
+                    rows.append((mid, _epoch(ts)))
+                if len(rows) >= 50_000:
+                    self._insert_rows(rows)
+                    total += len(rows)
+                    rows = []
+        self._insert_rows(rows)
+        total += len(rows)
+        log.info("Imported %d processed ids from %s", total, src)
+
+    def _build_bloom(self, capacity: int) -> None:
+        try:
+            with self._lock:
+                count = self._db.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+            bloom = BloomFilter(max(capacity, count * 2))
+            # Separate read connection so the scan doesn't hold up writers
+            reader = sqlite3.connect(str(self._path))
+            try:
+                for (mid,) in reader.execute("SELECT message_id FROM processed"):
+                    bloom.add(mid)
+            finally:
+                reader.close()
+            with self._bloom_lock:
+                for mid in self._bloom_backlog:
+                    bloom.add(mid)
+                self._bloom_backlog = []
+                self._bloom = bloom
+            log.info("Processed-id Bloom filter ready (%d ids, %d KiB)", count, bloom.size_bytes // 1024)
+        except Exception:
+            log.exception("Failed building Bloom filter; lookups will hit SQLite")
+
+    def contains(self, message_id: str, namespace: str = "") -> bool:
+        message_id = scoped_id(message_id, namespace)
+        # Pending first: an add() finishing concurrently is in the filter before it leaves _pending
+        with self._lock:
+            if message_id in self._pending:
+                return True
+        bloom = self._bloom
+        if bloom is not None and message_id not in bloom:
+            return False
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM processed WHERE message_id = ?", (message_id,)).fetchone() is not None
+
+    def add(self, message_id: str, ts: str, namespace: str = "") -> None:
+        message_id = scoped_id(message_id, namespace)
+        if self.contains(message_id):
+            return
+        with self._lock:
+            self._pending.add(message_id)
+        try:
+            self._committer.commit(message_id, ts)
+        finally:
+            with self._lock:
+                self._pending.discard(message_id)
+
+    def _insert(self, batch: List[Tuple[str, str]]) -> None:
+        self._insert_rows([(mid, _epoch(ts)) for mid, ts in batch])
+
+    def _insert_rows(self, rows: List[Tuple[str, float]]) -> None:
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR IGNORE INTO processed (message_id, ts) VALUES (?, ?)", rows)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        with self._bloom_lock:
+            if self._bloom is not None:
+                for mid, _ts in rows:
+                    self._bloom.add(mid)
+            else:
+                self._bloom_backlog.extend(mid for mid, _ts in rows)
+
+    def compact(self) -> int:
+        """Delete ids older than the retention window. Returns the number removed."""
+        if self.retention_days <= 0:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            removed = self._db.execute("DELETE FROM processed WHERE ts < ?", (cutoff,)).rowcount
+        if removed:
+            log.info("Purged %d expired processed ids", removed)
+        return removed
+
+    def _compact_loop(self) -> None:
+        while not self._stop.wait(self.compact_interval_seconds):
+            try:
+                self.compact()
+            except Exception:
+                log.exception("State compaction failed")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+        return {"ids": count, "bloom_ready": int(self._bloom is not None)}
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._lock:
+            self._db.close()
+
+
+def open_message_store(
+    backend: str,
+    path: str,
+    retention_days: float = 0,
+    fsync: bool = False,
+    compact_interval_seconds: float = 3600,
+    jsonl_path: str = "",
+):
+    """Create the processed-id store for ``backend`` ("jsonl" or "sqlite")."""
+    if backend == "sqlite":
+        return SqliteMessageStore(
+            path,
+            retention_days=retention_days,
+            fsync=fsync,
+            compact_interval_seconds=compact_interval_seconds,
+            import_jsonl=jsonl_path,
+        )
+    return ProcessedMessageStore(
+        path,
+        retention_days=retention_days,
+        fsync=fsync,
+        compact_interval_seconds=compact_interval_seconds,
+    )
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import binascii
+import codecs
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+# Parsed IMAP value: list, string/atom bytes, or None for NIL
+_Value = Union[list, bytes, None]
+
+_ATOM_END = re.compile(rb"[\s()\"]")
+_LITERAL = re.compile(rb"\{(\d+)\+?\}\r?\n")
+_WHITESPACE = re.compile(rb"\s+")
+
+
+@dataclass
+class BodyPart:
+    """One node of an IMAP BODYSTRUCTURE (RFC 3501 section 7.4.2)."""
+
+    section: str  # part specifier for BODY[...], e.g. "1" or "2.1"; "" for the top-level multipart
+    content_type: str
+    params: Dict[str, str] = field(default_factory=dict)
+    encoding: str = "7bit"
+    size: int = 0
+    disposition: str = ""
+    filename: str = ""
+    parts: List["BodyPart"] = field(default_factory=list)
+
+    @property
+    def charset(self) -> str:
+        return self.params.get("charset", "")
+
+    @property
+    def is_attachment(self) -> bool:
+        return self.disposition == "attachment" or bool(self.filename)
+
+
+def _read(raw: bytes, pos: int) -> Tuple[_Value, int]:
+    while pos < len(raw) and raw[pos] in b" \t\r\n":
+        pos += 1
+    if pos >= len(raw):
+        raise ValueError("unexpected end of BODYSTRUCTURE")
+    ch = raw[pos:pos + 1]
+    if ch == b"(":
+        items: list = []
+        pos += 1
+        while True:
+            while pos < len(raw) and raw[pos] in b" \t\r\n":
+                pos += 1
+            if raw[pos:pos + 1] == b")":
+                return items, pos + 1
+            value, pos = _read(raw, pos)
+            items.append(value)
+    if ch == b'"':
+        out = bytearray()
+        pos += 1
+        while raw[pos:pos + 1] != b'"':
+            if raw[pos:pos + 1] == b"\\":
+                pos += 1
+            out += raw[pos:pos + 1]
+            pos += 1
+            if pos >= len(raw):
+                raise ValueError("unterminated string in BODYSTRUCTURE")
+        return bytes(out), pos + 1
+    literal = _LITERAL.match(raw, pos)
+    if literal:
+        start = literal.end()
+        end = start + int(literal.group(1))
+        return raw[start:end], end
+    end = _ATOM_END.search(raw, pos)
+    stop = end.start() if end else len(raw)
+    atom = raw[pos:stop]
+    return (None if atom.upper() == b"NIL" else atom), stop
+
+
+def _text(value: _Value) -> str:
+    return value.decode("utf-8", "replace") if isinstance(value, bytes) else ""
+
+
+def _pairs(value: _Value) -> Dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {_text(k).lower(): _text(v) for k, v in zip(value[::2], value[1::2])}
+
+
+def _disposition(value: _Value) -> Tuple[str, Dict[str, str]]:
+    if isinstance(value, list) and value:
+        return _text(value[0]).lower(), _pairs(value[1] if len(value) > 1 else None)
+    return "", {}
+
+
+def _build(node: list, section: str) -> BodyPart:
+    if node and isinstance(node[0], list):
+        children: List[BodyPart] = []
+        i = 0
+        while i < len(node) and isinstance(node[i], list):
+            children.append(_build(node[i], f"{section}.{i + 1}" if section else str(i + 1)))
+            i += 1
+        subtype = _text(node[i]).lower() if i < len(node) else "mixed"
+        ext = node[i + 1:]
+        disposition, _ = _disposition(ext[1] if len(ext) > 1 else None)
+        return BodyPart(section, f"multipart/{subtype}", _pairs(ext[0] if ext else None), disposition=disposition, parts=children)
+
+    maintype, subtype = _text(node[0]).lower(), _text(node[1]).lower()
+    params = _pairs(node[2])
+    size = int(node[6]) if len(node) > 6 and isinstance(node[6], bytes) and node[6].isdigit() else 0
+    # Extension data starts after the type-specific fields: text adds a line count,
+    # message/rfc822 adds envelope, body and line count
+    ext_at = 8 if maintype == "text" else 10 if (maintype, subtype) == ("message", "rfc822") else 7
+    disposition, dparams = _disposition(node[ext_at + 1] if len(node) > ext_at + 1 else None)
+    return BodyPart(
+        section=section or "1",
+        content_type=f"{maintype}/{subtype}",
+        params=params,
+        encoding=_text(node[5]).lower() or "7bit",
+        size=size,
+        disposition=disposition,
+        filename=dparams.get("filename") or params.get("name", ""),
+    )
+
+
+def parse_bodystructure(raw: bytes, pos: int = 0) -> BodyPart:
+    """Parse the parenthesized BODYSTRUCTURE value starting at ``raw[pos]``."""
+    value, _ = _read(raw, pos)
+    if not isinstance(value, list):
+        raise ValueError("BODYSTRUCTURE is not a list")
+    return _build(value, "")
+
+
+def find_text_part(root: BodyPart) -> Optional[BodyPart]:
+    """First inline text/plain part, else first inline text/html; attached messages are not entered."""
+    plain: Optional[BodyPart] = None
+    html: Optional[BodyPart] = None
+    stack = [root]
+    while stack:
+        part = stack.pop()
+        if part.parts:
+            stack.extend(reversed(part.parts))
+            continue
+        if part.is_attachment:
+            continue
+        if part.content_type == "text/plain" and plain is None:
+            plain = part
+        elif part.content_type == "text/html" and html is None:
+            html = part
+    return plain or html
+
+
+def decode_part(data: bytes, encoding: str, charset: str) -> str:
+    """Undo the transfer encoding (tolerating a truncated tail) and decode with the declared charset."""
+    encoding = (encoding or "").lower()
+    try:
+        if encoding == "base64":
+            data = _WHITESPACE.sub(b"", data)
+            data = binascii.a2b_base64(data[: len(data) // 4 * 4])
+        elif encoding == "quoted-printable":
+            data = binascii.a2b_qp(data)
+    except binascii.Error:
+        pass
+    try:
+        codecs.lookup(charset or "utf-8")
+    except LookupError:
+        charset = "utf-8"
+    return data.decode(charset or "utf-8", errors="replace")
@@ -1,61 +1,164 @@
 from __future__ import annotations
 
+import json
 import re
-from typing import Dict, List
+from itertools import compress
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+DEFAULT_KEYWORDS: Dict[str, List[str]] = {
+    "basic": [
+        "home office", "deduction", "write off", "business expense",
+        "quarterly tax", "estimated tax", "simple question", "quick question",
+        "mileage", "receipt", "documentation", "forms", "deadline",
+        "business meal", "travel expense", "depreciation",
+    ],
+    "intermediate": [
+        "tax planning", "strategy", "incorporation", "llc", "partnership",
+        "retirement plan", "investment", "audit preparation", "bookkeeping",
+        "payroll", "sales tax", "state tax", "s-corp", "sole proprietorship",
+    ],
+    "complex": [
+        "merger", "acquisition", "forensic", "litigation", "investigation",
+        "estate planning", "trust", "international tax", "transfer pricing",
+        "irs investigation", "penalty abatement", "appeal", "representation",
+        "audit notice", "irs audit", "urgent",
+    ],
+}
+
+TIERS = ("basic", "intermediate", "complex")
+
+# "audit" together with "irs" anywhere in the text is a complex signal on its own
+_SIGNAL_TERMS = ("audit", "irs")
+
+_DATE_RE = re.compile(r"\b(?:\d{1,2}[/-])?\d{1,2}[/-]\d{2,4}\b")
+_MONEY_RE = re.compile(r"\$\s?\d[\d,]*(?:\.\d{2})?")
+_W2_RE = re.compile(r"\bW-2\b", re.I)
+_1099_RE = re.compile(r"\b1099\b")
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """Regex alternation with shared prefixes factored out, preferring the longest term."""
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class _KeywordMatcher:
+    """
+    Finds which of a fixed set of lowercase terms occur (as substrings) in a text.
+
+    Terms are compiled once. Small term sets use one C-level ``in`` sweep over a
+    precompiled tuple, which beats any regex in CPython below ~150 terms; larger
+    sets use a single left-to-right scan with a prefix-factored (trie) regex.
+    """
+
+    TRIE_MIN_TERMS = 150
+
+    def __init__(self, terms: Iterable[str]) -> None:
+        self.terms = tuple(sorted({t.lower() for t in terms if t}))
+        self._pattern: Optional[re.Pattern] = None
+        self._implied: Dict[str, List[str]] = {}
+        if len(self.terms) >= self.TRIE_MIN_TERMS:
+            self._pattern = re.compile(_trie_pattern(self.terms))
+            # A match at some position also implies every shorter term that is a prefix of it
+            self._implied = {t: [p for p in self.terms if t.startswith(p)] for t in self.terms}
+
+    def find(self, text: str) -> Set[str]:
+        if self._pattern is None:
+            return set(compress(self.terms, map(text.__contains__, self.terms)))
+
+        found: Set[str] = set()
+        search = self._pattern.search
+        m = search(text)
+        while m:
+            found.update(self._implied[m.group()])
+            # Restart one character later so overlapping terms are not missed
+            m = search(text, m.start() + 1)
+        return found
 
 
 class EmailClassifier:
     """Heuristic classifier for determining complexity and extracting key info."""
 
-    def __init__(self) -> None:
-        self.basic_keywords: List[str] = [
-            "home office", "deduction", "write off", "business expense",
-            "quarterly tax", "estimated tax", "simple question", "quick question",
-            "mileage", "receipt", "documentation", "forms", "deadline",
-            "business meal", "travel expense", "depreciation",
-        ]
-
-        self.intermediate_keywords: List[str] = [
-            "tax planning", "strategy", "incorporation", "llc", "partnership",
-            "retirement plan", "investment", "audit preparation", "bookkeeping",
-            "payroll", "sales tax", "state tax", "s-corp", "sole proprietorship",
-        ]
-
-        self.complex_keywords: List[str] = [
-            "merger", "acquisition", "forensic", "litigation", "investigation",
-            "estate planning", "trust", "international tax", "transfer pricing",
-            "irs investigation", "penalty abatement", "appeal", "representation",
-            "audit notice", "irs audit", "urgent",
-        ]
+    def __init__(self, keywords: Optional[Dict[str, List[str]]] = None) -> None:
+        keywords = keywords or {}
+        self.basic_keywords: List[str] = list(keywords.get("basic", DEFAULT_KEYWORDS["basic"]))
+        self.intermediate_keywords: List[str] = list(keywords.get("intermediate", DEFAULT_KEYWORDS["intermediate"]))
+        self.complex_keywords: List[str] = list(keywords.get("complex", DEFAULT_KEYWORDS["complex"]))
+        self.compile()
+
+    @classmethod
+    def from_file(cls, path: str) -> "EmailClassifier":
+        """Load keyword lists from JSON: {"basic": [...], "intermediate": [...], "complex": [...]}."""
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        return cls({tier: data[tier] for tier in TIERS if tier in data})
+
+    def compile(self) -> None:
+        """Rebuild the matcher; call after editing the keyword lists in place."""
+        self._term_tiers: Dict[str, List[str]] = {}
+        for tier, words in zip(TIERS, (self.basic_keywords, self.intermediate_keywords, self.complex_keywords)):
+            for word in {w.lower() for w in words}:
+                self._term_tiers.setdefault(word, []).append(tier)
+        self._matcher = _KeywordMatcher(list(self._term_tiers) + list(_SIGNAL_TERMS))
+
+    def tier_counts(self, content: str) -> Dict[str, int]:
+        """Number of distinct keywords from each tier present in ``content``."""
+        return self._count(self._matcher.find(content.lower()))
+
+    def _count(self, found: Set[str]) -> Dict[str, int]:
+        counts = dict.fromkeys(TIERS, 0)
+        for term in found:
+            for tier in self._term_tiers.get(term, ()):
+                counts[tier] += 1
+        return counts
 
     def classify(self, content: str) -> str:
-        c = content.lower()
-        basic = sum(1 for k in self.basic_keywords if k in c)
-        inter = sum(1 for k in self.intermediate_keywords if k in c)
-        complex_ = sum(1 for k in self.complex_keywords if k in c)
+        found = self._matcher.find(content.lower())
+        counts = self._count(found)
 
         # Bias towards higher complexity if there is any strong complex signal
-        if complex_ > 0 or ("audit" in c and "irs" in c):
+        if counts["complex"] > 0 or all(t in found for t in _SIGNAL_TERMS):
             return "complex"
-        if inter >= max(1, basic):
+        if counts["intermediate"] >= max(1, counts["basic"]):
             return "intermediate"
         return "basic"
 
+    def classify_batch(self, contents: Iterable[str]) -> List[str]:
+        classify = self.classify
+        return [classify(c) for c in contents]
+
     def extract_key_info(self, content: str) -> Dict:
         # Very lightweight extraction for dates, amounts, and entities.
         info: Dict = {}
 
-        date_matches = re.findall(r"\b(?:\d{1,2}[/-])?\d{1,2}[/-]\d{2,4}\b", content)
+        date_matches = _DATE_RE.findall(content)
         if date_matches:
             info["dates"] = list(dict.fromkeys(date_matches))[:5]
 
-        money_matches = re.findall(r"\$\s?\d[\d,]*(?:\.\d{2})?", content)
+        money_matches = _MONEY_RE.findall(content)
         if money_matches:
             info["amounts"] = list(dict.fromkeys(money_matches))[:5]
 
-        if re.search(r"\bW-2\b", content, re.I):
+        if _W2_RE.search(content):
             info.setdefault("documents", []).append("W-2")
-        if re.search(r"\b1099\b", content, re.I):
+        if _1099_RE.search(content):
             info.setdefault("documents", []).append("1099")
 
         return info
+
+    def extract_key_info_batch(self, contents: Iterable[str]) -> List[Dict]:
+        extract = self.extract_key_info
+        return [extract(c) for c in contents]
@@ -3,95 +3,426 @@ from __future__ import annotations
 import email
 import imaplib
 import logging
+import re
+import select
+import ssl
 import time
-from datetime import datetime
 from email.header import decode_header
-from threading import Thread
-from typing import Callable, Optional
+from threading import Event, Thread
+from typing import Callable, Dict, Iterable, List, Optional
+
+from ..core.metrics import stage
+from .bodystructure import BodyPart, decode_part, find_text_part, parse_bodystructure
+from .text import html_to_text
 
 log = logging.getLogger(__name__)
 
+# Enough to run the sender filters and to parse the TEXT section that follows
+_HEADER_FIELDS = "FROM SUBJECT MESSAGE-ID IN-REPLY-TO REFERENCES MIME-VERSION CONTENT-TYPE CONTENT-TRANSFER-ENCODING"
+
+_FETCH_START = re.compile(rb"^\d+ \(")
+_FETCH_UID = re.compile(rb"UID (\d+)")
+_FETCH_SECTION = re.compile(rb"BODY\[([^\]]*)\](?:<\d+>)? \{\d+\}$")
+_FETCH_BODYSTRUCTURE = re.compile(rb"BODYSTRUCTURE \(")
+
+
+def _uid_set(uids: List[int]) -> str:
+    """Compress sorted UIDs into an IMAP sequence set, e.g. [1, 2, 3, 7] -> "1:3,7"."""
+    ranges = []
+    start = prev = uids[0]
+    for uid in uids[1:]:
+        if uid == prev + 1:
+            prev = uid
+            continue
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        start = prev = uid
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+def _parse_fetch(data: list) -> Dict[int, Dict[str, bytes]]:
+    """
+    Group an imaplib FETCH response by UID.
+
+    Sections are keyed by the text inside ``BODY[...]``, with any
+    HEADER.FIELDS variant collapsed to "HEADER". A BODYSTRUCTURE item is kept
+    as raw bytes under "BODYSTRUCTURE" (with any literals it contains re-joined).
+    """
+    out: Dict[int, Dict[str, bytes]] = {}
+    current: Dict[str, bytes] = {}
+    raw = bytearray()
+    structure_at = -1
+
+    def finish() -> None:
+        if structure_at >= 0:
+            current["BODYSTRUCTURE"] = bytes(raw[structure_at:])
+
+    for item in data or []:
+        meta = item[0] if isinstance(item, tuple) else item
+        if not isinstance(meta, bytes):
+            continue
+        if _FETCH_START.match(meta):
+            # New message; its UID may appear before or after the literals
+            finish()
+            current, raw, structure_at = {}, bytearray(), -1
+        uid = _FETCH_UID.search(meta)
+        if uid:
+            out[int(uid.group(1))] = current
+        structure = _FETCH_BODYSTRUCTURE.search(meta)
+        if structure and structure_at < 0:
+            structure_at = len(raw) + structure.end() - 1
+        raw += meta
+        if isinstance(item, tuple):
+            raw += b"\r\n" + item[1]
+            section = _FETCH_SECTION.search(meta)
+            if section:
+                key = section.group(1).decode(errors="ignore").upper()
+                current["HEADER" if key.startswith("HEADER") else key] = item[1]
+    finish()
+    return out
+
 
 class RealEmailMonitor:
-    """Monitors a Gmail account via IMAP for unread messages."""
+    """
+    Monitors a Gmail account via IMAP for unread messages.
 
-    def __init__(self, imap_host: str, imap_port: int, gmail_address: str, gmail_app_password: str, poll_seconds: int = 30):
+    ``mode="poll"`` opens a fresh connection every ``poll_seconds``.
+    ``mode="idle"`` keeps one authenticated connection open and waits for
+    IMAP IDLE (RFC 2177) notifications, re-issuing IDLE every ``idle_seconds``;
+    it falls back to polling if the server does not advertise IDLE.
+    """
+
+    def __init__(
+        self,
+        imap_host: str,
+        imap_port: int,
+        gmail_address: str,
+        gmail_app_password: str,
+        poll_seconds: int = 30,
+        mode: str = "poll",
+        idle_seconds: int = 1500,
+        use_ssl: bool = True,
+        max_backoff_seconds: int = 60,
+        max_body_bytes: int = 64 * 1024,
+        mailbox: str = "",
+        ignore_senders: Iterable[str] = (),
+    ):
+        self.mailbox = mailbox
+        # Our other accounts: answering them would make two mailboxes reply to each other forever
+        self.ignore_senders = {a.lower() for a in ignore_senders if a}
         self.imap_host = imap_host
         self.imap_port = imap_port
         self.gmail_address = gmail_address
         self.gmail_app_password = gmail_app_password
         self.poll_seconds = poll_seconds
+        self.mode = mode
+        # RFC 2177: clients should re-issue IDLE at least every 29 minutes
+        self.idle_seconds = min(idle_seconds, 29 * 60)
+        self.use_ssl = use_ssl
+        self.max_backoff_seconds = max_backoff_seconds
+        # Only this much of the chosen text part is downloaded, however large the message
+        self.max_body_bytes = max(1024, max_body_bytes)
+
+        # Incremental fetch position; reset whenever the server's UIDVALIDITY changes
+        self._uidvalidity: Optional[int] = None
+        self._last_uid = 0
 
         self._monitoring = False
+        self._stop_event = Event()
         self._thread: Optional[Thread] = None
-        self._on_email: Optional[Callable[[str, str, str, str], None]] = None  # (sender_email, subject, body, message_id)
+        # (sender_email, subject, body, message_id, mailbox=..., in_reply_to=..., references=...)
+        self._on_email: Optional[Callable[..., object]] = None
 
-    def start(self, on_email: Callable[[str, str, str, str], None]) -> None:
+    @property
+    def configured(self) -> bool:
+        return bool(self.gmail_address and self.gmail_app_password)
+
+    def start(self, on_email: Callable[..., object]) -> None:
         self._on_email = on_email
+        if self._monitoring and self._thread is not None and self._thread.is_alive():
+            return
         self._monitoring = True
-        self._thread = Thread(target=self._loop, daemon=True)
+        self._stop_event = Event()
+        target = self._idle_loop if self.mode == "idle" else self._loop
+        self._thread = Thread(target=target, args=(self._stop_event,), name=f"imap-{self.mailbox or 'monitor'}", daemon=True)
         self._thread.start()
-        log.info("Started email monitoring for %s", self.gmail_address)
+        log.info("Started email monitoring for %s (mode=%s)", self.gmail_address, self.mode)
 
     def stop(self) -> None:
         self._monitoring = False
-        log.info("Stopped email monitoring")
+        self._stop_event.set()
+        log.info("Stopped email monitoring for %s", self.gmail_address)
 
-    def _loop(self) -> None:
-        while self._monitoring:
+    def _loop(self, stop_event: Event) -> None:
+        while not stop_event.is_set():
             try:
                 self.check_for_new_emails()
             except Exception:
-                log.exception("Error during email polling loop")
-            time.sleep(self.poll_seconds)
+                log.exception("Error during email polling loop for %s", self.gmail_address)
+            stop_event.wait(self.poll_seconds)
 
-    def check_for_new_emails(self) -> None:
-        if not self.gmail_address or not self.gmail_app_password:
-            log.warning("IMAP not configured; set GMAIL_ADDRESS and GMAIL_APP_PASSWORD to enable monitoring.")
-            return
+    def _idle_loop(self, stop_event: Event) -> None:
+        backoff = 1.0
+        idle_supported = True
+        while idle_supported and not stop_event.is_set():
+            if not self.configured:
+                self.check_for_new_emails()  # logs the configuration warning
+                stop_event.wait(self.poll_seconds)
+                continue
+            try:
+                with self._connect() as mail:
+                    idle_supported = self._supports_idle(mail)
+                    if idle_supported:
+                        backoff = 1.0
+                        self._idle_session(mail, stop_event)
+            except Exception:
+                log.exception("IMAP IDLE connection for %s failed; reconnecting in %.0fs", self.gmail_address, backoff)
+                stop_event.wait(backoff)
+                backoff = min(backoff * 2, float(self.max_backoff_seconds))
+
+        if not idle_supported:
+            log.warning("IMAP server %s does not support IDLE; falling back to polling", self.imap_host)
+            self._loop(stop_event)
 
-        with imaplib.IMAP4_SSL(self.imap_host, self.imap_port) as mail:
+    def _idle_session(self, mail: imaplib.IMAP4, stop_event: Event) -> None:
+        # Catch up on anything that arrived while disconnected
+        self.check_for_new_emails(mail)
+        while not stop_event.is_set():
+            if self._idle(mail, stop_event):
+                self.check_for_new_emails(mail)
+            else:
+                # Timer expired: keep the connection alive before re-issuing IDLE
+                mail.noop()
+
+    def _connect(self) -> imaplib.IMAP4:
+        cls = imaplib.IMAP4_SSL if self.use_ssl else imaplib.IMAP4
+        mail = cls(self.imap_host, self.imap_port)
+        try:
             mail.login(self.gmail_address, self.gmail_app_password)
             mail.select("INBOX")
+        except Exception:
+            mail.shutdown()
+            raise
+        return mail
+
+    @staticmethod
+    def _supports_idle(mail: imaplib.IMAP4) -> bool:
+        _typ, data = mail.capability()
+        caps = b" ".join(d for d in data if isinstance(d, bytes)).upper().split()
+        return b"IDLE" in caps
+
+    def _idle(self, mail: imaplib.IMAP4, stop_event: Event) -> bool:
+        """Run one IDLE cycle. Returns True if the server reported new mail."""
+        tag = b"IDLE1"
+        mail.send(tag + b" IDLE\r\n")
+        line = mail.readline()
+        while line.startswith(b"* "):
+            # Untagged data may precede the continuation request
+            line = mail.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+
+        has_new = False
+        deadline = time.monotonic() + self.idle_seconds
+        try:
+            while not has_new and not stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # Short waits so stop() is honoured promptly
+                if not self._wait_readable(mail, min(1.0, remaining)):
+                    continue
+                line = mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("connection closed during IDLE")
+                has_new = self._is_new_mail(line)
+        finally:
+            mail.send(b"DONE\r\n")
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("connection closed while ending IDLE")
+            if line.startswith(tag + b" "):
+                break
+            has_new = has_new or self._is_new_mail(line)
+        return has_new
+
+    @staticmethod
+    def _is_new_mail(line: bytes) -> bool:
+        parts = line.upper().split()
+        return len(parts) >= 3 and parts[0] == b"*" and parts[2] in (b"EXISTS", b"RECENT")
+
+    @staticmethod
+    def _wait_readable(mail: imaplib.IMAP4, timeout: float) -> bool:
+        # imaplib reads through a buffered file object, so data may already be
+        # buffered even when select() reports nothing on the socket. A
+        # non-blocking peek covers both without risking a timed-out file object.
+        sock = mail.sock
+        prev = sock.gettimeout()
+        sock.settimeout(0.0)
+        try:
+            if mail.file.peek(1):
+                return True
+        except (BlockingIOError, ssl.SSLWantReadError):
+            pass
+        finally:
+            sock.settimeout(prev)
+        readable, _w, _x = select.select([sock], [], [], timeout)
+        return bool(readable)
+
+    def check_for_new_emails(self, mail: Optional[imaplib.IMAP4] = None) -> None:
+        if not self.configured:
+            log.warning("IMAP not configured; set GMAIL_ADDRESS and GMAIL_APP_PASSWORD to enable monitoring.")
+            return
 
-            # Only unread
-            _result, message_ids = mail.search(None, "UNSEEN")
-            if not message_ids or not message_ids[0]:
-                return
-
-            ids = message_ids[0].split()
-            for msg_id in ids:
-                try:
-                    self._process_message(mail, msg_id)
-                except Exception:
-                    log.exception("Failed processing IMAP message %s", msg_id)
-
-    def _process_message(self, mail: imaplib.IMAP4_SSL, msg_id: bytes) -> None:
-        _result, msg_data = mail.fetch(msg_id, "(RFC822)")
-        if not msg_data or not msg_data[0]:
+        if mail is not None:
+            self._fetch_unseen(mail)
             return
+        with self._connect() as mail:
+            self._fetch_unseen(mail)
 
-        raw = msg_data[0][1]
-        m = email.message_from_bytes(raw)
+    def _fetch_unseen(self, mail: imaplib.IMAP4) -> None:
+        self._check_uidvalidity(mail)
 
-        subject = self._decode_header(m.get("Subject")) or "No Subject"
-        sender = self._decode_header(m.get("From", ""))
-        message_id = (m.get("Message-ID") or "").strip()
+        # Only unread, and only UIDs above the highest one already fetched
+        with stage("imap_fetch"):
+            _result, data = mail.uid("SEARCH", None, "UNSEEN", f"UID {self._last_uid + 1}:*")
+        # "n:*" always matches the highest UID, even when it is below n
+        uids = sorted(int(u) for u in (data[0] or b"").split() if int(u) > self._last_uid) if data else []
+        if not uids:
+            return
 
-        sender_email = self._extract_email_address(sender)
-        if not sender_email:
+        # One round trip for the headers and MIME structure of every new message;
+        # filters run on headers only
+        with stage("imap_fetch"):
+            _result, data = mail.uid(
+                "FETCH", _uid_set(uids), f"(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({_HEADER_FIELDS})])"
+            )
+        fetched = _parse_fetch(data)
+        headers = {uid: sections.get("HEADER", b"") for uid, sections in fetched.items()}
+
+        wanted: Dict[int, str] = {}
+        for uid in uids:
+            try:
+                sender_email = self._accept_sender(email.message_from_bytes(headers.get(uid, b"")))
+                if sender_email:
+                    wanted[uid] = sender_email
+            except Exception:
+                log.exception("Failed reading headers of IMAP message uid=%s", uid)
+
+        # Bodies only for messages that passed the sender filters
+        bodies = self._fetch_bodies(mail, {uid: fetched.get(uid, {}) for uid in wanted}) if wanted else {}
+
+        done = [uid for uid in uids if uid not in wanted]
+        for uid in sorted(wanted):
+            try:
+                if self._process_message(uid, headers[uid], bodies.get(uid, ""), wanted[uid]):
+                    done.append(uid)
+            except Exception:
+                log.exception("Failed processing IMAP message uid=%s", uid)
+        # Advance only past the handled prefix: a refused or failed message stays unread and
+        # inside the next "UNSEEN UID n:*" search, so this session retries it on the next pass
+        handled = set(done)
+        for uid in uids:
+            if uid not in handled:
+                break
+            self._last_uid = uid
+
+        # PEEK leaves messages unread; mark the handled ones seen (as FETCH RFC822 used to)
+        if done:
+            mail.uid("STORE", _uid_set(sorted(done)), "+FLAGS", "(\\Seen)")
+
+    def _fetch_bodies(self, mail: imaplib.IMAP4, fetched: Dict[int, Dict[str, bytes]]) -> Dict[int, str]:
+        """
+        Download and decode just the text part of each message.
+
+        The part is picked from BODYSTRUCTURE (plain over HTML, attachments skipped)
+        and fetched by part number, capped at ``max_body_bytes``; messages sharing a
+        part number share one FETCH. Without a usable BODYSTRUCTURE the capped TEXT
+        section is parsed instead.
+        """
+        parts: Dict[int, BodyPart] = {}
+        fallback: List[int] = []
+        bodies: Dict[int, str] = {}
+        for uid, sections in fetched.items():
+            try:
+                part = find_text_part(parse_bodystructure(sections["BODYSTRUCTURE"]))
+            except (KeyError, ValueError, IndexError):
+                fallback.append(uid)
+                continue
+            if part is None:
+                bodies[uid] = ""  # attachments only
+            else:
+                parts[uid] = part
+
+        by_section: Dict[str, List[int]] = {}
+        for uid, part in parts.items():
+            by_section.setdefault(part.section, []).append(uid)
+        cap = self.max_body_bytes
+        for section, section_uids in by_section.items():
+            with stage("imap_fetch"):
+                _result, data = mail.uid("FETCH", _uid_set(sorted(section_uids)), f"(UID BODY.PEEK[{section}]<0.{cap}>)")
+            for uid, got in _parse_fetch(data).items():
+                part = parts.get(uid)
+                if part is None:
+                    continue
+                with stage("body_extract"):
+                    text = decode_part(got.get(section, b""), part.encoding, part.charset)
+                    bodies[uid] = html_to_text(text) if part.content_type == "text/html" else text
+
+        if fallback:
+            with stage("imap_fetch"):
+                _result, data = mail.uid("FETCH", _uid_set(sorted(fallback)), f"(UID BODY.PEEK[TEXT]<0.{cap}>)")
+            for uid, got in _parse_fetch(data).items():
+                if uid in fetched:
+                    with stage("body_extract"):
+                        m = email.message_from_bytes(fetched[uid].get("HEADER", b"") + got.get("TEXT", b""))
+                        bodies[uid] = self._extract_body(m)
+        return bodies
+
+    def _check_uidvalidity(self, mail: imaplib.IMAP4) -> None:
+        _typ, data = mail.response("UIDVALIDITY")
+        if not data or data[0] is None:
             return
+        uidvalidity = int(data[0])
+        if uidvalidity != self._uidvalidity:
+            if self._uidvalidity is not None:
+                log.warning("UIDVALIDITY changed (%s -> %s); rescanning mailbox", self._uidvalidity, uidvalidity)
+            self._uidvalidity = uidvalidity
+            self._last_uid = 0
+
+    def _accept_sender(self, m: email.message.Message) -> str:
+        """Returns the sender address, or "" if the message should be ignored."""
+        # Parse the raw header: decoding an encoded display name first drops the address
+        sender_email = self._extract_email_address(str(m.get("From", "")))
+        if not sender_email:
+            return ""
 
         # Avoid loops and system mail
-        if sender_email.lower() == self.gmail_address.lower():
-            return
+        if sender_email.lower() == self.gmail_address.lower() or sender_email.lower() in self.ignore_senders:
+            return ""
         if "google.com" in sender_email.lower() or "no-reply" in sender_email.lower():
-            return
+            return ""
+        return sender_email
 
-        body = self._extract_body(m)
+    def _process_message(self, uid: int, header: bytes, body: str, sender_email: str) -> bool:
+        m = email.message_from_bytes(header)
+        subject = self._decode_header(m.get("Subject")) or "No Subject"
+        message_id = (m.get("Message-ID") or "").strip()
 
         if self._on_email:
-            self._on_email(sender_email, subject, body, message_id or f"imap-{msg_id.decode(errors='ignore')}-{datetime.now().isoformat()}")
+            # Callbacks may return False to signal the email was not accepted (e.g. dispatcher stopped)
+            return self._on_email(
+                sender_email,
+                subject,
+                body,
+                message_id or f"imap-{self._uidvalidity}-{uid}",
+                mailbox=self.mailbox,
+                in_reply_to=(m.get("In-Reply-To") or "").strip(),
+                # Folded header: unfold to one space-separated list
+                references=" ".join((m.get("References") or "").split()),
+            ) is not False
+        return True
 
     @staticmethod
     def _decode_header(value: Optional[str]) -> str:
@@ -110,12 +441,20 @@ class RealEmailMonitor:
 
     @staticmethod
     def _extract_body(m: email.message.Message) -> str:
-        if m.is_multipart():
-            for part in m.walk():
-                if part.get_content_type() == "text/plain":
-                    payload = part.get_payload(decode=True)
-                    if payload:
-                        return payload.decode("utf-8", errors="ignore")
-            return ""
-        payload = m.get_payload(decode=True)
-        return payload.decode("utf-8", errors="ignore") if payload else ""
+        # First text/plain part; HTML-only mail is converted to text instead of dropped
+        html = ""
+        for part in m.walk() if m.is_multipart() else (m,):
+            ctype = part.get_content_type()
+            if ctype not in ("text/plain", "text/html") or part.get_filename():
+                continue
+            payload = part.get_payload(decode=True)
+            if not payload:
+                continue
+            try:
+                text = payload.decode(part.get_content_charset() or "utf-8", errors="ignore")
+            except LookupError:
+                text = payload.decode("utf-8", errors="ignore")
+            if ctype == "text/plain":
+                return text
+            html = html or text
+        return html_to_text(html) if html else ""
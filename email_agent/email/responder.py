@@ -1,30 +1,123 @@
 from __future__ import annotations
 
 import logging
-import smtplib
+from dataclasses import dataclass
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from typing import Tuple
+from threading import Lock
+from typing import Dict, List, Sequence, Tuple
+
+from ..email.smtp_pool import SmtpConnectionPool
 
 log = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class SmtpIdentity:
+    """The account a reply is sent from and the name it is signed with."""
+
+    smtp_user: str
+    smtp_app_password: str
+    cpa_name: str
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.smtp_user and self.smtp_app_password)
+
+
 class EmailResponder:
-    """Sends replies via SMTP. If not configured, runs in demo mode."""
+    """
+    Sends replies via SMTP over pooled sessions. If not configured, runs in demo mode.
+
+    Replies go out as the constructor's account unless an ``identity`` added
+    with ``add_identity`` is named; each account gets its own session pool.
+    """
 
-    def __init__(self, smtp_user: str = "", smtp_app_password: str = "", cpa_name: str = "John Martinez"):
+    def __init__(
+        self,
+        smtp_user: str = "",
+        smtp_app_password: str = "",
+        cpa_name: str = "John Martinez",
+        starttls: bool = True,
+        pool_size: int = 4,
+        max_messages_per_connection: int = 100,
+        idle_seconds: float = 60.0,
+    ):
         self.smtp_user = smtp_user
         self.smtp_app_password = smtp_app_password
         self.cpa_name = cpa_name
         self.enabled = bool(smtp_user and smtp_app_password)
+        self.starttls = starttls
+        self.pool_size = pool_size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_seconds = idle_seconds
+
+        self._identities: Dict[str, SmtpIdentity] = {}
+        self._pools_lock = Lock()
+        self._pools: Dict[Tuple[str, int, str], SmtpConnectionPool] = {}
 
     def configure(self, smtp_user: str, smtp_app_password: str, cpa_name: str) -> None:
         self.smtp_user = smtp_user
         self.smtp_app_password = smtp_app_password
         self.cpa_name = cpa_name
         self.enabled = bool(smtp_user and smtp_app_password)
+        # Sessions are logged in with the old credentials
+        self.close()
         log.info("Email responder configured for %s", smtp_user)
 
+    def add_identity(self, name: str, smtp_user: str, smtp_app_password: str, cpa_name: str) -> None:
+        """Register another account replies can be sent from, selected by ``name``."""
+        self._identities[name] = SmtpIdentity(smtp_user, smtp_app_password, cpa_name)
+
+    def identity(self, name: str = "") -> SmtpIdentity:
+        found = self._identities.get(name) if name else None
+        return found or SmtpIdentity(self.smtp_user, self.smtp_app_password, self.cpa_name)
+
+    def close(self) -> None:
+        with self._pools_lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+    def _pool(self, smtp_host: str, smtp_port: int, identity: SmtpIdentity) -> SmtpConnectionPool:
+        key = (smtp_host, smtp_port, identity.smtp_user)
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = SmtpConnectionPool(
+                    smtp_host,
+                    smtp_port,
+                    identity.smtp_user,
+                    identity.smtp_app_password,
+                    max_size=self.pool_size,
+                    max_messages=self.max_messages_per_connection,
+                    idle_seconds=self.idle_seconds,
+                    starttls=self.starttls,
+                )
+                self._pools[key] = pool
+            return pool
+
+    @staticmethod
+    def _build_message(
+        identity: SmtpIdentity,
+        to_email: str,
+        original_subject: str,
+        response_content: str,
+        in_reply_to: str = "",
+        references: str = "",
+    ) -> MIMEMultipart:
+        msg = MIMEMultipart()
+        msg["From"] = f"{identity.cpa_name} <{identity.smtp_user}>"
+        msg["To"] = to_email
+        msg["Subject"] = original_subject if original_subject.lower().startswith("re:") else f"Re: {original_subject}"
+        msg["Reply-To"] = identity.smtp_user
+        # Thread the reply under the message it answers (RFC 5322 section 3.6.4)
+        if in_reply_to:
+            msg["In-Reply-To"] = in_reply_to
+            msg["References"] = " ".join(references.split() + [in_reply_to])
+        msg.attach(MIMEText(response_content, "plain"))
+        return msg
+
     def send_response(
         self,
         smtp_host: str,
@@ -32,24 +125,38 @@ class EmailResponder:
         to_email: str,
         original_subject: str,
         response_content: str,
+        identity: str = "",
+        in_reply_to: str = "",
+        references: str = "",
     ) -> Tuple[bool, str]:
-        if not self.enabled:
-            log.info("[DEMO MODE] Would send response to %s (subject=%s)", to_email, original_subject)
-            return True, f"Demo mode: response logged for {to_email}"
+        reply = (to_email, original_subject, response_content, in_reply_to, references)
+        return self.send_batch(smtp_host, smtp_port, [reply], identity)[0]
 
-        msg = MIMEMultipart()
-        msg["From"] = f"{self.cpa_name} <{self.smtp_user}>"
-        msg["To"] = to_email
-        msg["Subject"] = f"Re: {original_subject}"
-        msg["Reply-To"] = self.smtp_user
-        msg.attach(MIMEText(response_content, "plain"))
+    def send_batch(
+        self,
+        smtp_host: str,
+        smtp_port: int,
+        replies: Sequence[Tuple[str, ...]],
+        identity: str = "",
+    ) -> List[Tuple[bool, str]]:
+        """
+        Send replies over one SMTP session. Each is (to_email, original_subject,
+        response_content), optionally followed by in_reply_to and references.
+        """
+        account = self.identity(identity)
+        if not account.enabled:
+            for to_email, original_subject, *_rest in replies:
+                log.info("[DEMO MODE] Would send response to %s (subject=%s)", to_email, original_subject)
+            return [(True, f"Demo mode: response logged for {reply[0]}") for reply in replies]
+
+        msgs = [self._build_message(account, *reply) for reply in replies]
+        errors = self._pool(smtp_host, smtp_port, account).send_many(msgs)
 
-        try:
-            with smtplib.SMTP(smtp_host, smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_app_password)
-                server.send_message(msg)
-            return True, f"Response sent successfully to {to_email}"
-        except Exception as e:
-            log.exception("Failed sending response to %s", to_email)
-            return False, f"Failed to send response: {e}"
+        results: List[Tuple[bool, str]] = []
+        for (to_email, *_rest), err in zip(replies, errors):
+            if err is None:
+                results.append((True, f"Response sent successfully to {to_email}"))
+            else:
+                log.error("Failed sending response to %s: %s", to_email, err)
+                results.append((False, f"Failed to send response: {err}"))
+        return results
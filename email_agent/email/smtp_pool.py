@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import logging
+import smtplib
+import time
+from email.message import Message
+from threading import BoundedSemaphore, Lock
+from typing import Dict, List, Optional, Sequence
+
+log = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+    __slots__ = ("smtp", "created", "last_used", "sent")
+
+    def __init__(self, smtp: smtplib.SMTP) -> None:
+        self.smtp = smtp
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.sent = 0
+
+
+class SmtpConnectionPool:
+    """
+    Thread-safe pool of authenticated SMTP sessions for one server/login.
+
+    Sessions are reused across sends, health-checked with NOOP on checkout,
+    and recycled after ``max_messages`` sends or ``idle_seconds`` unused.
+    At most ``max_size`` sessions are open at once; extra callers wait.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        max_size: int = 4,
+        max_messages: int = 100,
+        idle_seconds: float = 60.0,
+        starttls: bool = True,
+        timeout: float = 30.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_size = max(1, max_size)
+        self.max_messages = max(1, max_messages)
+        self.idle_seconds = idle_seconds
+        self.starttls = starttls
+        self.timeout = timeout
+
+        self._lock = Lock()
+        self._slots = BoundedSemaphore(self.max_size)
+        self._idle: List[_PooledConnection] = []
+        self._closed = False
+        self._opened = 0
+
+    def send(self, msg: Message) -> None:
+        """Send one message, raising on failure."""
+        err = self.send_many([msg])[0]
+        if err is not None:
+            raise err
+
+    def send_many(self, msgs: Sequence[Message]) -> List[Optional[Exception]]:
+        """
+        Send messages over a single checked-out session.
+
+        Returns one entry per message: None on success, otherwise the error.
+        A dropped connection is replaced once and the remaining messages continue.
+        """
+        results: List[Optional[Exception]] = []
+        self._slots.acquire()
+        conn: Optional[_PooledConnection] = None
+        try:
+            for msg in msgs:
+                if conn is None:
+                    conn = self._checkout()
+                try:
+                    self._send_one(conn, msg)
+                    results.append(None)
+                except smtplib.SMTPServerDisconnected:
+                    conn = self._resend(conn, msg, results)
+                except smtplib.SMTPException as e:
+                    # Recipient/message-level refusal; the session itself is still usable
+                    results.append(e)
+                except OSError:
+                    conn = self._resend(conn, msg, results)
+                if conn is not None and conn.sent >= self.max_messages:
+                    self._discard(conn)
+                    conn = None
+        except Exception as e:
+            self._discard(conn)
+            conn = None
+            results.extend([e] * (len(msgs) - len(results)))
+        finally:
+            self._checkin(conn)
+            self._slots.release()
+        return results
+
+    def _resend(
+        self, conn: _PooledConnection, msg: Message, results: List[Optional[Exception]]
+    ) -> Optional[_PooledConnection]:
+        # Stale session (server timeout, provider restart): retry once on a fresh one
+        self._discard(conn)
+        try:
+            fresh = self._open()
+        except Exception as e:
+            results.append(e)
+            return None
+        try:
+            self._send_one(fresh, msg)
+            results.append(None)
+        except Exception as e:
+            results.append(e)
+        return fresh
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"idle": len(self._idle), "opened": self._opened, "max_size": self.max_size}
+
+    def _send_one(self, conn: _PooledConnection, msg: Message) -> None:
+        conn.smtp.send_message(msg)
+        conn.sent += 1
+        conn.last_used = time.monotonic()
+
+    def _checkout(self) -> _PooledConnection:
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._open()
+            if time.monotonic() - conn.last_used > self.idle_seconds:
+                self._discard(conn)
+                continue
+            try:
+                code, _msg = conn.smtp.noop()
+                if code == 250:
+                    return conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(conn)
+
+    def _checkin(self, conn: Optional[_PooledConnection]) -> None:
+        if conn is None:
+            return
+        with self._lock:
+            if not self._closed and conn.sent < self.max_messages:
+                self._idle.append(conn)
+                return
+        self._discard(conn)
+
+    def _open(self) -> _PooledConnection:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            smtp.login(self.user, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        with self._lock:
+            self._opened += 1
+        log.debug("Opened SMTP session to %s:%s", self.host, self.port)
+        return _PooledConnection(smtp)
+
+    @staticmethod
+    def _discard(conn: Optional[_PooledConnection]) -> None:
+        if conn is None:
+            return
+        try:
+            conn.smtp.quit()
+        except Exception:
+            conn.smtp.close()
+
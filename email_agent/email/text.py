@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from html.parser import HTMLParser
+from typing import List
+
+# "Hi John,", "Hello!", "Dear Mr. Smith," ... on the first line of a message
+_GREETING = re.compile(r"^(hi|hello|hey|dear|greetings|good (morning|afternoon|evening))\b[^\n]{0,60}$", re.I)
+
+# Sign-off lines ("Thanks,", "Best regards") and the "-- " signature delimiter
+_SIGN_OFF = re.compile(
+    r"^(--\s*|thanks?( you| so much)?|many thanks|cheers|best( regards| wishes)?|kind regards|regards|"
+    r"warm regards|sincerely( yours)?|sent from my \w+)[,.!]?$",
+    re.I,
+)
+
+# Start of a quoted reply / forwarded history; everything from here down is dropped
+_REPLY_HEADER = re.compile(
+    r"^(on\b.{0,200}\bwrote:|-{2,}\s*original message\s*-{2,}|-{2,}\s*forwarded message\s*-{2,}|"
+    r"begin forwarded message:|_{10,})$",
+    re.I,
+)
+# Outlook-style quoted header block: "From: ..." followed within a few lines by "Sent:"/"Date:"
+_OUTLOOK_FROM = re.compile(r"^\*?from:\*?\s", re.I)
+_OUTLOOK_SENT = re.compile(r"^\*?(sent|date):\*?\s", re.I)
+
+# Legal footers and confidentiality notices
+_DISCLAIMER = re.compile(
+    r"^(\W*(confidentiality|privileged|legal) (notice|disclaimer)|\W*disclaimer\b|"
+    r"this (e-?mail|message|communication)( and any (files|attachments)[^.]{0,40})? (is|are|may be|contains?) "
+    r"(confidential|privileged|intended)|irs circular 230|any tax advice contained in this)",
+    re.I,
+)
+
+# A legal footer starts within this many non-blank lines of the end
+_DISCLAIMER_MAX_LINES = 12
+
+# A signature after the sign-off is at most this many lines of at most this many chars
+_SIGNATURE_MAX_LINES = 6
+_SIGNATURE_MAX_CHARS = 60
+
+_BLANK_RUNS = re.compile(r"\n{3,}")
+_CHARS_PER_TOKEN = 4
+_ELISION = "\n[...]\n"
+
+_SUBJECT_PREFIX = re.compile(r"^\s*((re|fw|fwd|aw)\s*(\[\d+\])?\s*:\s*)+", re.I)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def strip_greeting(lines: List[str]) -> List[str]:
+    for idx, line in enumerate(lines):
+        if not line.strip():
+            continue
+        return lines[idx + 1:] if _GREETING.match(line.strip()) else lines[idx:]
+    return []
+
+
+def _signature_tail(lines: List[str]) -> bool:
+    # What follows a sign-off in a real signature: a few short lines (name, title, phone), no questions
+    tail = [l.strip() for l in lines if l.strip()]
+    return len(tail) <= _SIGNATURE_MAX_LINES and all(
+        len(l) <= _SIGNATURE_MAX_CHARS and not l.endswith("?") for l in tail
+    )
+
+
+def strip_signature(lines: List[str]) -> List[str]:
+    """
+    Cut the trailing signature block: the earliest sign-off line near the end
+    that only has signature-like lines after it. A sign-off in the middle of
+    the message, or one with nothing before it, is kept.
+    """
+    content = [idx for idx, line in enumerate(lines) if line.strip()]
+    if not content:
+        return lines
+    cut = len(lines)
+    # Scan from the end so a "Thanks!" followed by more questions is never mistaken for the end
+    for idx in reversed(content[-(_SIGNATURE_MAX_LINES + 1):]):
+        if idx > content[0] and _SIGN_OFF.match(lines[idx].strip()) and _signature_tail(lines[idx + 1:]):
+            cut = idx
+    return lines[:cut]
+
+
+def strip_quoted(lines: List[str]) -> List[str]:
+    """Drop ``>`` quoted lines and everything from an "On ... wrote:" / forwarded header down."""
+    out: List[str] = []
+    for idx, line in enumerate(lines):
+        stripped = line.strip()
+        # "On Mon, Jan 1, 2024 at 9:00 AM Jane <jane@x.com>" is often wrapped before "wrote:"
+        joined = f"{stripped} {lines[idx + 1].strip()}" if idx + 1 < len(lines) else stripped
+        if _REPLY_HEADER.match(stripped) or (stripped.lower().startswith("on ") and _REPLY_HEADER.match(joined)):
+            break
+        if _OUTLOOK_FROM.match(stripped) and any(_OUTLOOK_SENT.match(l.strip()) for l in lines[idx + 1: idx + 4]):
+            break
+        if stripped.startswith(">"):
+            continue
+        out.append(line)
+    return out
+
+
+def strip_disclaimer(lines: List[str]) -> List[str]:
+    """
+    Cut the legal footer: the earliest disclaimer line within the last few
+    lines of the message that has no question after it and real content
+    before it. A sentence like "This email is intended to ..." in the body is kept.
+    """
+    content = [idx for idx, line in enumerate(lines) if line.strip()]
+    cut = len(lines)
+    # Scan from the end, as strip_signature does, so only the trailing footer block is considered
+    for idx in reversed(content[-_DISCLAIMER_MAX_LINES:]):
+        if not _DISCLAIMER.match(lines[idx].strip()):
+            continue
+        if any(l.strip().endswith("?") for l in lines[idx + 1:]):
+            break
+        if any(l.strip() for l in strip_greeting(lines[:idx])):
+            cut = idx
+    return lines[:cut]
+
+
+class _HtmlText(HTMLParser):
+    _BLOCK = frozenset(("p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "table", "ul", "ol", "hr"))
+    _SKIP = frozenset(("script", "style", "head", "title", "blockquote"))
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_tag = ""
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_depth:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        classes = dict(attrs).get("class") or ""
+        if tag in self._SKIP or "gmail_quote" in classes or "moz-cite-prefix" in classes:
+            self._skip_tag, self._skip_depth = tag, 1
+            return
+        if tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if self._skip_depth:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+            return
+        if tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Visible text of an HTML email, with block elements as line breaks and quoted replies removed."""
+    parser = _HtmlText()
+    parser.feed(html or "")
+    parser.close()
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in "".join(parser.parts).splitlines())
+    return _BLANK_RUNS.sub("\n\n", "\n".join(lines)).strip()
+
+
+def approx_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Keep the head and tail of ``text`` within roughly ``max_tokens``; 0 = no limit."""
+    budget = max_tokens * _CHARS_PER_TOKEN
+    if max_tokens <= 0 or len(text) <= budget:
+        return text
+    # The question is usually up front and the specifics/ask at the end
+    head_len = budget * 2 // 3
+    tail_len = budget - head_len - len(_ELISION)
+    head = text[:head_len]
+    tail = text[len(text) - tail_len:] if tail_len > 0 else ""
+    # Cut on whitespace so no word is split in half
+    if " " in head[head_len // 2:]:
+        head = head[: head.rfind(" ")]
+    if " " in tail[: len(tail) // 2]:
+        tail = tail[tail.find(" ") + 1:]
+    return head.rstrip() + _ELISION + tail.lstrip()
+
+
+def prepare_body(body: str, max_tokens: int = 0) -> str:
+    """
+    Prompt-ready email body: quoted history, signature and legal footer removed,
+    then truncated to ``max_tokens``. Falls back to the raw text if cleaning
+    would leave nothing.
+    """
+    lines = (body or "").replace("\r\n", "\n").splitlines()
+    cleaned = strip_signature(strip_disclaimer(strip_quoted(lines)))
+    text = _BLANK_RUNS.sub("\n\n", "\n".join(l.rstrip() for l in cleaned)).strip()
+    if not text:
+        text = (body or "").strip()
+    return truncate_tokens(text, max_tokens)
+
+
+def normalize_subject(subject: str) -> str:
+    return _WHITESPACE.sub(" ", _SUBJECT_PREFIX.sub("", subject or "")).strip().lower()
+
+
+def normalize_body(body: str) -> str:
+    """Greeting, signature, case and whitespace-insensitive form of an email body."""
+    lines = strip_signature(strip_greeting((body or "").splitlines()))
+    return _WHITESPACE.sub(" ", " ".join(lines)).strip().lower()
+
+
+def content_key(*parts: str) -> str:
+    """Stable hash of already-normalized parts."""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
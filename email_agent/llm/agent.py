@@ -1,18 +1,54 @@
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
 import logging
 import os
-from typing import Optional
+import queue
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ..core.cache import LruTtlCache
+from ..core.metrics import stage
+from ..email.text import content_key, normalize_body, normalize_subject
+from .breaker import CircuitBreaker
+from .routing import Route
+from .search_cache import CachedSearch
 
 log = logging.getLogger(__name__)
 
+_CLARIFY_REPLY = "Could you share a bit more detail so I can answer accurately?"
+_PRIME_PROMPT = "Reply with the single word OK."
+_CHAIN_PROMPT = """You are an email assistant. Reply to the sender in 2–4 concise sentences.
+- Be helpful and specific.
+- No tool logs or analysis.
+- If you lack exact info, ask 1 clarifying question.
+
+From: {sender}
+Subject: {subject}
+Email:
+{email_body}
+"""
+
 
 class AgenticResponder:
-    """Generates email replies using an LLM, optionally with web tools."""
+    """
+    Generates email replies using an LLM, optionally with web tools.
+
+    Generation runs on one background event loop shared by all callers, with at
+    most ``max_concurrency`` requests in flight to the model server. ``agenerate``
+    can be awaited from any loop; ``generate`` is the blocking wrapper.
+
+    If an agent route has not answered after ``hedge_after_seconds``, the direct
+    chain is started alongside it and the first good reply wins. A per-model
+    circuit breaker sends traffic straight to the chain while the agent keeps
+    failing or running slow, and ``budget_seconds`` caps each email overall.
+    """
 
     def __init__(
         self,
         ollama_model: str = "llama3",
+        ollama_base_url: str = "http://localhost:11434",
         enable_tools: bool = True,
         tavily_api_key: str = "",
         langchain_api_key: str = "",
@@ -20,8 +56,16 @@ class AgenticResponder:
         langsmith_endpoint: str = "https://api.smith.langchain.com",
         langchain_project: str = "General Purpose Email Agent",
         max_iterations: int = 3,
+        cache: Optional[LruTtlCache] = None,
+        max_concurrency: int = 4,
+        search_cache: Optional[LruTtlCache] = None,
+        keep_alive: str = "",
+        hedge_after_seconds: float = 0.0,
+        budget_seconds: float = 0.0,
+        breaker_factory: Optional[Callable[[], CircuitBreaker]] = None,
     ) -> None:
         self.ollama_model = ollama_model
+        self.ollama_base_url = ollama_base_url
         self.enable_tools = enable_tools
         self.tavily_api_key = tavily_api_key
         self.langchain_api_key = langchain_api_key
@@ -29,9 +73,28 @@ class AgenticResponder:
         self.langsmith_endpoint = langsmith_endpoint
         self.langchain_project = langchain_project
         self.max_iterations = max_iterations
+        self.cache = cache
+        self.max_concurrency = max(1, max_concurrency)
+        self.search_cache = search_cache
+        self.keep_alive = keep_alive
+        self.hedge_after_seconds = hedge_after_seconds
+        self.budget_seconds = budget_seconds
+        self.breaker_factory = breaker_factory or CircuitBreaker
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, int] = {"hedged": 0, "hedge_won": 0, "breaker_skipped": 0, "budget_exceeded": 0}
+        self.search: Optional[CachedSearch] = None
+        self._search_tool = None
+
+        self._llms: Dict[str, object] = {}
+        self._agents: Dict[Tuple[str, int], object] = {}
+        self._chains: Dict[str, object] = {}
+        self._build_lock = threading.Lock()
 
-        self._agent = None
-        self._fallback_chain = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop_lock = threading.Lock()
 
     def _ensure_env(self) -> None:
         # Only set if provided; never hardcode secrets.
@@ -46,16 +109,35 @@ class AgenticResponder:
         if self.tavily_api_key:
             os.environ["TAVILY_API_KEY"] = self.tavily_api_key
 
-    def _build_agent(self):
+    @property
+    def default_route(self) -> Route:
+        return Route(pipeline="agent", model=self.ollama_model, max_iterations=self.max_iterations)
+
+    def _build_llm(self, model: str):
+        # langchain-ollama keeps one pooled HTTP client per LLM instance; the
+        # community client opens a new connection for every request.
+        kwargs = {"keep_alive": self.keep_alive} if self.keep_alive else {}
+        try:
+            from langchain_ollama import OllamaLLM
+            return OllamaLLM(model=model, base_url=self.ollama_base_url, **kwargs)
+        except ImportError:
+            from langchain_community.llms import Ollama
+            return Ollama(model=model, base_url=self.ollama_base_url, **kwargs)
+
+    def _get_llm(self, model: str):
+        # Callers hold _build_lock
+        if model not in self._llms:
+            self._llms[model] = self._build_llm(model)
+        return self._llms[model]
+
+    def _build_agent(self, model: str, max_iterations: int):
         self._ensure_env()
 
         from langchain.agents import initialize_agent, AgentType
-        from langchain_community.llms import Ollama
 
         tools = []
         if self.enable_tools and self.tavily_api_key:
-            from langchain_community.tools.tavily_search import TavilySearchResults
-            tools = [TavilySearchResults(max_results=3)]
+            tools = [self._get_search_tool()]
 
         prefix = """You are a helpful email assistant.
 Follow the ReAct format strictly.
@@ -79,40 +161,344 @@ Remember: end with one line beginning with `Final Answer:` only."""
 
         return initialize_agent(
             tools=tools,
-            llm=Ollama(model=self.ollama_model),
+            llm=self._get_llm(model),
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             agent_kwargs={"prefix": prefix, "suffix": suffix},
             verbose=False,
-            max_iterations=self.max_iterations,
+            max_iterations=max_iterations,
             early_stopping_method="generate",
             handle_parsing_errors=True,
         )
 
-    def _build_fallback_chain(self):
+    def _build_fallback_chain(self, model: str):
         self._ensure_env()
-        from langchain_community.llms import Ollama
         from langchain_core.prompts import PromptTemplate
         from langchain.chains import LLMChain
 
-        prompt = PromptTemplate.from_template(
-            """You are an email assistant. Reply to the sender in 2–4 concise sentences.
-- Be helpful and specific.
-- No tool logs or analysis.
-- If you lack exact info, ask 1 clarifying question.
+        prompt = PromptTemplate.from_template(_CHAIN_PROMPT)
+        return LLMChain(llm=self._get_llm(model), prompt=prompt)
 
-From: {sender}
-Subject: {subject}
-Email:
-{email_body}
-"""
-        )
-        return LLMChain(llm=Ollama(model=self.ollama_model), prompt=prompt)
+    def _get_search_tool(self):
+        # Callers hold _build_lock; one tool (and cache) is shared by every agent
+        if self._search_tool is None:
+            from langchain_community.tools.tavily_search import TavilySearchResults
+
+            tavily = TavilySearchResults(max_results=3)
+            if self.search_cache is None:
+                self._search_tool = tavily
+            else:
+                def search(query: str):
+                    # Not tavily.invoke: the tool returns repr(error) as its result, which would be cached
+                    api = tavily.api_wrapper
+                    raw = api.raw_results(
+                        query,
+                        tavily.max_results,
+                        tavily.search_depth,
+                        tavily.include_domains,
+                        tavily.exclude_domains,
+                        tavily.include_answer,
+                        tavily.include_raw_content,
+                        tavily.include_images,
+                    )
+                    return api.clean_results(raw["results"])
+
+                self.search = CachedSearch(search, self.search_cache)
+                self._search_tool = self.search.as_tool(tavily.name, tavily.description)
+        return self._search_tool
+
+    def _get_agent(self, model: str, max_iterations: int):
+        key = (model, max_iterations)
+        if key not in self._agents:
+            with self._build_lock:
+                if key not in self._agents:
+                    self._agents[key] = self._build_agent(model, max_iterations)
+        return self._agents[key]
+
+    def _get_fallback_chain(self, model: str):
+        if model not in self._chains:
+            with self._build_lock:
+                if model not in self._chains:
+                    self._chains[model] = self._build_fallback_chain(model)
+        return self._chains[model]
+
+    def warm_up(self, routes: Iterable[Route] = (), prime: bool = True) -> List[str]:
+        """
+        Build every pipeline the routes use and, with ``prime``, send each model a
+        tiny prompt so the server loads it before the first real email.
+
+        Returns the errors hit along the way (empty when fully warm). A failed
+        agent build is not fatal since generation falls back to the chain.
+        """
+        routes = list(routes) or [self.default_route]
+        models = list(dict.fromkeys(r.model for r in routes))
+        errors: List[str] = []
+        for model, max_iterations in dict.fromkeys((r.model, r.max_iterations) for r in routes if r.pipeline == "agent"):
+            try:
+                self._get_agent(model, max_iterations)
+            except Exception as e:
+                log.warning("Warm-up: agent for %s unavailable, will use the direct chain: %s", model, e)
+        # Every route can end up on the chain (directly or as the agent's fallback)
+        for model in models:
+            try:
+                self._get_fallback_chain(model)
+            except Exception as e:
+                errors.append(f"chain {model}: {e}")
+        if prime:
+            for model in models:
+                try:
+                    with self._build_lock:
+                        llm = self._get_llm(model)
+                    llm.invoke(_PRIME_PROMPT)
+                except Exception as e:
+                    errors.append(f"prime {model}: {e}")
+        return errors
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
 
-    def generate(self, email_body: str, sender: str, subject: str) -> str:
-        # 1) Agent (tools optional)
+                def run() -> None:
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._loop_thread = threading.Thread(target=run, name="llm-loop", daemon=True)
+                self._loop_thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def close(self) -> None:
+        """Stop the background event loop; it is restarted on the next call."""
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout=5)
+            loop.close()
+
+    def cache_key(self, email_body: str, subject: str, model: str = "") -> str:
+        return content_key(model or self.ollama_model, normalize_subject(subject), normalize_body(email_body))
+
+    def generate(self, email_body: str, sender: str, subject: str, route: Optional[Route] = None) -> str:
+        return self.submit(email_body, sender, subject, route).result()
+
+    def submit(
+        self, email_body: str, sender: str, subject: str, route: Optional[Route] = None
+    ) -> concurrent.futures.Future:
+        """Start generating on the background loop; the Future resolves to the reply."""
+        loop = self._ensure_loop()
+        coro = self._agenerate_cached(email_body, sender, subject, route or self.default_route)
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    async def agenerate(self, email_body: str, sender: str, subject: str, route: Optional[Route] = None) -> str:
+        loop = self._ensure_loop()
+        coro = self._agenerate_cached(email_body, sender, subject, route or self.default_route)
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        # Always run on the shared loop so the concurrency limit spans every caller
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def generate_many(self, requests: Sequence[Tuple[str, str, str]], route: Optional[Route] = None) -> List[str]:
+        """
+        Replies for many (email_body, sender, subject) requests, generated
+        concurrently within the shared ``max_concurrency`` limit, in input order.
+        """
+        loop = self._ensure_loop()
+        route = route or self.default_route
+
+        async def run_all() -> List[str]:
+            results = await asyncio.gather(
+                *(self._agenerate_cached(body, sender, subject, route) for body, sender, subject in requests),
+                return_exceptions=True,
+            )
+            out: List[str] = []
+            for result in results:
+                if isinstance(result, BaseException):
+                    log.error("Batch generation failed: %s", result)
+                    result = _CLARIFY_REPLY
+                out.append(result)
+            return out
+
+        return asyncio.run_coroutine_threadsafe(run_all(), loop).result()
+
+    def stream(self, email_body: str, sender: str, subject: str, route: Optional[Route] = None) -> Iterator[str]:
+        """
+        Blocking iterator over reply text as the model produces it.
+
+        Always a single direct LLM call (a ReAct agent has nothing to stream
+        until it finishes). Closing the iterator early cancels the request.
+        """
+        loop = self._ensure_loop()
+        chunks: "queue.Queue" = queue.Queue()
+        done = object()
+
+        async def pump() -> None:
+            try:
+                async for chunk in self._astream_cached(email_body, sender, subject, route or self.default_route):
+                    chunks.put(chunk)
+            finally:
+                chunks.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
         try:
-            if self._agent is None:
-                self._agent = self._build_agent()
+            while True:
+                chunk = chunks.get()
+                if chunk is done:
+                    break
+                yield chunk
+        finally:
+            # The client may have gone away mid-stream; free the concurrency slot
+            future.cancel()
+
+    async def _astream_cached(self, email_body: str, sender: str, subject: str, route: Route) -> AsyncIterator[str]:
+        key = None
+        if self.cache is not None:
+            with stage("cache_lookup"):
+                key = self.cache_key(email_body, subject, route.model)
+                cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        def get_llm():
+            with self._build_lock:
+                return self._get_llm(route.model)
+
+        parts: List[str] = []
+        complete = False
+        assert self._semaphore is not None
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + route.timeout_seconds if route.timeout_seconds > 0 else None
+            try:
+                self._ensure_env()
+                llm = await asyncio.to_thread(get_llm)
+                prompt = _CHAIN_PROMPT.format(sender=sender, subject=subject, email_body=email_body)
+                async for chunk in llm.astream(prompt):
+                    text = chunk if isinstance(chunk, str) else getattr(chunk, "content", "")
+                    if text:
+                        parts.append(text)
+                        yield text
+                    if deadline is not None and loop.time() > deadline:
+                        log.warning("LLM (%s) stream cut off after %gs", route.model, route.timeout_seconds)
+                        break
+                else:
+                    complete = True
+            except Exception as e:
+                log.exception("Streaming LLM failed: %s", e)
+        if not parts:
+            yield _CLARIFY_REPLY
+            return
+        # A reply cut short by an error or the deadline is not worth replaying
+        response = "".join(parts).strip()
+        if key is not None and complete and response:
+            self.cache.put(key, response)
+
+    async def _agenerate_cached(self, email_body: str, sender: str, subject: str, route: Route) -> str:
+        if self.cache is None:
+            return await self._agenerate(email_body, sender, subject, route)
+
+        with stage("cache_lookup"):
+            key = self.cache_key(email_body, subject, route.model)
+            cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        response = await self._agenerate(email_body, sender, subject, route)
+        # Don't pin the generic clarification reply produced when the LLM is unavailable
+        if response != _CLARIFY_REPLY:
+            self.cache.put(key, response)
+        return response
+
+    async def _agenerate(self, email_body: str, sender: str, subject: str, route: Route) -> str:
+        assert self._semaphore is not None
+        async with self._semaphore:
+            try:
+                return await _with_timeout(self._agenerate_hedged(email_body, sender, subject, route), self.budget_seconds)
+            except asyncio.TimeoutError:
+                log.warning("Reply (%s) ran past its %gs budget", route.model, self.budget_seconds)
+                self._count("budget_exceeded")
+                return _CLARIFY_REPLY
+
+    async def _agenerate_hedged(self, email_body: str, sender: str, subject: str, route: Route) -> str:
+        if route.pipeline != "agent":
+            return await self._arun_chain(email_body, sender, subject, route)
+        breaker = self.breaker(route.model)
+        if not breaker.allow():
+            self._count("breaker_skipped")
+            return await self._arun_chain(email_body, sender, subject, route)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        agent = asyncio.ensure_future(self._arun_agent(email_body, sender, subject, route))
+        chain: Optional[asyncio.Future] = None
+        recorded = False
+        hedge_running = asyncio.Event()
+
+        async def hedge() -> str:
+            # The caller's permit covers the agent; the hedge waits for its own so no more than
+            # max_concurrency requests ever reach the model server
+            assert self._semaphore is not None
+            async with self._semaphore:
+                hedge_running.set()
+                return await self._arun_chain(email_body, sender, subject, route)
+
+        try:
+            if self.hedge_after_seconds > 0:
+                done, _ = await asyncio.wait({agent}, timeout=self.hedge_after_seconds)
+                if not done:
+                    # Soft deadline missed: race the direct chain against the agent
+                    self._count("hedged")
+                    chain = asyncio.ensure_future(hedge())
+                    done, _ = await asyncio.wait({agent, chain}, return_when=asyncio.FIRST_COMPLETED)
+                    if agent not in done and chain.result() != _CLARIFY_REPLY:
+                        self._count("hedge_won")
+                        return chain.result()
+            response = await agent
+            breaker.record(bool(response), loop.time() - started)
+            recorded = True
+            if response:
+                return response
+            if chain is not None and not hedge_running.is_set():
+                # Still queued for a second permit while this email's own one sits idle: waiting
+                # could deadlock once every permit is held this way, so run the chain on ours
+                chain.cancel()
+                chain = None
+            return await (chain if chain is not None else self._arun_chain(email_body, sender, subject, route))
+        finally:
+            for task in (agent, chain):
+                if task is not None and not task.done():
+                    task.cancel()
+            if not recorded:
+                # Beaten by the chain or cut off by the budget: too slow as far as the breaker cares
+                breaker.record(False, loop.time() - started)
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._stats_lock:
+            if model not in self._breakers:
+                self._breakers[model] = self.breaker_factory()
+            return self._breakers[model]
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._stats_lock:
+            out: Dict[str, object] = dict(self._stats)
+            breakers = dict(self._breakers)
+        out["breakers"] = {model: b.stats() for model, b in breakers.items()}
+        return out
+
+    async def _arun_agent(self, email_body: str, sender: str, subject: str, route: Route) -> str:
+        """ReAct agent (tools optional); "" if it fails, times out or gives no answer."""
+        try:
+            agent = await asyncio.to_thread(self._get_agent, route.model, route.max_iterations)
 
             task = f"""Given the email below, respond in 2-4 concise sentences.
 
@@ -127,22 +513,36 @@ Subject: {subject}
 Email Body:
 {email_body}
 """
-            result = self._agent.invoke({"input": task})
+            with stage("agent_run"):
+                result = await _with_timeout(agent.ainvoke({"input": task}), route.timeout_seconds)
             response = (result.get("output") or "").strip()
             if "Final Answer:" in response:
                 response = response.split("Final Answer:", 1)[-1].strip()
-            if response:
-                return response
+            return response
+        except asyncio.TimeoutError:
+            log.warning("Agent (%s) timed out after %gs; falling back to direct LLM", route.model, route.timeout_seconds)
         except Exception as e:
             log.exception("Agent generation failed: %s", e)
+        return ""
 
-        # 2) Fallback: direct LLM
+    async def _arun_chain(self, email_body: str, sender: str, subject: str, route: Route) -> str:
+        """Single direct LLM call; the whole pipeline for "chain" routes and the agent's fallback."""
         try:
-            if self._fallback_chain is None:
-                self._fallback_chain = self._build_fallback_chain()
-            res = self._fallback_chain.invoke({"sender": sender, "subject": subject, "email_body": email_body})
+            chain = await asyncio.to_thread(self._get_fallback_chain, route.model)
+            with stage("fallback_chain"):
+                res = await _with_timeout(
+                    chain.ainvoke({"sender": sender, "subject": subject, "email_body": email_body}),
+                    route.timeout_seconds,
+                )
             # langchain versions differ: sometimes "text", sometimes "output_text"
-            return (res.get("text") or res.get("output_text") or "").strip() or "Could you share a bit more detail so I can answer accurately?"
+            return (res.get("text") or res.get("output_text") or "").strip() or _CLARIFY_REPLY
+        except asyncio.TimeoutError:
+            log.warning("LLM (%s) timed out after %gs", route.model, route.timeout_seconds)
+            return _CLARIFY_REPLY
         except Exception as e:
             log.exception("Fallback LLM failed: %s", e)
-            return "Could you share a bit more detail so I can answer accurately?"
+            return _CLARIFY_REPLY
+
+
+async def _with_timeout(coro, timeout_seconds: float):
+    return await asyncio.wait_for(coro, timeout_seconds) if timeout_seconds > 0 else await coro
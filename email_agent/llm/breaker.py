@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from threading import Lock
+from typing import Callable, Deque, Dict
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency that keeps failing or answering too slowly.
+
+    Over the last ``window`` outcomes (once there are at least ``min_calls``),
+    if the share of failures and calls slower than ``slow_call_seconds``
+    reaches ``failure_rate``, the breaker opens and ``allow`` returns False for
+    ``open_seconds``. After that one trial call is let through (half-open): it
+    closes the breaker if it succeeds in time, otherwise the breaker opens again.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 0.0,
+        window: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = max(1, min_calls)
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._lock = Lock()
+        self._outcomes: Deque[bool] = deque(maxlen=max(self.min_calls, window))  # True = bad
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._opened = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open_locked()
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            self._maybe_half_open_locked()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, success: bool, seconds: float = 0.0) -> None:
+        bad = not success or (self.slow_call_seconds > 0 and seconds > self.slow_call_seconds)
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
+                if bad:
+                    self._open_locked()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+            if self._state == OPEN:
+                # A call admitted before the breaker opened; it changes nothing now
+                return
+            self._outcomes.append(bad)
+            if len(self._outcomes) >= self.min_calls and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                self._open_locked()
+
+    def _open_locked(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._opened += 1
+        self._outcomes.clear()
+
+    def _maybe_half_open_locked(self) -> None:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            self._maybe_half_open_locked()
+            return {"state": self._state, "times_opened": self._opened, "rejected": self._rejected}
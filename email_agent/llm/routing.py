@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict
+
+from ..config import Settings
+
+PIPELINES = ("chain", "agent")
+
+
+@dataclass(frozen=True)
+class Route:
+    """How replies for one complexity tier are generated."""
+
+    pipeline: str = "agent"  # "chain" = single direct LLM call, "agent" = ReAct agent with tools
+    model: str = "llama3"
+    max_iterations: int = 3
+    timeout_seconds: float = 0.0  # 0 = no limit
+
+    def __post_init__(self) -> None:
+        if self.pipeline not in PIPELINES:
+            raise ValueError(f"Unknown pipeline {self.pipeline!r}; expected one of {PIPELINES}")
+
+
+def routes_from_settings(settings: Settings) -> Dict[str, Route]:
+    """Route per classifier tier; a blank model means ``settings.ollama_model``."""
+    return {
+        "basic": Route(
+            pipeline=settings.route_basic_pipeline,
+            model=settings.route_basic_model or settings.ollama_model,
+            max_iterations=settings.route_basic_max_iterations,
+            timeout_seconds=settings.route_basic_timeout_seconds,
+        ),
+        "intermediate": Route(
+            pipeline=settings.route_intermediate_pipeline,
+            model=settings.route_intermediate_model or settings.ollama_model,
+            max_iterations=settings.route_intermediate_max_iterations,
+            timeout_seconds=settings.route_intermediate_timeout_seconds,
+        ),
+        "complex": Route(
+            pipeline=settings.route_complex_pipeline,
+            model=settings.route_complex_model or settings.ollama_model,
+            max_iterations=settings.route_complex_max_iterations,
+            timeout_seconds=settings.route_complex_timeout_seconds,
+        ),
+    }
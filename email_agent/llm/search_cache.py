@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import re
+from concurrent.futures import Future
+from threading import Lock
+from typing import Callable, Dict
+
+from ..core.cache import LruTtlCache
+from ..core.metrics import stage
+
+log = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCT = re.compile(r"^[\s\"'`.,;:!?]+|[\s\"'`.,;:!?]+$")
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and surrounding punctuation don't change a web search."""
+    return _EDGE_PUNCT.sub("", _WHITESPACE.sub(" ", (query or "").lower()))
+
+
+class CachedSearch:
+    """
+    Web search behind a normalized-query cache with in-flight deduplication.
+
+    Concurrent calls for the same normalized query share one outbound request:
+    the first caller runs ``search``, the rest wait on its result. Results are
+    stored as text in an ``LruTtlCache`` (disk-backed if it has a path).
+    ``search`` must raise on failure: only returned results are cached, so a
+    backend that reports errors as a result string would have them replayed.
+    """
+
+    def __init__(self, search: Callable[[str], object], cache: LruTtlCache):
+        self.search = search
+        self.cache = cache
+        self._lock = Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._calls = 0
+        self._coalesced = 0
+        self._errors = 0
+
+    def run(self, query: str) -> str:
+        key = normalize_query(query)
+        with self._lock:
+            # The leader fills the cache before leaving _in_flight, so checking
+            # both under the lock never misses a result that just landed.
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self._coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            with self._lock:
+                self._calls += 1
+            with stage("web_search"):
+                result = self.search(query)
+            text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+            self.cache.put(key, text)
+            future.set_result(text)
+            return text
+        except BaseException as e:
+            with self._lock:
+                self._errors += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    async def arun(self, query: str) -> str:
+        return await asyncio.to_thread(self.run, query)
+
+    def _tool_run(self, query: str) -> str:
+        # The agent sees a failed search as an observation it can work around,
+        # as it did with the uncached tool; nothing is cached for it.
+        try:
+            return self.run(query)
+        except Exception as e:
+            log.warning("Web search failed for %r: %s", query, e)
+            return f"Search failed: {e!r}"
+
+    async def _tool_arun(self, query: str) -> str:
+        return await asyncio.to_thread(self._tool_run, query)
+
+    def as_tool(self, name: str, description: str):
+        from langchain_core.tools import Tool
+
+        return Tool(name=name, description=description, func=self._tool_run, coroutine=self._tool_arun)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            out: Dict[str, float] = {
+                "outbound_calls": self._calls,
+                "coalesced": self._coalesced,
+                "errors": self._errors,
+            }
+        out.update(self.cache.stats())
+        return out
@@ -1,31 +1,106 @@
 from __future__ import annotations
 
+import json
 import logging
-from typing import Optional
+from typing import Optional, Sequence
 
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, Response, jsonify, request, render_template, stream_with_context
 
 from ..config import Settings
-from ..core.processor import EmailProcessor
+from ..core.dispatcher import EmailDispatcher
+from ..core.metrics import METRICS
+from ..core.processor import EVENT_FIELDS, EmailProcessor
 from ..email.imap_monitor import RealEmailMonitor
 
 log = logging.getLogger(__name__)
 
 
-def create_app(settings: Settings, processor: EmailProcessor, monitor: Optional[RealEmailMonitor] = None) -> Flask:
+def create_app(
+    settings: Settings,
+    processor: EmailProcessor,
+    monitors: Sequence[RealEmailMonitor] = (),
+    dispatcher: Optional[EmailDispatcher] = None,
+) -> Flask:
     app = Flask(__name__, template_folder="../templates")
 
     @app.get("/")
     def index():
-        return render_template("index.html", email=settings.gmail_address)
+        addresses = ", ".join(m.gmail_address for m in monitors if m.gmail_address)
+        return render_template("index.html", email=addresses or settings.gmail_address)
 
     @app.get("/api/stats")
     def stats():
-        return jsonify(processor.get_stats())
+        data = processor.get_stats()
+        if dispatcher is not None:
+            data["dispatcher"] = dispatcher.stats()
+        return jsonify(data)
+
+    @app.get("/healthz")
+    def healthz():
+        status = processor.readiness()
+        return jsonify(status), 200 if status["ready"] else 503
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
     @app.get("/api/interactions")
     def interactions():
-        return jsonify(processor.get_interactions())
+        # ?cursor=<id>&limit=50&sender=..&complexity=..&mailbox=..&since=<epoch>&until=<epoch>&fields=sender,subject
+        args = request.args
+        fields = [f for f in args.get("fields", "").split(",") if f] or None
+        page = processor.get_interactions(
+            cursor=args.get("cursor", type=int),
+            limit=args.get("limit", 50, type=int),
+            sender=args.get("sender", ""),
+            complexity=args.get("complexity", ""),
+            mailbox=args.get("mailbox", ""),
+            since=args.get("since", type=float),
+            until=args.get("until", type=float),
+            fields=fields,
+        )
+        return jsonify(page)
+
+    @app.get("/api/events")
+    def events():
+        # Server-Sent Events for the dashboard: "interaction" (new row) and "stats" (changed counters).
+        # A "snapshot" event comes first unless the client resumed via Last-Event-ID; it is sent
+        # again whenever the client fell too far behind and missed events.
+        last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id", "")
+        sub, resumed = processor.events.subscribe(last_event_id)
+
+        def snapshot() -> str:
+            # Whatever is queued is older than the snapshot; replaying it afterwards would roll counters back
+            sub.get(timeout=0)
+            # The id is taken first: a reconnect may then replay a few events the snapshot has, never miss one
+            event_id = processor.events.last_id
+            data = {
+                "stats": processor.get_stats(),
+                "interactions": processor.get_interactions(limit=30, fields=EVENT_FIELDS)["items"],
+            }
+            return f"id: {event_id}\nevent: snapshot\ndata: {json.dumps(data, default=str)}\n\n"
+
+        def stream():
+            try:
+                if not resumed:
+                    yield snapshot()
+                while True:
+                    frames, lost = sub.get(timeout=15.0)
+                    if lost:
+                        yield snapshot()
+                    elif frames:
+                        yield "".join(frames)
+                    else:
+                        # Keeps proxies from timing out the connection and notices clients that left
+                        yield ": keepalive\n\n"
+            finally:
+                sub.close()
+
+        return Response(
+            stream_with_context(stream()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     @app.post("/api/v1/agent/")
     def agent_respond():
@@ -36,15 +111,60 @@ def create_app(settings: Settings, processor: EmailProcessor, monitor: Optional[
         response = processor.agent.generate(user_query, sender, subject)
         return jsonify({"response": response})
 
-    if monitor is not None:
+    @app.post("/api/v1/agent/batch")
+    def agent_batch():
+        # {"queries": [{"query": .., "sender": .., "subject": ..}, ...]} -> {"responses": [...]} in the same order
+        data = request.get_json(force=True, silent=True) or {}
+        queries = data.get("queries")
+        if not isinstance(queries, list) or not all(isinstance(q, dict) for q in queries):
+            return jsonify({"error": "expected a JSON body with a 'queries' list of objects"}), 400
+        if len(queries) > settings.api_batch_max_queries:
+            return jsonify({"error": f"at most {settings.api_batch_max_queries} queries per batch"}), 413
+        batch = [(q.get("query", ""), q.get("sender", "external_source"), q.get("subject", "")) for q in queries]
+        responses = processor.agent.generate_many(batch)
+        return jsonify({"responses": [{"response": r} for r in responses]})
+
+    @app.post("/api/v1/agent/stream")
+    def agent_stream():
+        # Server-Sent Events: one "data: {"token": ..}" per chunk, then "event: done" with the full reply
+        data = request.get_json(force=True, silent=True) or {}
+        tokens = processor.agent.stream(
+            data.get("query", ""), data.get("sender", "external_source"), data.get("subject", "")
+        )
+
+        def events():
+            parts = []
+            try:
+                for token in tokens:
+                    parts.append(token)
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+                yield f"event: done\ndata: {json.dumps({'response': ''.join(parts).strip()})}\n\n"
+            finally:
+                tokens.close()
+
+        return Response(
+            stream_with_context(events()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    if monitors:
+        # ?mailbox=<name> limits start/stop to one account; default is all of them
+        def selected():
+            name = request.args.get("mailbox", "")
+            return [m for m in monitors if not name or m.mailbox == name]
+
         @app.post("/api/monitor/start")
         def start_monitor():
-            monitor.start(lambda s, sub, body, mid: processor.process_email_with_reply(s, sub, body, mid))
+            on_email = dispatcher.submit if dispatcher is not None else processor.process_email_with_reply
+            for monitor in selected():
+                monitor.start(on_email)
             return jsonify({"ok": True})
 
         @app.post("/api/monitor/stop")
         def stop_monitor():
-            monitor.stop()
+            for monitor in selected():
+                monitor.stop()
             return jsonify({"ok": True})
 
     return app
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Run the reply pipeline over an mbox file or Maildir instead of a live inbox.
+
+Messages are read one at a time, cleaned and classified like live mail, and
+answered by the configured routes with up to LLM_MAX_CONCURRENCY generations
+in flight. One JSON line per message is written to --out; nothing is sent.
+Re-running with the same --out skips messages that are already in it, so an
+interrupted run resumes where it stopped.
+
+    python replay_archive.py ~/archive.mbox --out drafts.jsonl
+    python replay_archive.py ~/Maildir --out labels.jsonl --dry-run
+    python replay_archive.py ~/archive.mbox --out llama3.1.jsonl --model llama3.1 --pipeline chain
+"""
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import email
+import email.policy
+import json
+import logging
+import mailbox
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from pathlib import Path
+from typing import Dict, Iterator, Set, Tuple
+
+from email_agent.config import Settings
+from email_agent.core.processor import build_agent, build_classifier
+from email_agent.email.imap_monitor import RealEmailMonitor
+from email_agent.email.text import prepare_body
+from email_agent.llm.routing import routes_from_settings
+from email_agent.logging_utils import setup_logging
+
+log = logging.getLogger("replay")
+
+
+def iter_archive(path: str) -> Iterator[Tuple[str, email.message.Message]]:
+    """(key, message) for every message in an mbox file or Maildir, read lazily."""
+    if os.path.isdir(path):
+        box = mailbox.Maildir(path, factory=None, create=False)
+        prefix = "maildir"
+    else:
+        box = mailbox.mbox(path, create=False)
+        prefix = "mbox"
+    try:
+        for key in box.iterkeys():
+            try:
+                raw = box.get_bytes(key)
+            except Exception:
+                log.exception("Unreadable message %s in %s", key, path)
+                continue
+            yield f"{prefix}:{key}", email.message_from_bytes(raw, policy=email.policy.compat32)
+    finally:
+        box.close()
+
+
+def load_checkpoint(out: Path) -> Set[str]:
+    """Keys already written by an earlier run. A torn last line is cut off so appends start clean."""
+    done: Set[str] = set()
+    if not out.exists():
+        return done
+    with out.open("rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    with out.open("r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["key"])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("source", help="mbox file or Maildir directory")
+    ap.add_argument("--out", required=True, help="JSONL output; also the checkpoint for resuming")
+    ap.add_argument("--dry-run", action="store_true", help="only classify and route; no LLM calls")
+    ap.add_argument("--limit", type=int, default=0, help="stop after this many new messages")
+    ap.add_argument("--concurrency", type=int, default=0, help="generations in flight (default: LLM_MAX_CONCURRENCY)")
+    ap.add_argument("--model", default="", help="use this model for every tier")
+    ap.add_argument("--pipeline", choices=("chain", "agent"), default="", help="use this pipeline for every tier")
+    ap.add_argument("--reply-cache", action="store_true", help="allow cached replies (off so every message is generated)")
+    args = ap.parse_args()
+
+    setup_logging()
+    settings = Settings.from_env()
+    settings = dataclasses.replace(
+        settings,
+        reply_cache_enabled=args.reply_cache and settings.reply_cache_enabled,
+        llm_max_concurrency=args.concurrency or settings.llm_max_concurrency,
+    )
+    routes = routes_from_settings(settings)
+    for tier, route in routes.items():
+        routes[tier] = dataclasses.replace(
+            route, model=args.model or route.model, pipeline=args.pipeline or route.pipeline
+        )
+
+    classifier = build_classifier(settings)
+    agent = None if args.dry_run else build_agent(settings)
+
+    out = Path(args.out)
+    done = load_checkpoint(out)
+    if done:
+        log.info("Resuming: %d messages already in %s", len(done), out)
+
+    # Keep the loop fed without reading the whole archive into memory
+    max_pending = settings.llm_max_concurrency * 2
+    pending: Dict[Future, Dict] = {}
+    counts: Counter = Counter()
+    written = 0
+    start = time.perf_counter()
+
+    with out.open("a", encoding="utf-8") as sink:
+        def write(record: Dict) -> None:
+            nonlocal written
+            sink.write(json.dumps(record, ensure_ascii=False) + "\n")
+            # Flushed per line so a crash loses at most the messages in flight
+            sink.flush()
+            written += 1
+            if written % 100 == 0:
+                log.info("%d messages, %.1f/s", written, written / (time.perf_counter() - start))
+
+        def drain(block_until: int) -> None:
+            while len(pending) > block_until:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = pending.pop(future)
+                    try:
+                        record["response"] = future.result()
+                    except Exception as e:
+                        record["error"] = str(e)
+                    record["seconds"] = round(time.perf_counter() - record.pop("_started"), 3)
+                    write(record)
+
+        new = 0
+        for key, m in iter_archive(args.source):
+            if key in done:
+                continue
+            if args.limit and new >= args.limit:
+                break
+            new += 1
+
+            # Same extraction and cleaning as live mail
+            body = RealEmailMonitor._extract_body(m)
+            prompt_body = prepare_body(body, settings.prompt_max_tokens)
+            sender = RealEmailMonitor._extract_email_address(str(m.get("From", "")))
+            subject = RealEmailMonitor._decode_header(m.get("Subject")) or "No Subject"
+            complexity = classifier.classify(prompt_body)
+            route = routes[complexity]
+            counts[complexity] += 1
+            record = {
+                "key": key,
+                "message_id": (m.get("Message-ID") or "").strip(),
+                "sender": sender,
+                "subject": subject,
+                "complexity": complexity,
+                "pipeline": route.pipeline,
+                "model": route.model,
+            }
+            if agent is None:
+                write(record)
+                continue
+
+            record["_started"] = time.perf_counter()
+            pending[agent.submit(prompt_body, sender, subject, route)] = record
+            drain(max_pending - 1)
+        if agent is not None:
+            drain(0)
+            agent.close()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "written": written,
+        "skipped_from_checkpoint": len(done),
+        "by_complexity": dict(counts),
+        "elapsed_seconds": round(elapsed, 2),
+        "messages_per_sec": round(written / elapsed, 2) if elapsed else 0.0,
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,35 +2,86 @@
 from __future__ import annotations
 
 import logging
+import time
+from threading import Thread
 
 from email_agent.config import Settings
 from email_agent.logging_utils import setup_logging
+from email_agent.core.dispatcher import EmailDispatcher
 from email_agent.core.processor import EmailProcessor
+from email_agent.core.spool import WorkSpool
 from email_agent.email.imap_monitor import RealEmailMonitor
 from email_agent.web.app import create_app
 
 
 def main() -> None:
+    started = time.perf_counter()
     setup_logging()
     log = logging.getLogger("main")
 
     settings = Settings.from_env()
     processor = EmailProcessor(settings)
 
-    monitor = RealEmailMonitor(
-        imap_host=settings.imap_host,
-        imap_port=settings.imap_port,
-        gmail_address=settings.gmail_address,
-        gmail_app_password=settings.gmail_app_password,
-        poll_seconds=settings.poll_seconds,
+    if settings.warm_up:
+        def warm_up() -> None:
+            # Retry until the model server answers; /healthz stays 503 meanwhile
+            delay = 5.0
+            while not processor.warm_up():
+                time.sleep(delay)
+                delay = min(delay * 2, 300.0)
+            log.info("Ready %.1fs after start (warm-up %.1fs)", time.perf_counter() - started, processor.readiness()["warm_up_seconds"])
+
+        Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+    # One IMAP connection per account; all of them feed the same dispatcher and LLM stack
+    own_addresses = [m.gmail_address for m in processor.mailboxes.values()]
+    monitors = [
+        RealEmailMonitor(
+            imap_host=mailbox.imap_host,
+            imap_port=mailbox.imap_port,
+            gmail_address=mailbox.gmail_address,
+            gmail_app_password=mailbox.gmail_app_password,
+            poll_seconds=settings.poll_seconds,
+            mode=settings.imap_mode,
+            idle_seconds=settings.imap_idle_seconds,
+            use_ssl=settings.imap_ssl,
+            max_body_bytes=settings.imap_max_body_bytes,
+            mailbox=mailbox.name,
+            ignore_senders=own_addresses,
+        )
+        for mailbox in processor.mailboxes.values()
+    ]
+
+    spool = None
+    if settings.spool_enabled:
+        spool = WorkSpool(
+            settings.spool_path,
+            visibility_timeout=settings.spool_visibility_timeout_seconds,
+            max_attempts=settings.spool_max_attempts,
+        )
+    dispatcher = EmailDispatcher(
+        processor.process_incoming,
+        workers=settings.worker_count,
+        max_queue=settings.dispatch_queue_size,
+        spool=spool,
+        priority=processor.priority,
+        coalesce_seconds=settings.coalesce_window_seconds,
     )
+    dispatcher.start()
 
     # Start monitoring immediately (safe: no-op if not configured)
-    monitor.start(lambda s, sub, body, mid: processor.process_email_with_reply(s, sub, body, mid))
+    for monitor in monitors:
+        monitor.start(dispatcher.submit)
+    log.info("Monitoring %d mailbox(es)", len(monitors))
 
-    app = create_app(settings, processor, monitor)
+    app = create_app(settings, processor, monitors, dispatcher)
     log.info("Web UI: http://%s:%s", settings.web_host, settings.web_port)
-    app.run(host=settings.web_host, port=settings.web_port, debug=settings.web_debug)
+    try:
+        app.run(host=settings.web_host, port=settings.web_port, debug=settings.web_debug)
+    finally:
+        for monitor in monitors:
+            monitor.stop()
+        dispatcher.stop(drain=True)
 
 
 if __name__ == "__main__":
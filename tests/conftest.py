@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The package is run from a checkout (no install), as the benchmarks do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
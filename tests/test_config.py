@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import pytest
+
+from email_agent.config import Settings
+
+
+def test_claims_require_spool(monkeypatch):
+    monkeypatch.setenv("CLAIMS_ENABLED", "true")
+    monkeypatch.setenv("SPOOL_ENABLED", "false")
+    with pytest.raises(ValueError, match="SPOOL_ENABLED"):
+        Settings.from_env()
+
+    monkeypatch.setenv("SPOOL_ENABLED", "true")
+    assert Settings.from_env().claims_enabled
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import pytest
+
+from email_agent.core.cache import LruTtlCache
+from email_agent.llm.search_cache import CachedSearch
+
+
+def test_results_are_cached_by_normalized_query():
+    calls = []
+
+    def backend(query):
+        calls.append(query)
+        return [{"url": "https://example.com", "content": "LLC filing fees"}]
+
+    search = CachedSearch(backend, LruTtlCache())
+    first = search.run("LLC filing fees?")
+    assert search.run("  llc   FILING fees ") == first
+    assert len(calls) == 1
+
+
+def test_raised_error_is_not_cached():
+    cache = LruTtlCache()
+    calls = []
+
+    def backend(query):
+        calls.append(query)
+        if len(calls) == 1:
+            raise ConnectionError("tavily unreachable")
+        return [{"url": "https://example.com", "content": "ok"}]
+
+    search = CachedSearch(backend, cache)
+    with pytest.raises(ConnectionError):
+        search.run("llc fees")
+    assert cache.get("llc fees") is None
+    assert search.stats()["errors"] == 1
+
+    assert "ok" in search.run("llc fees")
+    assert len(calls) == 2
+
+
+def test_tool_reports_error_to_agent_without_caching():
+    cache = LruTtlCache()
+
+    def backend(query):
+        raise TimeoutError("read timed out")
+
+    search = CachedSearch(backend, cache)
+    observation = search._tool_run("llc fees")
+    assert observation.startswith("Search failed:")
+    assert cache.get("llc fees") is None
+    assert cache.stats()["entries"] == 0
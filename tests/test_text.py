@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from email_agent.email.text import prepare_body, strip_disclaimer, strip_signature
+
+
+def test_mid_body_intended_sentence_is_kept():
+    body = (
+        "Hi,\n"
+        "This email is intended to follow up on my LLC question: do I need to file a separate return?\n"
+        "\n"
+        "I formed the LLC in March and have one employee.\n"
+        "When is the first payroll filing due?\n"
+        "\n"
+        "Thanks,\n"
+        "Dana"
+    )
+    text = prepare_body(body)
+    assert "This email is intended to follow up" in text
+    assert "When is the first payroll filing due?" in text
+    assert "Dana" not in text
+
+
+def test_trailing_disclaimer_is_stripped():
+    lines = [
+        "Hi,",
+        "Can you confirm the estimated payment deadline for Q3?",
+        "",
+        "Best regards,",
+        "Dana",
+        "",
+        "CONFIDENTIALITY NOTICE: This email and any attachments are confidential",
+        "and intended solely for the addressee. If you received it in error,",
+        "please delete it.",
+    ]
+    assert strip_disclaimer(lines) == lines[:6]
+
+
+def test_disclaimer_before_a_question_is_kept():
+    lines = [
+        "Hi,",
+        "This message is intended for the payroll team.",
+        "Can you send me last year's W-2?",
+    ]
+    assert strip_disclaimer(lines) == lines
+
+
+def test_sign_off_mid_message_is_kept():
+    lines = ["Thanks!", "Also, can I deduct my home office?", "", "Regards,", "Dana"]
+    assert strip_signature(lines) == lines[:3]